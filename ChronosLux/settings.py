@@ -42,6 +42,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'watches.middleware.CarritoInvitadoMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -95,6 +96,56 @@ DATABASES = {
     }
 }
 
+
+def _cache(url, location):
+    # redis://host:6379/0 o memcached://host:11211; sin URL, memoria local
+    # (un caché por proceso: lo que un worker borra, los demás lo conservan).
+    if url.startswith("redis://"):
+        return {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": url,
+        }
+    if url.startswith("memcached://"):
+        return {
+            "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+            "LOCATION": url.removeprefix("memcached://"),
+        }
+    return {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": location,
+    }
+
+
+# Caché general (estado del usuario, fragmentos del catálogo). Con varios
+# workers debe ser compartida: sin CACHE_URL, lo que depende de invalidarse
+# en todos los procesos no se guarda entre peticiones (CACHE_COMPARTIDA).
+CACHE_URL = os.getenv("CACHE_URL", "")
+CACHE_COMPARTIDA = bool(CACHE_URL)
+
+# Caché de sesiones (SESIONES_MOTOR = 'cache').
+SESIONES_CACHE_URL = os.getenv("SESIONES_CACHE_URL", "")
+
+CACHES = {
+    "default": _cache(CACHE_URL, "chronoslux"),
+    "sesiones": _cache(SESIONES_CACHE_URL, "chronoslux-sesiones"),
+}
+
+# Motor de sesiones:
+#   'db':    colección django_session (una escritura por cada cambio).
+#   'lru':   LRU en memoria del proceso con escritura diferida a MongoDB
+#            (watches/sesiones_lru.py); solo para un proceso.
+#   'cache': la caché 'sesiones' (Redis/memcached) compartida entre workers.
+SESIONES_MOTORES = {
+    "db": "django.contrib.sessions.backends.db",
+    "lru": "watches.sesiones_lru",
+    "cache": "django.contrib.sessions.backends.cache",
+}
+SESIONES_MOTOR = os.getenv("SESIONES_MOTOR", "db")
+SESSION_ENGINE = SESIONES_MOTORES[SESIONES_MOTOR]
+SESSION_CACHE_ALIAS = "sesiones"
+SESIONES_LRU_MAX = int(os.getenv("SESIONES_LRU_MAX", "10000"))
+SESIONES_LRU_INTERVALO = int(os.getenv("SESIONES_LRU_INTERVALO", "5"))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -143,6 +194,31 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# Búsqueda del catálogo: 'mongo' usa el índice de texto y cae al índice
+# en memoria si no existe; 'local' usa solo el índice en memoria.
+BUSQUEDA_MOTOR = os.getenv("BUSQUEDA_MOTOR", "mongo")
+BUSQUEDA_MAX_RESULTADOS = 240
+
+# Almacenamiento del carrito: 'colecciones' (Carrito + DetalleCarrito) o
+# 'embebido' (un documento por carrito con renglones y totales, ver watches/carrito.py).
+# Para cambiar de modo con carritos activos: manage.py convertir_carritos.
+CARRITO_ALMACENAMIENTO = os.getenv("CARRITO_ALMACENAMIENTO", "colecciones")
+
+# Carrito de visitantes: 'sesion' (request.session['cart']) o 'cookie' (cookie
+# firmada con (producto, cantidad); ver watches/carrito_invitado.py).
+CARRITO_INVITADO = os.getenv("CARRITO_INVITADO", "sesion")
+
+# Cola de tareas del pedido (correo de confirmación; ver watches/tareas.py): la
+# atiende `manage.py run_workers`. TAREAS_HILOS > 0 arranca además hilos dentro
+# de cada proceso web (solo desarrollo: cada worker de gunicorn/uvicorn tendría
+# su pool). TAREAS_INTERVALO: segundos entre sondeos de la bandeja de salida.
+TAREAS_HILOS = int(os.getenv("TAREAS_HILOS", "0"))
+TAREAS_INTERVALO = float(os.getenv("TAREAS_INTERVALO", "2"))
+
+# Segundos entre barridos de reservas de checkout vencidas dentro de los
+# trabajadores de tareas (0 = solo el comando liberar_reservas).
+RESERVAS_BARRIDO = float(os.getenv("RESERVAS_BARRIDO", "60"))
+
 # GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
@@ -1,26 +1,19 @@
+from django.utils.functional import SimpleLazyObject
+
+from watches.estado_usuario import estado_usuario
 from .forms import EmailAuthenticationForm, SignupForm
 
 def auth_forms(request):
+    # Se construyen solo si una plantilla los usa; el modal normal los pide a auth_modal.
     return {
-        "login_form": EmailAuthenticationForm(request),
-        "signup_form": SignupForm(),
+        "login_form": SimpleLazyObject(lambda: EmailAuthenticationForm(request)),
+        "signup_form": SimpleLazyObject(SignupForm),
     }
 
 
 def user_roles_context(request):
-    is_proveedor = False
-
-    if request.user.is_authenticated:
-        pertenece_grupo = request.user.groups.filter(name='Proveedores').exists()
-
-        try:
-            from proveedores.models import Proveedor
-            tiene_perfil_proveedor = Proveedor.objects.filter(user=request.user).exists()
-        except Exception:
-            tiene_perfil_proveedor = False
-
-        is_proveedor = pertenece_grupo or tiene_perfil_proveedor
-
+    # Grupo y perfil de proveedor se leen en el mismo aggregate que el carrito.
+    estado = estado_usuario(request)
     return {
-        'is_proveedor': is_proveedor
-    }
\ No newline at end of file
+        'is_proveedor': SimpleLazyObject(lambda: estado.is_proveedor)
+    }
@@ -3,6 +3,7 @@ from django.contrib.auth.views import LogoutView
 from .views import (
     HomeLoginView,
     signup,
+    auth_modal,
     domicilio_list,
     domicilio_create,
     domicilio_edit,
@@ -16,6 +17,7 @@ urlpatterns = [
     path('login/', HomeLoginView.as_view(), name='login'),
     path('logout/', LogoutView.as_view(), name='logout'),
     path('signup/', signup, name='signup'),
+    path('modal/', auth_modal, name='auth_modal'),
 
     path('mis-domicilios/', domicilio_list, name='domicilio_list'),
     path('mis-domicilios/agregar/', domicilio_create, name='domicilio_create'),
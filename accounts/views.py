@@ -14,7 +14,10 @@ import os
 from watches.context_processors import home_page_context
 from bson import ObjectId
 from bson.errors import InvalidId
-from django.http import Http404, JsonResponse
+from django.http import Http404, JsonResponse, HttpResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_GET
+from django.views.decorators.vary import vary_on_cookie
 from django.core.exceptions import ValidationError
 
 
@@ -91,6 +94,20 @@ def signup(request):
     ctx['auth_active_tab'] = 'signup'
     return render(request, 'registration/signup.html', ctx)
 
+
+@require_GET
+@vary_on_cookie
+@cache_control(private=True, max_age=600)
+def auth_modal(request):
+    # Paneles de login/registro del modal, pedidos por auth-modal.js al abrirlo.
+    # Caché privada: el fragmento lleva el token CSRF de la cookie del visitante.
+    if request.user.is_authenticated:
+        return HttpResponse(status=204)
+    return render(request, 'registration/_auth_panes.html', {
+        'login_form': EmailAuthenticationForm(request),
+        'signup_form': SignupForm(),
+    })
+
 # --- FIN: LÓGICA COMPLETA DE LA VISTA DE HOME ---
 
 # --- INICIO: LÓGICA COMPLETA DE REGISTRO DOMICILIOS ---
@@ -193,9 +210,13 @@ def domicilio_delete(request, domicilio_id):
 
 @login_required
 def mis_compras(request):
-    pedidos = Pedido.objects.filter(usuario=request.user).order_by('-fecha')
+    # Cada pedido trae su resumen embebido (Pedido.lineas): una sola consulta
+    # sin importar cuántos pedidos o renglones haya.
+    pedidos = list(Pedido.objects.filter(usuario=request.user).order_by('-fecha'))
 
-    pedidos_con_devolucion = Devolucion.objects.filter(pedido__in=pedidos).values_list('pedido_id', flat=True)
+    pedidos_con_devolucion = Devolucion.objects.filter(
+        pedido_id__in=[pedido.pk for pedido in pedidos]
+    ).values_list('pedido_id', flat=True)
 
     fecha_limite_devolucion = timezone.now() - timedelta(days=90)
 
@@ -2,6 +2,7 @@ from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
 from watches.models import Producto
+from watches.reservas import reponer_stock
 from .models import Proveedor, Compra, DetalleCompra
 from django.contrib import messages
 
@@ -59,6 +60,7 @@ def crear_compra(request):
 
         nueva_compra = Compra.objects.create(proveedor=proveedor)
         total_compra = 0
+        reposiciones = {}
 
         for key, value in request.POST.items():
             if key.startswith('cantidad_'):
@@ -78,13 +80,16 @@ def crear_compra(request):
                             costo_unitario=costo
                         )
 
-                        producto.stock += cantidad
-                        producto.save()
+                        reposiciones[producto.pk] = reposiciones.get(producto.pk, 0) + cantidad
 
                         total_compra += cantidad * costo
                 except (ValueError, TypeError, Producto.DoesNotExist):
                     continue
 
+        # Un $inc sobre el stock vigente: producto.save() pisaría las piezas que
+        # las reservas de checkout ya descontaron.
+        reponer_stock(reposiciones)
+
         nueva_compra.total_compra = total_compra
         nueva_compra.save()
 
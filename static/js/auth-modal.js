@@ -1,16 +1,12 @@
 
 (function () {
   const userModal   = document.getElementById('user-modal');
-  const loginPane   = document.getElementById('login-form-pane');
-  const signupPane  = document.getElementById('signup-form-pane');
   const profilePane = document.getElementById('profile-pane');
+  const authPanes   = document.getElementById('auth-panes');
   const titleEl     = document.getElementById('auth-modal-title');
   const backdrop    = document.getElementById('auth-backdrop');
   const dialog      = document.getElementById('auth-dialog');
 
-  const switchToRegisterLink = document.querySelector('#switch-to-register a, a#switch-to-register, button#switch-to-register');
-  const switchToLoginLink    = document.querySelector('#switch-to-login a, a#switch-to-login, button#switch-to-login');
-
   const userIconBtn = document.getElementById('user-icon-btn');
   const closeModal  = document.getElementById('close-modal');
 
@@ -20,7 +16,22 @@
     titleEl.textContent = (tab === 'signup') ? 'Registro' : 'Inicio de sesión';
   }
 
+  // Los paneles de login/registro llegan del servidor la primera vez que se abre el modal
+  let panesPromise = null;
+  function loadPanes() {
+    if (!authPanes || !authPanes.dataset.url) return Promise.resolve();
+    if (!panesPromise) {
+      panesPromise = fetch(authPanes.dataset.url, { credentials: 'same-origin' })
+        .then(r => (r.ok ? r.text() : ''))
+        .then(html => { authPanes.innerHTML = html; delete authPanes.dataset.url; })
+        .catch(() => { panesPromise = null; });
+    }
+    return panesPromise;
+  }
+
   function showTab(tab) {
+    const loginPane  = document.getElementById('login-form-pane');
+    const signupPane = document.getElementById('signup-form-pane');
     if (profilePane) {
       profilePane.classList.remove('hidden');
       if (loginPane)  loginPane.classList.add('hidden');
@@ -38,6 +49,7 @@
   function openAuthModal(tab = 'login') {
     if (userModal) userModal.classList.remove('hidden');
     showTab(tab);
+    if (!profilePane) loadPanes().then(() => showTab(tab));
     document.documentElement.classList.add('overflow-y-hidden');
     document.body.classList.add('overflow-y-hidden');
   }
@@ -47,9 +59,14 @@
     document.body.classList.remove('overflow-y-hidden');
   }
 
-  // Alternar pestañas
-  if (switchToRegisterLink) switchToRegisterLink.addEventListener('click', e => { e.preventDefault(); openAuthModal('signup'); });
-  if (switchToLoginLink)    switchToLoginLink.addEventListener('click', e => { e.preventDefault(); openAuthModal('login');  });
+  // Alternar pestañas (delegado: los paneles pueden cargarse después)
+  document.addEventListener('click', e => {
+    if (e.target.closest('#switch-to-register a, a#switch-to-register, button#switch-to-register')) {
+      e.preventDefault(); openAuthModal('signup');
+    } else if (e.target.closest('#switch-to-login a, a#switch-to-login, button#switch-to-login')) {
+      e.preventDefault(); openAuthModal('login');
+    }
+  });
 
   // Abrir/cerrar
   if (userIconBtn) userIconBtn.addEventListener('click', () => openAuthModal(profilePane ? 'profile' : 'login'));
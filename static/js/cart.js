@@ -20,16 +20,21 @@ document.addEventListener("DOMContentLoaded", () => {
         }
     }
 
+    // Última respuesta de /api/carrito/; con ella se pregunta ?since=<versión>
+    // y, si el carrito no cambió, se vuelve a pintar sin descargar renglones.
+    let cartCache = null;
+
+    // Stock bajo de los productos del carrito, empujado por /api/carrito/eventos/
+    const lowStock = {};
+
     // Renderizado del modal
     async function renderCartModal() {
         const cartItemsContainer = document.getElementById('cart-items');
-        const cartTotalEl = document.getElementById('cart-total');
-        const checkoutBtn = document.getElementById('checkout-btn');
 
         if (!cartItemsContainer) return;
 
-        // Mostrar "Cargando..."
-        cartItemsContainer.innerHTML = `
+        // Mostrar "Cargando..." (solo si no hay nada que pintar todavía)
+        if (!cartCache) cartItemsContainer.innerHTML = `
             <div class="flex flex-col items-center justify-center h-40 space-y-3">
                 <i data-lucide="loader-2" class="w-8 h-8 animate-spin text-yellow-600"></i>
                 <p class="text-gray-500 text-sm font-medium">Cargando tu carrito...</p>
@@ -38,60 +43,109 @@ document.addEventListener("DOMContentLoaded", () => {
         if(window.lucide) window.lucide.createIcons();
 
         try {
-            const response = await fetch('/api/carrito/');
+            const url = cartCache
+                ? `/api/carrito/?since=${encodeURIComponent(cartCache.version)}`
+                : '/api/carrito/';
+            const response = await fetch(url);
             const data = await response.json();
+            if (data.changed !== false || !cartCache) cartCache = data;
+            paintCart(cartCache);
 
-            if (!cartTotalEl || !checkoutBtn) return;
+        } catch (error) {
+            console.error("Error al renderizar carrito:", error);
+            cartItemsContainer.innerHTML = '<p class="text-red-500 text-center py-4">Error al cargar el carrito.</p>';
+        }
+    }
 
-            cartItemsContainer.innerHTML = '';
+    // Pinta el contenido del modal a partir de una respuesta del carrito
+    function paintCart(data) {
+        const cartItemsContainer = document.getElementById('cart-items');
+        const cartTotalEl = document.getElementById('cart-total');
+        const checkoutBtn = document.getElementById('checkout-btn');
 
-            if (data.cart_items.length === 0) {
-                cartItemsContainer.innerHTML = `
-                    <div class="flex flex-col items-center justify-center py-10 text-gray-500">
-                        <i data-lucide="shopping-bag" class="w-10 h-10 mb-3 opacity-50"></i>
-                        <p>Tu carrito está vacío</p>
-                    </div>
-                `;
-                checkoutBtn.classList.add('opacity-50', 'cursor-not-allowed', 'pointer-events-none');
-            } else {
-                data.cart_items.forEach(item => {
-                    // --- AQUÍ ESTÁ EL CAMBIO VISUAL (INPUT EN VEZ DE SPAN) ---
-                    const itemHTML = `
-                        <div class="flex items-center space-x-4 mb-4 p-4 border rounded-lg bg-white shadow-sm">
-                            <img src="/media/${item.image_url}" alt="${item.name}" class="w-16 h-16 object-cover rounded">
-                            <div class="flex-1">
-                                <h3 class="font-semibold text-sm md:text-base">${item.brand} ${item.name}</h3>
-                                <p class="text-gray-600 font-mono text-sm">$${item.price.toFixed(2)}</p>
-                                <div class="flex items-center space-x-2 mt-2">
-                                    <button class="quantity-btn w-8 h-8 flex items-center justify-center border rounded hover:bg-gray-100 transition-colors" data-id="${item.id}" data-action="decrease">-</button>
-
-                                    <input type="number"
-                                           min="1"
-                                           value="${item.quantity}"
-                                           data-id="${item.id}"
-                                           class="manual-quantity-input w-12 text-center border rounded mx-1 p-1 text-sm font-semibold focus:outline-none focus:border-blue-500"
-                                    >
-
-                                    <button class="quantity-btn w-8 h-8 flex items-center justify-center border rounded hover:bg-gray-100 transition-colors" data-id="${item.id}" data-action="increase">+</button>
-                                    <button class="remove-btn ml-auto text-red-500 text-sm hover:text-red-700 font-semibold transition-colors" data-id="${item.id}">
-                                        <i data-lucide="trash-2" class="w-4 h-4"></i>
-                                    </button>
-                                </div>
+        if (!cartItemsContainer || !cartTotalEl || !checkoutBtn) return;
+
+        cartItemsContainer.innerHTML = '';
+
+        if (data.cart_items.length === 0) {
+            cartItemsContainer.innerHTML = `
+                <div class="flex flex-col items-center justify-center py-10 text-gray-500">
+                    <i data-lucide="shopping-bag" class="w-10 h-10 mb-3 opacity-50"></i>
+                    <p>Tu carrito está vacío</p>
+                </div>
+            `;
+            checkoutBtn.classList.add('opacity-50', 'cursor-not-allowed', 'pointer-events-none');
+        } else {
+            data.cart_items.forEach(item => {
+                // --- AQUÍ ESTÁ EL CAMBIO VISUAL (INPUT EN VEZ DE SPAN) ---
+                const itemHTML = `
+                    <div class="flex items-center space-x-4 mb-4 p-4 border rounded-lg bg-white shadow-sm">
+                        <img src="/media/${item.image_url}" alt="${item.name}" class="w-16 h-16 object-cover rounded">
+                        <div class="flex-1">
+                            <h3 class="font-semibold text-sm md:text-base">${item.brand} ${item.name}</h3>
+                            <p class="text-gray-600 font-mono text-sm">$${item.price.toFixed(2)}</p>
+                        ${lowStock[item.id] ? `<p class="text-xs text-red-600 font-semibold">${lowStock[item.id].stock > 0 ? `Solo quedan ${lowStock[item.id].stock}` : 'Agotado'}</p>` : ''}
+                            <div class="flex items-center space-x-2 mt-2">
+                                <button class="quantity-btn w-8 h-8 flex items-center justify-center border rounded hover:bg-gray-100 transition-colors" data-id="${item.id}" data-action="decrease">-</button>
+
+                                <input type="number"
+                                       min="1"
+                                       value="${item.quantity}"
+                                       data-id="${item.id}"
+                                       class="manual-quantity-input w-12 text-center border rounded mx-1 p-1 text-sm font-semibold focus:outline-none focus:border-blue-500"
+                                >
+
+                                <button class="quantity-btn w-8 h-8 flex items-center justify-center border rounded hover:bg-gray-100 transition-colors" data-id="${item.id}" data-action="increase">+</button>
+                                <button class="remove-btn ml-auto text-red-500 text-sm hover:text-red-700 font-semibold transition-colors" data-id="${item.id}">
+                                    <i data-lucide="trash-2" class="w-4 h-4"></i>
+                                </button>
                             </div>
                         </div>
-                    `;
-                    cartItemsContainer.innerHTML += itemHTML;
-                });
-                checkoutBtn.classList.remove('opacity-50', 'cursor-not-allowed', 'pointer-events-none');
-                if(window.lucide) window.lucide.createIcons();
-            }
+                    </div>
+                `;
+                cartItemsContainer.innerHTML += itemHTML;
+            });
+            checkoutBtn.classList.remove('opacity-50', 'cursor-not-allowed', 'pointer-events-none');
+            if(window.lucide) window.lucide.createIcons();
+        }
 
-            cartTotalEl.textContent = `$${data.total_price.toLocaleString('es-MX', { minimumFractionDigits: 2, maximumFractionDigits: 2 })}`;
-            updateCartIcon(data.total_items);
+        cartTotalEl.textContent = `$${data.total_price.toLocaleString('es-MX', { minimumFractionDigits: 2, maximumFractionDigits: 2 })}`;
+        updateCartIcon(data.total_items);
+    }
+
+    // Cola de ediciones del modal: los clics rápidos se juntan y se mandan
+    // en una sola llamada a /api/carrito/batch/.
+    let pendingOps = [];
+    let flushTimer = null;
+
+    function queueCartOp(op) {
+        pendingOps.push(op);
+        clearTimeout(flushTimer);
+        flushTimer = setTimeout(flushCartOps, 300);
+    }
 
+    async function flushCartOps() {
+        const operations = pendingOps;
+        pendingOps = [];
+        if (operations.length === 0) return;
+
+        try {
+            const response = await fetch('/api/carrito/batch/', {
+                method: 'POST',
+                headers: { 'X-CSRFToken': window.getCookie('csrftoken'), 'Content-Type': 'application/json' },
+                body: JSON.stringify({ operations: operations })
+            });
+            const data = await response.json();
+            if (data.status !== 'ok') throw new Error(data.status);
+            // Si llegaron más clics mientras tanto, su respuesta pintará el estado final.
+            if (pendingOps.length === 0) {
+                cartCache = data;
+                paintCart(data);
+            }
         } catch (error) {
-            console.error("Error al renderizar carrito:", error);
-            cartItemsContainer.innerHTML = '<p class="text-red-500 text-center py-4">Error al cargar el carrito.</p>';
+            console.error('Error actualizando el carrito', error);
+            cartCache = null;
+            renderCartModal();
         }
     }
 
@@ -150,26 +204,17 @@ document.addEventListener("DOMContentLoaded", () => {
         if (button.matches('.remove-btn')) {
             const watchId = button.dataset.id;
             button.closest('.flex').style.opacity = '0.3';
-            const url = `/carrito/eliminar/${watchId}/`;
-            const response = await fetch(url, { method: 'POST', headers: { 'X-CSRFToken': csrftoken } });
-            if ((await response.json()).status === 'ok') renderCartModal();
+            queueCartOp({ op: 'remove', id: watchId });
         }
 
-        // Botones + y - (Cantidad)
+        // Botones + y - (Cantidad): se refleja al instante y se encola
         if (button.matches('.quantity-btn')) {
             const watchId = button.dataset.id;
             const action = button.dataset.action;
-            const url = `/carrito/actualizar/${watchId}/`;
-
-            const container = button.parentElement;
-            container.querySelectorAll('button, input').forEach(el => el.disabled = true); // Bloqueamos todo
+            const input = button.parentElement.querySelector('.manual-quantity-input');
 
-            const response = await fetch(url, {
-                method: 'POST',
-                headers: { 'X-CSRFToken': csrftoken, 'Content-Type': 'application/json' },
-                body: JSON.stringify({ action: action })
-            });
-            if ((await response.json()).status === 'ok') renderCartModal();
+            if (input) input.value = Math.max(0, parseInt(input.value) + (action === 'increase' ? 1 : -1));
+            queueCartOp({ op: action === 'increase' ? 'inc' : 'dec', id: watchId, quantity: 1 });
         }
     });
 
@@ -180,39 +225,38 @@ document.addEventListener("DOMContentLoaded", () => {
             const input = event.target;
             const watchId = input.dataset.id;
             let newQuantity = parseInt(input.value);
-            const csrftoken = window.getCookie('csrftoken');
 
             // PROTECCIÓN: Si es inválido o menor a 1, forzamos a 1
             if (newQuantity < 1 || isNaN(newQuantity)) {
                 newQuantity = 1;
             }
 
-            // Deshabilitar input visualmente mientras carga
-            input.disabled = true;
-            input.classList.add('opacity-50');
+            input.value = newQuantity;
+            queueCartOp({ op: 'set', id: watchId, quantity: newQuantity });
+        }
+    });
 
-            const url = `/carrito/actualizar/${watchId}/`;
+    // --- 3. EVENTOS EN VIVO (solo usuarios con sesión) ---
+    // El servidor empuja el total del carrito y el stock bajo; no hay sondeo.
+    const eventsUrl = document.getElementById('cart-btn')?.dataset.eventsUrl;
+    if (eventsUrl && window.EventSource) {
+        const events = new EventSource(eventsUrl);
+        const modalOpen = () => !document.getElementById('cart-modal')?.classList.contains('hidden');
 
-            try {
-                const response = await fetch(url, {
-                    method: 'POST',
-                    headers: {
-                        'X-CSRFToken': csrftoken,
-                        'Content-Type': 'application/json'
-                    },
-                    body: JSON.stringify({
-                        action: 'manual',
-                        quantity: newQuantity
-                    })
-                });
-
-                if ((await response.json()).status === 'ok') {
-                    renderCartModal(); // Recargar carrito con nuevos totales
-                }
-            } catch (error) {
-                console.error('Error actualizando cantidad', error);
-                input.disabled = false;
+        events.addEventListener('carrito', (event) => {
+            const data = JSON.parse(event.data);
+            updateCartIcon(data.total_items);
+            if (modalOpen() && pendingOps.length === 0) renderCartModal();
+        });
+
+        events.addEventListener('stock', (event) => {
+            const data = JSON.parse(event.data);
+            if (data.low) {
+                lowStock[data.id] = data;
+            } else {
+                delete lowStock[data.id];
             }
-        }
-    });
+            if (modalOpen() && cartCache) paintCart(cartCache);
+        });
+    }
 });
\ No newline at end of file
@@ -19,6 +19,7 @@ document.addEventListener("DOMContentLoaded", () => {
 
         // Al cambiar filtros, reiniciar paginación
         q.delete('page');
+        q.delete('cursor');
 
         url.search = q.toString();
         window.location.href = url.toString();
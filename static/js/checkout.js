@@ -646,7 +646,13 @@ document.addEventListener("DOMContentLoaded", () => {
                     showGeneralAddressError(
                         "Debes registrar una dirección antes de continuar."
                     );
+
+                    return;
                 }
+
+                // Evita el doble envío; el servidor igual lo detecta por la clave del pedido
+                placeOrderButton.disabled = true;
+                placeOrderButton.textContent = "Procesando...";
             }
         );
     }
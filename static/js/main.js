@@ -119,6 +119,73 @@ document.addEventListener("DOMContentLoaded", () => {
         });
         if(ratingInput) paintStars(ratingInput.value || 0);
     }
+
+    // 6. Autocompletado del buscador (índice en memoria del servidor)
+    const escapeHTML = (text) => String(text).replace(/[&<>"']/g, (c) => ({
+        '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+    }[c]));
+
+    const suggestionIcons = { producto: 'watch', marca: 'award', material: 'gem' };
+
+    document.querySelectorAll('.search-form').forEach((form) => {
+        const input = form.querySelector('input[name="q"]');
+        if (!input) return;
+
+        const list = document.createElement('div');
+        list.className = 'search-suggestions hidden absolute left-0 top-full mt-1 w-full bg-white text-gray-900 rounded-md shadow-lg border border-gray-200 z-50 overflow-hidden';
+        form.appendChild(list);
+
+        let timer = null;
+        let controller = null;
+
+        const hide = () => list.classList.add('hidden');
+
+        const render = (items) => {
+            if (!items.length) {
+                hide();
+                return;
+            }
+            list.innerHTML = items.map((item) => `
+                <a href="${item.url}" class="flex items-center gap-2 px-3 py-2 text-sm hover:bg-gray-100">
+                    <i data-lucide="${suggestionIcons[item.tipo] || 'search'}" class="w-4 h-4 text-gray-400"></i>
+                    <span class="font-medium">${escapeHTML(item.texto)}</span>
+                    ${item.detalle ? `<span class="ml-auto text-xs text-gray-500">${escapeHTML(item.detalle)}</span>` : ''}
+                </a>
+            `).join('');
+            list.classList.remove('hidden');
+            if (window.lucide) window.lucide.createIcons();
+        };
+
+        input.addEventListener('input', () => {
+            clearTimeout(timer);
+            const q = input.value.trim();
+            if (!q) {
+                hide();
+                return;
+            }
+
+            // Debounce corto y cancelación de la petición anterior
+            timer = setTimeout(async () => {
+                if (controller) controller.abort();
+                controller = new AbortController();
+                try {
+                    const response = await fetch(`/api/buscar/sugerencias/?q=${encodeURIComponent(q)}`, { signal: controller.signal });
+                    const data = await response.json();
+                    render(data.sugerencias || []);
+                } catch (e) {
+                    if (e.name !== 'AbortError') hide();
+                }
+            }, 120);
+        });
+
+        input.addEventListener('keydown', (e) => {
+            if (e.key === 'Escape') hide();
+        });
+
+        document.addEventListener('click', (e) => {
+            if (!form.contains(e.target)) hide();
+        });
+    });
 });
 
 // --- UTILERÍAS GLOBALES ---
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class WatchesConfig(AppConfig):
     default_auto_field = "django_mongodb_backend.fields.ObjectIdAutoField"
-    name = "watches"
\ No newline at end of file
+    name = "watches"
+
+    def ready(self):
+        from . import signals  # noqa: F401
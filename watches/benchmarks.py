@@ -0,0 +1,135 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+from .busqueda import terminos_producto
+from .listado import documento_listado
+from .models import Marca, Categoria, Producto, ProductoListado
+from .signals import borrado_en_lote
+
+
+# --- INICIO: UTILERÍAS PARA LOS COMANDOS DE BENCHMARK ---
+
+# Todo lo que siembran los benchmarks lleva este prefijo para poder
+# borrarlo sin tocar el catálogo real.
+PREFIJO_BENCH = '__bench__'
+
+TIPOS_BENCH = ['Deportivo', 'Clasico', 'Elegante', 'Vintage']
+GENEROS_BENCH = ['Hombre', 'Mujer', 'Unisex']
+MATERIALES_BENCH = ['Acero', 'Oro', 'Titanio', 'Cerámica']
+NOMBRES_BENCH = ['Submariner', 'Daytona', 'Nautilus', 'Speedmaster', 'Seamaster',
+                 'Santos', 'Reverso', 'Navitimer', 'Aquanaut', 'Carrera']
+
+
+def preparar_base(nombre):
+    # Los benchmarks siembran y borran datos: corren contra una base de datos
+    # dedicada del mismo servidor (--database) o, sin ella, solo con DEBUG.
+    # Se llama antes de la primera consulta del comando.
+    if nombre:
+        conexion = connections[DEFAULT_DB_ALIAS]
+        conexion.close_pool()
+        conexion.settings_dict['NAME'] = nombre
+    elif not settings.DEBUG:
+        raise CommandError(
+            "Este benchmark escribe y borra en la base de datos: usa --database <nombre> "
+            "para una base dedicada o córrelo con DEBUG=True."
+        )
+
+
+def medir(funcion, repeticiones=20):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def percentil(tiempos, p):
+    ordenados = sorted(tiempos)
+    indice = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+def resumen(tiempos):
+    return {
+        'media': statistics.mean(tiempos),
+        'p50': percentil(tiempos, 50),
+        'p95': percentil(tiempos, 95),
+        'p99': percentil(tiempos, 99),
+    }
+
+
+def formatear_resumen(etiqueta, tiempos):
+    r = resumen(tiempos)
+    return (
+        f"{etiqueta:<40} media={r['media']:8.2f} ms  p50={r['p50']:8.2f} ms  "
+        f"p95={r['p95']:8.2f} ms  p99={r['p99']:8.2f} ms"
+    )
+
+
+def sembrar_catalogo(total, exclusivos=False, lote=1000):
+    # Siembra productos sintéticos hasta llegar a `total` productos de benchmark.
+    marcas = [
+        Marca.objects.get_or_create(nombre=f'{PREFIJO_BENCH} {nombre}')[0]
+        for nombre in ('Rolex', 'Omega', 'Cartier', 'Breitling', 'Patek')
+    ]
+    categorias = [
+        Categoria.objects.get_or_create(genero=genero, material=f'{PREFIJO_BENCH} {material}', tipo=tipo)[0]
+        for tipo in TIPOS_BENCH
+        for genero in GENEROS_BENCH
+        for material in MATERIALES_BENCH[:2]
+    ]
+
+    existentes = Producto.objects.filter(marca__nombre__startswith=PREFIJO_BENCH).count()
+    faltantes = max(0, total - existentes)
+    ahora = timezone.now()
+    rng = random.Random(existentes)
+
+    def guardar(productos):
+        # bulk_create no dispara post_save: el modelo de lectura se llena aquí.
+        Producto.objects.bulk_create(productos)
+        ProductoListado.objects.bulk_create([documento_listado(p) for p in productos])
+
+    pendientes = []
+    for i in range(faltantes):
+        producto = Producto(
+            nombre=f'{rng.choice(NOMBRES_BENCH)} {existentes + i}',
+            precio=Decimal(rng.randint(1500, 150000)),
+            descripcion1='Movimiento automático',
+            descripcion2='Resistente al agua 100 m',
+            descripcion3='Cristal de zafiro',
+            stock=rng.randint(0, 10),
+            es_exclusivo=exclusivos,
+            fecha_creacion=ahora,
+            marca=rng.choice(marcas),
+            categoria=rng.choice(categorias),
+        )
+        # bulk_create no dispara pre_save: los términos se calculan aquí.
+        producto.busqueda = terminos_producto(producto)
+        pendientes.append(producto)
+        if len(pendientes) >= lote:
+            guardar(pendientes)
+            pendientes = []
+
+    if pendientes:
+        guardar(pendientes)
+
+    return faltantes
+
+
+def limpiar_catalogo():
+    # Borrados por queryset sin los receptores por objeto (signals.borrado_en_lote).
+    with borrado_en_lote():
+        ProductoListado.objects.filter(marca__nombre__startswith=PREFIJO_BENCH).delete()
+        Producto.objects.filter(marca__nombre__startswith=PREFIJO_BENCH).delete()
+        Marca.objects.filter(nombre__startswith=PREFIJO_BENCH).delete()
+        Categoria.objects.filter(material__startswith=PREFIJO_BENCH).delete()
+
+# --- FIN: UTILERÍAS PARA LOS COMANDOS DE BENCHMARK ---
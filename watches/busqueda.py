@@ -0,0 +1,210 @@
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+from django.conf import settings
+from pymongo.errors import OperationFailure
+
+from .models import Producto
+from .mongo import coleccion, incrementar_contador, leer_contador
+
+
+# --- INICIO: MOTOR DE BÚSQUEDA DEL CATÁLOGO ---
+
+NOMBRE_INDICE_TEXTO = 'producto_busqueda_texto'
+
+# Peso de cada grupo de campos al calcular la relevancia.
+PESOS = {
+    'nombre': 4,
+    'marca': 3,
+    'atributos': 2,
+    'descripcion': 1,
+}
+
+STOPWORDS = {
+    'a', 'al', 'con', 'de', 'del', 'el', 'en', 'es', 'la', 'las', 'lo', 'los',
+    'o', 'para', 'por', 'que', 'se', 'su', 'sus', 'un', 'una', 'y',
+}
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def normalizar(texto):
+    # Minúsculas y sin acentos: "Clásico" y "clasico" son el mismo término.
+    texto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+
+
+def raiz(token):
+    # Reducción ligera para español: quita el plural y la vocal final
+    # (relojes -> reloj, deportivas -> deportiv, hombres -> hombr).
+    if token.isdigit():
+        return token
+    if len(token) > 3 and token.endswith('s'):
+        token = token[:-1]
+    if len(token) > 4 and token[-1] in 'aeo':
+        token = token[:-1]
+    return token
+
+
+def tokenizar(texto):
+    return [raiz(t) for t in TOKEN_RE.findall(normalizar(texto)) if t not in STOPWORDS]
+
+
+def documento_producto(producto):
+    categoria = producto.categoria
+    return {
+        'nombre': producto.nombre,
+        'marca': producto.marca.nombre,
+        'atributos': ' '.join(filter(None, [categoria.tipo, categoria.material, categoria.genero])),
+        'descripcion': ' '.join(filter(None, [producto.descripcion1, producto.descripcion2, producto.descripcion3])),
+    }
+
+
+def terminos_producto(producto):
+    return {campo: ' '.join(tokenizar(texto)) for campo, texto in documento_producto(producto).items()}
+
+
+def crear_indice_texto():
+    # Los términos ya vienen normalizados, por eso el idioma del índice es 'none'.
+    return coleccion(Producto).create_index(
+        [(f'busqueda.{campo}', 'text') for campo in PESOS],
+        name=NOMBRE_INDICE_TEXTO,
+        weights={f'busqueda.{campo}': peso for campo, peso in PESOS.items()},
+        default_language='none',
+    )
+
+
+class IndiceInvertido:
+    # Respaldo en memoria para cuando no existe el índice de texto en MongoDB.
+    # `version` es el valor del contador 'busqueda' con el que se construyó.
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, version=0):
+        self.version = version
+        self._lock = threading.Lock()
+        self._postings = defaultdict(dict)
+        self._terminos_por_doc = {}
+        self._longitudes = {}
+
+    def actualizar(self, producto_id, terminos):
+        with self._lock:
+            self._quitar(producto_id)
+            pesos = defaultdict(float)
+            for campo, texto in terminos.items():
+                for termino in texto.split():
+                    pesos[termino] += PESOS.get(campo, 1)
+            for termino, peso in pesos.items():
+                self._postings[termino][producto_id] = peso
+            self._terminos_por_doc[producto_id] = set(pesos)
+            self._longitudes[producto_id] = sum(pesos.values())
+
+    def eliminar(self, producto_id):
+        with self._lock:
+            self._quitar(producto_id)
+
+    def _quitar(self, producto_id):
+        for termino in self._terminos_por_doc.pop(producto_id, ()):
+            documentos = self._postings.get(termino)
+            if documentos is not None:
+                documentos.pop(producto_id, None)
+                if not documentos:
+                    del self._postings[termino]
+        self._longitudes.pop(producto_id, None)
+
+    def buscar(self, terminos, limite=None):
+        # Ordenado por relevancia; limite None regresa todas las coincidencias.
+        with self._lock:
+            total = len(self._longitudes)
+            if not total or not terminos:
+                return []
+            promedio = sum(self._longitudes.values()) / total
+            puntajes = defaultdict(float)
+            for termino in set(terminos):
+                documentos = self._postings.get(termino, {})
+                if not documentos:
+                    continue
+                idf = math.log(1 + (total - len(documentos) + 0.5) / (len(documentos) + 0.5))
+                for producto_id, tf in documentos.items():
+                    norma = self.K1 * (1 - self.B + self.B * self._longitudes[producto_id] / promedio)
+                    puntajes[producto_id] += idf * tf * (self.K1 + 1) / (tf + norma)
+        ranking = sorted(puntajes.items(), key=lambda par: (-par[1], str(par[0])))
+        return [producto_id for producto_id, _ in ranking[:limite]]
+
+
+# El índice en memoria es de cada proceso. Los cambios de términos que hace
+# otro worker se notan por el contador compartido 'busqueda' (una lectura por
+# índice en cada búsqueda local): si no coincide, el índice se reconstruye.
+CONTADOR_BUSQUEDA = 'busqueda'
+
+_indice_local = None
+_indice_local_lock = threading.Lock()
+
+
+def indice_local():
+    global _indice_local
+    version = leer_contador(CONTADOR_BUSQUEDA)
+    if _indice_local is None or _indice_local.version != version:
+        with _indice_local_lock:
+            if _indice_local is None or _indice_local.version != version:
+                indice = IndiceInvertido(version)
+                for producto in Producto.objects.select_related('marca', 'categoria'):
+                    indice.actualizar(producto.id, terminos_producto(producto))
+                _indice_local = indice
+    return _indice_local
+
+
+def actualizar_indice_local(producto_id, terminos):
+    # Solo se mantiene si ya se construyó; si no, se construirá completo al usarse.
+    if _indice_local is not None:
+        _indice_local.actualizar(producto_id, terminos)
+
+
+def eliminar_de_indice_local(producto_id):
+    if _indice_local is not None:
+        _indice_local.eliminar(producto_id)
+
+
+def terminos_cambiados():
+    # Después de aplicar un cambio al índice de este proceso. Si nadie más
+    # cambió términos desde su construcción, queda al día con la versión nueva;
+    # si no, se reconstruye en la siguiente búsqueda.
+    version = incrementar_contador(CONTADOR_BUSQUEDA)
+    indice = _indice_local
+    if indice is not None and indice.version == version - 1:
+        indice.version = version
+
+
+def _buscar_mongo(terminos, limite):
+    filtro = {'$text': {'$search': ' '.join(terminos)}}
+    if limite is None:
+        return [doc['_id'] for doc in coleccion(Producto).find(filtro, {'_id': 1})]
+    cursor = coleccion(Producto).find(
+        filtro, {'_id': 1, 'score': {'$meta': 'textScore'}},
+    ).sort([('score', {'$meta': 'textScore'}), ('_id', 1)]).limit(limite)
+    return [doc['_id'] for doc in cursor]
+
+
+def buscar(consulta, relevancia=True):
+    # Ids de Producto que coinciden con la consulta. Con `relevancia`, los
+    # BUSQUEDA_MAX_RESULTADOS más relevantes en orden; sin ella, todas las
+    # coincidencias sin tope ni orden, para los listados que ordenan por otro
+    # campo (precio, nombre...) y no deben perder productos por el recorte.
+    limite = settings.BUSQUEDA_MAX_RESULTADOS if relevancia else None
+    terminos = tokenizar(consulta)
+    if not terminos:
+        return []
+
+    if settings.BUSQUEDA_MOTOR == 'mongo':
+        try:
+            return _buscar_mongo(terminos, limite)
+        except OperationFailure:
+            # Sin índice de texto (p. ej. antes de correr crear_indice_busqueda).
+            pass
+
+    return indice_local().buscar(terminos, limite)
+
+# --- FIN: MOTOR DE BÚSQUEDA DEL CATÁLOGO ---
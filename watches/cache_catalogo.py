@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .mongo import incrementar_contador, leer_contador
+
+
+# --- INICIO: CACHÉ VERSIONADA DEL CATÁLOGO ---
+# Los fragmentos se guardan bajo la versión vigente del catálogo; cada cambio
+# de producto la incrementa y las claves viejas dejan de leerse.
+# La versión debe ser la misma para todos los workers: vive en la caché si es
+# compartida (settings.CACHE_COMPARTIDA) y, si no, en el Contador 'catalogo'
+# de MongoDB (una lectura por índice). Los fragmentos sí pueden estar en la
+# caché local de cada proceso.
+
+CLAVE_VERSION = 'catalogo:version'
+TIMEOUT_FRAGMENTOS = 60 * 10
+
+
+def version_catalogo():
+    if not settings.CACHE_COMPARTIDA:
+        return leer_contador('catalogo')
+
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        cache.add(CLAVE_VERSION, 1, timeout=None)
+        version = cache.get(CLAVE_VERSION, 1)
+    return version
+
+
+def incrementar_version_catalogo():
+    # Las claves viejas no se borran: quedan huérfanas y expiran solas.
+    if not settings.CACHE_COMPARTIDA:
+        return incrementar_contador('catalogo')
+
+    try:
+        return cache.incr(CLAVE_VERSION)
+    except ValueError:
+        cache.add(CLAVE_VERSION, 1, timeout=None)
+        return cache.incr(CLAVE_VERSION)
+
+
+def clave_fragmento(nombre, version=None):
+    return f'catalogo:v{version_catalogo() if version is None else version}:{nombre}'
+
+
+def obtener_fragmento(nombre, calcular, timeout=TIMEOUT_FRAGMENTOS):
+    clave = clave_fragmento(nombre)
+    valor = cache.get(clave)
+    if valor is None:
+        valor = calcular()
+        cache.set(clave, valor, timeout)
+    return valor
+
+# --- FIN: CACHÉ VERSIONADA DEL CATÁLOGO ---
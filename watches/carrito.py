@@ -0,0 +1,721 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from bson.errors import InvalidId
+from django.conf import settings
+from django.utils import timezone
+from pymongo import DeleteMany, DeleteOne, ReturnDocument, UpdateOne
+
+from .estado_usuario import invalidar_estado
+from .eventos import publicar_carrito
+from .models import Carrito, DetalleCarrito, CarritoDocumento, ProductoListado, BarridoCarritos
+from .mongo import coleccion, columna
+
+
+# --- INICIO: SERVICIO DEL CARRITO ---
+# Cada mutación es una operación atómica de MongoDB (upsert / update con
+# pipeline), así dos clics simultáneos no se pisan el incremento.
+#
+# Hay dos almacenamientos, elegidos con settings.CARRITO_ALMACENAMIENTO:
+#   'colecciones': Carrito + DetalleCarrito (el modelo original).
+#   'embebido':    un CarritoDocumento con los renglones y los totales dentro;
+#                  cada mutación y cada lectura es un solo round trip.
+
+VIGENCIA_CARRITO = timedelta(minutes=60)
+
+ACCIONES = ('increase', 'decrease', 'manual')
+
+# /api/carrito/batch/: operaciones admitidas y tope por petición.
+OPERACIONES_LOTE = ('add', 'inc', 'dec', 'set', 'remove')
+MAX_OPERACIONES_LOTE = 50
+
+
+def _decimal(valor):
+    return valor.to_decimal() if isinstance(valor, Decimal128) else Decimal(valor or 0)
+
+
+def _producto_id(valor):
+    try:
+        return ObjectId(str(valor))
+    except (InvalidId, TypeError):
+        raise DetalleCarrito.DoesNotExist
+
+
+def _imagen(producto):
+    imagen = getattr(producto, 'imgproducto', None)
+    return imagen.url.name if imagen else ''
+
+
+def _linea_json(producto_id, cantidad, precio, subtotal, nombre=None, marca=None, imagen=None):
+    linea = {
+        'id': str(producto_id),
+        'quantity': cantidad,
+        'price': float(_decimal(precio)),
+        'subtotal': float(_decimal(subtotal)),
+    }
+    if nombre is not None:
+        linea.update({'name': nombre, 'brand': marca, 'image_url': imagen})
+    return linea
+
+
+class AlmacenColecciones:
+
+    def _filtro_linea(self, carrito_id, producto_id):
+        return {columna(DetalleCarrito, 'carrito'): carrito_id, columna(DetalleCarrito, 'producto'): producto_id}
+
+    @staticmethod
+    def _subtotal():
+        return {'$set': {'subtotal': {'$multiply': ['$cantidad', '$precio_unitario']}}}
+
+    def activo(self, usuario_id):
+        # Upsert sobre (usuario, estado='activo'); la restricción única parcial
+        # carrito_activo_unico evita que dos peticiones creen dos carritos.
+        # El vencimiento lo resuelve expirar_carritos, no la petición.
+        ahora = timezone.now()
+        documento = coleccion(Carrito).find_one_and_update(
+            {columna(Carrito, 'usuario'): usuario_id, 'estado': 'activo'},
+            {'$setOnInsert': {
+                'fecha_creacion': ahora,
+                'fecha_expiracion': ahora + VIGENCIA_CARRITO,
+                'total_items': 0,
+                'total_price': Decimal128('0'),
+            }},
+            projection={'_id': 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return documento['_id']
+
+    def _respuesta(self, carrito_id, producto_id, antes, cantidad, precio):
+        # Toda mutación exitosa pasa por aquí. El renglón se escribe con
+        # find_one_and_update(BEFORE) (o find_one_and_delete): con su estado
+        # anterior y la cantidad nueva sale la diferencia, y un solo update del
+        # Carrito sube la versión, la suma a los totales y los regresa.
+        subtotal = precio * cantidad
+        items_antes = antes['cantidad'] if antes else 0
+        subtotal_antes = _decimal(antes['subtotal']) if antes else Decimal('0')
+        documento = coleccion(Carrito).find_one_and_update(
+            {'_id': carrito_id},
+            {'$inc': {
+                'version': 1,
+                'total_items': cantidad - items_antes,
+                'total_price': Decimal128(subtotal - subtotal_antes),
+            }},
+            projection={'total_items': 1, 'total_price': 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        return {
+            'total_items': documento['total_items'],
+            'total_price': float(_decimal(documento['total_price'])),
+            'line': _linea_json(producto_id, cantidad, precio, subtotal) if cantidad > 0 else None,
+        }
+
+    def agregar(self, usuario_id, producto, cantidad):
+        carrito_id = self.activo(usuario_id)
+        antes = coleccion(DetalleCarrito).find_one_and_update(
+            self._filtro_linea(carrito_id, producto.id),
+            [
+                {'$set': {
+                    'cantidad': {'$add': [{'$ifNull': ['$cantidad', 0]}, cantidad]},
+                    # El precio se fija al agregar el producto por primera vez.
+                    'precio_unitario': {'$ifNull': ['$precio_unitario', Decimal128(str(producto.precio))]},
+                }},
+                self._subtotal(),
+            ],
+            upsert=True,
+            return_document=ReturnDocument.BEFORE,
+        )
+        if antes is None:
+            return self._respuesta(carrito_id, producto.id, None, cantidad, producto.precio)
+        return self._respuesta(
+            carrito_id, producto.id, antes, antes['cantidad'] + cantidad, _decimal(antes['precio_unitario']),
+        )
+
+    def cambiar(self, usuario_id, producto_id, accion, cantidad):
+        carrito_id = self.activo(usuario_id)
+        detalles = coleccion(DetalleCarrito)
+        filtro = self._filtro_linea(carrito_id, producto_id)
+
+        if accion == 'manual' and cantidad <= 0:
+            antes = detalles.find_one_and_delete(filtro)
+            if antes is None:
+                raise DetalleCarrito.DoesNotExist
+            return self._respuesta(carrito_id, producto_id, antes, 0, _decimal(antes['precio_unitario']))
+
+        nueva = {
+            'increase': {'$add': ['$cantidad', 1]},
+            # Nunca bajo cero: dos clics simultáneos sobre una pieza no
+            # descuentan de más en los totales.
+            'decrease': {'$max': [{'$add': ['$cantidad', -1]}, 0]},
+            'manual': cantidad,
+        }[accion]
+        antes = detalles.find_one_and_update(
+            filtro,
+            [{'$set': {'cantidad': nueva}}, self._subtotal()],
+            return_document=ReturnDocument.BEFORE,
+        )
+        if antes is None:
+            raise DetalleCarrito.DoesNotExist
+
+        cantidad_nueva = {
+            'increase': antes['cantidad'] + 1,
+            'decrease': max(antes['cantidad'] - 1, 0),
+            'manual': cantidad,
+        }[accion]
+        if cantidad_nueva <= 0:
+            # Condicionado a la cantidad: si otro clic ya la subió, no se borra.
+            detalles.delete_one({'_id': antes['_id'], 'cantidad': {'$lte': 0}})
+
+        return self._respuesta(carrito_id, producto_id, antes, cantidad_nueva, _decimal(antes['precio_unitario']))
+
+    def quitar(self, usuario_id, producto_id):
+        carrito_id = self.activo(usuario_id)
+        antes = coleccion(DetalleCarrito).find_one_and_delete(self._filtro_linea(carrito_id, producto_id))
+        precio = _decimal(antes['precio_unitario']) if antes else Decimal('0')
+        return self._respuesta(carrito_id, producto_id, antes, 0, precio)
+
+    def contenido(self, usuario_id):
+        # Un aggregate: carrito activo + renglones + datos del modelo de lectura.
+        carrito = next(coleccion(Carrito).aggregate([
+            {'$match': {columna(Carrito, 'usuario'): usuario_id, 'estado': 'activo'}},
+            {'$limit': 1},
+            {'$lookup': {
+                'from': DetalleCarrito._meta.db_table,
+                'localField': '_id',
+                'foreignField': columna(DetalleCarrito, 'carrito'),
+                'as': 'detalles',
+                'pipeline': [
+                    {'$lookup': {
+                        'from': ProductoListado._meta.db_table,
+                        'localField': columna(DetalleCarrito, 'producto'),
+                        'foreignField': '_id',
+                        'as': 'producto',
+                    }},
+                    {'$unwind': '$producto'},
+                ],
+            }},
+        ]), None)
+
+        if carrito is None:
+            return None, []
+        lineas = [
+            {
+                'producto_id': d[columna(DetalleCarrito, 'producto')],
+                'cantidad': d['cantidad'],
+                'precio_unitario': _decimal(d['precio_unitario']),
+                'subtotal': _decimal(d['subtotal']),
+                'nombre': d['producto']['nombre'],
+                'marca': d['producto']['marca']['nombre'],
+                'imagen': (d['producto'].get('imgproducto') or {}).get('url', ''),
+            }
+            for d in carrito['detalles']
+        ]
+        return carrito['_id'], lineas
+
+    def convertir(self, carrito_id, sesion=None):
+        return coleccion(Carrito).update_one(
+            {'_id': carrito_id, 'estado': 'activo'}, {'$set': {'estado': 'convertido'}}, session=sesion,
+        ).modified_count == 1
+
+    def version(self, usuario_id):
+        return coleccion(Carrito).find_one(
+            {columna(Carrito, 'usuario'): usuario_id, 'estado': 'activo'}, {'version': 1},
+        )
+
+    def lote(self, usuario_id, operaciones, productos):
+        # Un bulk_write ordenado con todas las operaciones y la limpieza de
+        # renglones en cero; después la versión y la lectura del carrito.
+        carrito_id = self.activo(usuario_id)
+        escrituras = []
+        for tipo, producto_id, cantidad in operaciones:
+            filtro = self._filtro_linea(carrito_id, producto_id)
+            if tipo in ('add', 'merge'):
+                precio = Decimal128(str(productos[producto_id].precio))
+                escrituras.append(UpdateOne(filtro, [
+                    {'$set': {
+                        'cantidad': {'$add': [{'$ifNull': ['$cantidad', 0]}, cantidad]},
+                        # 'merge' (carrito de sesión al iniciar sesión) toma el precio vigente.
+                        'precio_unitario': precio if tipo == 'merge' else {'$ifNull': ['$precio_unitario', precio]},
+                    }},
+                    self._subtotal(),
+                ], upsert=True))
+            elif tipo in ('inc', 'dec'):
+                paso = cantidad if tipo == 'inc' else -cantidad
+                escrituras.append(UpdateOne(filtro, [
+                    {'$set': {'cantidad': {'$add': ['$cantidad', paso]}}}, self._subtotal(),
+                ]))
+            elif tipo == 'set' and cantidad > 0:
+                escrituras.append(UpdateOne(filtro, [{'$set': {'cantidad': cantidad}}, self._subtotal()]))
+            else:
+                escrituras.append(DeleteOne(filtro))
+        escrituras.append(DeleteMany({columna(DetalleCarrito, 'carrito'): carrito_id, 'cantidad': {'$lte': 0}}))
+
+        coleccion(DetalleCarrito).bulk_write(escrituras, ordered=True)
+        _, lineas = self.contenido(usuario_id)
+        # Los totales se recalculan desde los renglones recién leídos (un
+        # bulk_write no dice cuánto cambió cada uno).
+        documento = coleccion(Carrito).find_one_and_update(
+            {'_id': carrito_id},
+            {'$inc': {'version': 1}, '$set': self._totales(lineas)},
+            projection={'version': 1}, return_document=ReturnDocument.AFTER,
+        )
+        return documento, lineas
+
+    @staticmethod
+    def _totales(lineas):
+        return {
+            'total_items': sum(l['cantidad'] for l in lineas),
+            'total_price': Decimal128(sum((l['subtotal'] for l in lineas), Decimal('0'))),
+        }
+
+    def usuarios_activos(self):
+        return coleccion(Carrito).distinct(columna(Carrito, 'usuario'), {'estado': 'activo'})
+
+    def escribir(self, usuario_id, lineas):
+        carrito_id = self.activo(usuario_id)
+        if lineas:
+            coleccion(DetalleCarrito).insert_many([
+                {
+                    columna(DetalleCarrito, 'carrito'): carrito_id,
+                    columna(DetalleCarrito, 'producto'): l['producto_id'],
+                    'cantidad': l['cantidad'],
+                    'precio_unitario': Decimal128(l['precio_unitario']),
+                    'subtotal': Decimal128(l['subtotal']),
+                }
+                for l in lineas
+            ])
+            coleccion(Carrito).update_one({'_id': carrito_id}, {'$set': self._totales(lineas)})
+
+    def descartar(self, usuario_id):
+        carritos = [c['_id'] for c in coleccion(Carrito).find(
+            {columna(Carrito, 'usuario'): usuario_id, 'estado': 'activo'}, {'_id': 1},
+        )]
+        coleccion(DetalleCarrito).delete_many({columna(DetalleCarrito, 'carrito'): {'$in': carritos}})
+        coleccion(Carrito).delete_many({'_id': {'$in': carritos}})
+
+
+class AlmacenEmbebido:
+
+    def _filtro(self, usuario_id):
+        return {columna(CarritoDocumento, 'usuario'): usuario_id, 'estado': 'activo'}
+
+    @staticmethod
+    def _recalcular():
+        # Quita renglones en cero, recalcula subtotales y totales del documento.
+        return [
+            {'$set': {'lineas': {'$map': {
+                'input': {'$filter': {'input': '$lineas', 'as': 'l', 'cond': {'$gt': ['$$l.cantidad', 0]}}},
+                'as': 'l',
+                'in': {'$mergeObjects': ['$$l', {'subtotal': {'$multiply': ['$$l.cantidad', '$$l.precio_unitario']}}]},
+            }}}},
+            {'$set': {
+                'total_items': {'$sum': '$lineas.cantidad'},
+                'total_price': {'$toDecimal': {'$sum': '$lineas.subtotal'}},
+                'version': {'$add': [{'$ifNull': ['$version', 0]}, 1]},
+            }},
+        ]
+
+    @staticmethod
+    def _cambiar_linea(producto_id, expresion, precio=None):
+        cambios = {'cantidad': expresion}
+        if precio is not None:
+            cambios['precio_unitario'] = Decimal128(str(precio))
+        return {'$set': {'lineas': {'$map': {
+            'input': '$lineas',
+            'as': 'l',
+            'in': {'$cond': [
+                {'$eq': ['$$l.producto_id', producto_id]},
+                {'$mergeObjects': ['$$l', cambios]},
+                '$$l',
+            ]},
+        }}}}
+
+    def _respuesta(self, documento, producto_id):
+        if documento is None:
+            return {'total_items': 0, 'total_price': 0.0, 'line': None}
+        linea = next((l for l in documento['lineas'] if l['producto_id'] == producto_id), None)
+        return {
+            'total_items': documento['total_items'],
+            'total_price': float(_decimal(documento['total_price'])),
+            'line': _linea_json(
+                producto_id, linea['cantidad'], linea['precio_unitario'], linea['subtotal'],
+            ) if linea else None,
+        }
+
+    def activo(self, usuario_id):
+        ahora = timezone.now()
+        documento = coleccion(CarritoDocumento).find_one_and_update(
+            self._filtro(usuario_id),
+            {'$setOnInsert': {
+                'fecha_creacion': ahora,
+                'fecha_expiracion': ahora + VIGENCIA_CARRITO,
+                'lineas': [],
+                'total_items': 0,
+                'total_price': Decimal128('0'),
+                'version': 0,
+            }},
+            projection={'_id': 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return documento['_id']
+
+    @staticmethod
+    def _inicializar():
+        # Para los upserts: fechas y renglones del documento recién creado.
+        ahora = timezone.now()
+        return {'$set': {
+            'fecha_creacion': {'$ifNull': ['$fecha_creacion', ahora]},
+            'fecha_expiracion': {'$ifNull': ['$fecha_expiracion', ahora + VIGENCIA_CARRITO]},
+            'lineas': {'$ifNull': ['$lineas', []]},
+        }}
+
+    @staticmethod
+    def _asegurar_linea(producto):
+        # Agrega el renglón en cero si el producto todavía no está en el carrito.
+        nueva = {
+            'producto_id': producto.id,
+            'nombre': producto.nombre,
+            'marca': producto.marca.nombre,
+            'imagen': _imagen(producto),
+            'cantidad': 0,
+            'precio_unitario': Decimal128(str(producto.precio)),
+            'subtotal': Decimal128('0'),
+        }
+        return {'$set': {'lineas': {'$cond': [
+            {'$in': [producto.id, '$lineas.producto_id']},
+            '$lineas',
+            # $literal: el nombre del producto podría empezar con '$'.
+            {'$concatArrays': ['$lineas', [{'$literal': nueva}]]},
+        ]}}}
+
+    def agregar(self, usuario_id, producto, cantidad):
+        documento = coleccion(CarritoDocumento).find_one_and_update(
+            self._filtro(usuario_id),
+            [
+                self._inicializar(),
+                self._asegurar_linea(producto),
+                self._cambiar_linea(producto.id, {'$add': ['$$l.cantidad', cantidad]}),
+                *self._recalcular(),
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return self._respuesta(documento, producto.id)
+
+    def cambiar(self, usuario_id, producto_id, accion, cantidad):
+        expresion = {
+            'increase': {'$add': ['$$l.cantidad', 1]},
+            'decrease': {'$add': ['$$l.cantidad', -1]},
+            'manual': {'$literal': max(cantidad, 0)},
+        }[accion]
+        documento = coleccion(CarritoDocumento).find_one_and_update(
+            {**self._filtro(usuario_id), 'lineas.producto_id': producto_id},
+            [self._cambiar_linea(producto_id, expresion), *self._recalcular()],
+            return_document=ReturnDocument.AFTER,
+        )
+        if documento is None:
+            raise DetalleCarrito.DoesNotExist
+        return self._respuesta(documento, producto_id)
+
+    def quitar(self, usuario_id, producto_id):
+        documento = coleccion(CarritoDocumento).find_one_and_update(
+            self._filtro(usuario_id),
+            [
+                {'$set': {'lineas': {'$filter': {
+                    'input': '$lineas', 'as': 'l', 'cond': {'$ne': ['$$l.producto_id', producto_id]},
+                }}}},
+                *self._recalcular(),
+            ],
+            return_document=ReturnDocument.AFTER,
+        )
+        return self._respuesta(documento, producto_id)
+
+    def lote(self, usuario_id, operaciones, productos):
+        # Todas las operaciones son etapas de un mismo update con pipeline:
+        # un solo round trip sin importar cuántas sean.
+        etapas = [self._inicializar()]
+        for tipo, producto_id, cantidad in operaciones:
+            if tipo in ('add', 'merge'):
+                producto = productos[producto_id]
+                etapas.append(self._asegurar_linea(producto))
+                etapas.append(self._cambiar_linea(
+                    producto_id, {'$add': ['$$l.cantidad', cantidad]},
+                    precio=producto.precio if tipo == 'merge' else None,
+                ))
+            elif tipo in ('inc', 'dec'):
+                paso = cantidad if tipo == 'inc' else -cantidad
+                etapas.append(self._cambiar_linea(producto_id, {'$add': ['$$l.cantidad', paso]}))
+            elif tipo == 'set':
+                etapas.append(self._cambiar_linea(producto_id, {'$literal': max(cantidad, 0)}))
+            else:
+                etapas.append({'$set': {'lineas': {'$filter': {
+                    'input': '$lineas', 'as': 'l', 'cond': {'$ne': ['$$l.producto_id', producto_id]},
+                }}}})
+
+        documento = coleccion(CarritoDocumento).find_one_and_update(
+            self._filtro(usuario_id),
+            [*etapas, *self._recalcular()],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return documento, self._lineas(documento)
+
+    @staticmethod
+    def _lineas(documento):
+        return [
+            {
+                'producto_id': l['producto_id'],
+                'cantidad': l['cantidad'],
+                'precio_unitario': _decimal(l['precio_unitario']),
+                'subtotal': _decimal(l['subtotal']),
+                'nombre': l['nombre'],
+                'marca': l['marca'],
+                'imagen': l.get('imagen', ''),
+            }
+            for l in documento['lineas']
+        ]
+
+    def contenido(self, usuario_id):
+        documento = coleccion(CarritoDocumento).find_one(self._filtro(usuario_id))
+        if documento is None:
+            return None, []
+        return documento['_id'], self._lineas(documento)
+
+    def convertir(self, carrito_id, sesion=None):
+        return coleccion(CarritoDocumento).update_one(
+            {'_id': carrito_id, 'estado': 'activo'}, {'$set': {'estado': 'convertido'}}, session=sesion,
+        ).modified_count == 1
+
+    def version(self, usuario_id):
+        return coleccion(CarritoDocumento).find_one(self._filtro(usuario_id), {'version': 1})
+
+    def usuarios_activos(self):
+        return coleccion(CarritoDocumento).distinct(columna(CarritoDocumento, 'usuario'), {'estado': 'activo'})
+
+    def escribir(self, usuario_id, lineas):
+        ahora = timezone.now()
+        coleccion(CarritoDocumento).insert_one({
+            columna(CarritoDocumento, 'usuario'): usuario_id,
+            'estado': 'activo',
+            'fecha_creacion': ahora,
+            'fecha_expiracion': ahora + VIGENCIA_CARRITO,
+            'lineas': [
+                {
+                    'producto_id': l['producto_id'],
+                    'nombre': l['nombre'],
+                    'marca': l['marca'],
+                    'imagen': l['imagen'],
+                    'cantidad': l['cantidad'],
+                    'precio_unitario': Decimal128(l['precio_unitario']),
+                    'subtotal': Decimal128(l['subtotal']),
+                }
+                for l in lineas
+            ],
+            'total_items': sum(l['cantidad'] for l in lineas),
+            'total_price': Decimal128(sum((l['subtotal'] for l in lineas), Decimal('0'))),
+            'version': 0,
+        })
+
+    def descartar(self, usuario_id):
+        coleccion(CarritoDocumento).delete_many(self._filtro(usuario_id))
+
+
+ALMACENES = {
+    'colecciones': AlmacenColecciones(),
+    'embebido': AlmacenEmbebido(),
+}
+
+
+def almacen():
+    return ALMACENES[settings.CARRITO_ALMACENAMIENTO]
+
+
+def usa_colecciones():
+    return settings.CARRITO_ALMACENAMIENTO == 'colecciones'
+
+
+def _carrito_cambiado(usuario_id, total_items):
+    # Después de cada mutación: estado cacheado fuera y aviso a los flujos SSE.
+    invalidar_estado(usuario_id)
+    publicar_carrito(usuario_id, total_items)
+
+
+def carrito_activo(usuario_id):
+    return almacen().activo(usuario_id)
+
+
+def agregar_al_carrito(usuario_id, producto, cantidad=1):
+    # `producto` es un ProductoListado: trae marca e imagen para el renglón embebido.
+    respuesta = almacen().agregar(usuario_id, producto, cantidad)
+    _carrito_cambiado(usuario_id, respuesta['total_items'])
+    return respuesta
+
+
+def cambiar_cantidad(usuario_id, producto_id, accion, cantidad=1):
+    if accion not in ACCIONES:
+        raise ValueError(f"Acción de carrito no válida: {accion}")
+    respuesta = almacen().cambiar(usuario_id, _producto_id(producto_id), accion, cantidad)
+    _carrito_cambiado(usuario_id, respuesta['total_items'])
+    return respuesta
+
+
+def quitar_del_carrito(usuario_id, producto_id):
+    respuesta = almacen().quitar(usuario_id, _producto_id(producto_id))
+    _carrito_cambiado(usuario_id, respuesta['total_items'])
+    return respuesta
+
+
+def lineas_carrito(usuario_id):
+    # (id del carrito activo, renglones); no crea el carrito si no existe.
+    return almacen().contenido(usuario_id)
+
+
+def _contenido_json(lineas):
+    return {
+        'cart_items': [
+            _linea_json(l['producto_id'], l['cantidad'], l['precio_unitario'], l['subtotal'],
+                        l['nombre'], l['marca'], l['imagen'])
+            for l in lineas
+        ],
+        'total_items': sum(l['cantidad'] for l in lineas),
+        'total_price': float(sum((l['subtotal'] for l in lineas), Decimal('0'))),
+    }
+
+
+def contenido_carrito(usuario_id, lineas=None):
+    # Formato de /api/carrito/ y del checkout (que ya trae las líneas leídas).
+    if lineas is None:
+        _, lineas = lineas_carrito(usuario_id)
+    return _contenido_json(lineas)
+
+
+def _version(documento):
+    if documento is None:
+        return 'vacio'
+    return f"{documento['_id']}-{documento.get('version', 0)}"
+
+
+def version_carrito(usuario_id):
+    # Identificador de la versión del carrito activo: una lectura por índice,
+    # sin renglones. Cambia con cada mutación y cuando el carrito se reemplaza.
+    return _version(almacen().version(usuario_id))
+
+
+def normalizar_lote(operaciones):
+    # [{'op': 'add'|'inc'|'dec'|'set'|'remove', 'id': ..., 'quantity': n}, ...]
+    # -> [(op, ObjectId, cantidad)]; cualquier entrada inválida es ValueError.
+    if not isinstance(operaciones, list) or not 0 < len(operaciones) <= MAX_OPERACIONES_LOTE:
+        raise ValueError(f"Se esperan entre 1 y {MAX_OPERACIONES_LOTE} operaciones")
+
+    normalizadas = []
+    for operacion in operaciones:
+        if not isinstance(operacion, dict) or operacion.get('op') not in OPERACIONES_LOTE:
+            raise ValueError(f"Operación de carrito no válida: {operacion}")
+        try:
+            producto_id = ObjectId(str(operacion.get('id')))
+            cantidad = int(operacion.get('quantity', 1))
+        except (InvalidId, TypeError, ValueError):
+            raise ValueError(f"Operación de carrito no válida: {operacion}")
+        if cantidad < 0:
+            raise ValueError(f"Cantidad no válida: {operacion}")
+        normalizadas.append((operacion['op'], producto_id, cantidad))
+    return normalizadas
+
+
+def aplicar_lote(usuario_id, operaciones):
+    # `operaciones` ya normalizadas. Regresa el carrito final con su versión.
+    ids_agregar = {producto_id for tipo, producto_id, _ in operaciones if tipo in ('add', 'merge')}
+    productos = ProductoListado.objects.in_bulk(ids_agregar) if ids_agregar else {}
+    if len(productos) != len(ids_agregar):
+        raise ProductoListado.DoesNotExist
+
+    documento, lineas = almacen().lote(usuario_id, operaciones, productos)
+    contenido = _contenido_json(lineas)
+    _carrito_cambiado(usuario_id, contenido['total_items'])
+    return {**contenido, 'version': _version(documento)}
+
+
+def convertir_carrito(carrito_id, sesion=None):
+    # Lo llama pedidos.colocar_pedido dentro de su transacción; False si el
+    # carrito ya no estaba activo (doble envío del checkout, expiración).
+    # El aviso de carrito vacío (carrito_vaciado) va después del commit.
+    return almacen().convertir(carrito_id, sesion=sesion)
+
+
+def carrito_vaciado(usuario_id):
+    _carrito_cambiado(usuario_id, 0)
+
+
+def trasladar_carritos(origen, destino):
+    # Copia los carritos activos de un almacenamiento al otro (comando
+    # convertir_carritos). Si el usuario ya tiene carrito activo en el destino
+    # se conserva ese y el de origen se deja intacto.
+    fuente, meta = ALMACENES[origen], ALMACENES[destino]
+    trasladados = omitidos = 0
+    for usuario_id in fuente.usuarios_activos():
+        if meta.contenido(usuario_id)[0] is not None:
+            omitidos += 1
+            continue
+        _, lineas = fuente.contenido(usuario_id)
+        meta.escribir(usuario_id, lineas)
+        fuente.descartar(usuario_id)
+        invalidar_estado(usuario_id)
+        trasladados += 1
+    return trasladados, omitidos
+
+
+def expirar_carritos(ahora=None):
+    # Un update_many por almacenamiento sobre el índice (estado, fecha_expiracion);
+    # se invalida el estado cacheado de los usuarios afectados.
+    ahora = ahora or timezone.now()
+    inicio = time.perf_counter()
+    expirados = {}
+    for nombre, modelo in (('colecciones', Carrito), ('embebido', CarritoDocumento)):
+        carritos = coleccion(modelo)
+        filtro = {'estado': 'activo', 'fecha_expiracion': {'$lt': ahora}}
+        usuarios = carritos.distinct(columna(modelo, 'usuario'), filtro)
+        expirados[nombre] = carritos.update_many(filtro, {'$set': {'estado': 'expirado'}}).modified_count
+        for usuario_id in usuarios:
+            _carrito_cambiado(usuario_id, 0)
+
+    return BarridoCarritos.objects.create(
+        fecha=ahora,
+        expirados_colecciones=expirados['colecciones'],
+        expirados_embebidos=expirados['embebido'],
+        duracion_ms=(time.perf_counter() - inicio) * 1000,
+    )
+
+
+def fusionar_carrito_invitado(usuario_id, cantidades_invitado):
+    # Vuelca el carrito del visitante ({id: cantidad}, ver carrito_invitado) en
+    # el carrito del usuario con una sola escritura en bloque. Las cantidades
+    # se suman a las que ya tuviera y el precio de esos renglones se actualiza
+    # al vigente. Los productos borrados o inexistentes se descartan.
+    cantidades = {}
+    for pid, cantidad in cantidades_invitado.items():
+        try:
+            producto_id = ObjectId(pid)
+            cantidad = int(cantidad)
+        except (InvalidId, TypeError, ValueError):
+            continue
+        if cantidad > 0:
+            cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad
+
+    productos = ProductoListado.objects.filter(pk__in=list(cantidades), fecha_borrado__isnull=True).in_bulk()
+    operaciones = [
+        ('merge', producto_id, cantidad)
+        for producto_id, cantidad in cantidades.items()
+        if producto_id in productos
+    ]
+    if not operaciones:
+        return 0
+
+    _, lineas = almacen().lote(usuario_id, operaciones, productos)
+    _carrito_cambiado(usuario_id, sum(l['cantidad'] for l in lineas))
+    return len(operaciones)
+
+# --- FIN: SERVICIO DEL CARRITO ---
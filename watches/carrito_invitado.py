@@ -0,0 +1,257 @@
+import base64
+import binascii
+import hashlib
+import json
+import struct
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache_catalogo import clave_fragmento, version_catalogo, TIMEOUT_FRAGMENTOS
+from .models import ProductoListado
+
+
+# --- INICIO: CARRITO DE VISITANTES ---
+# Dos formatos, elegidos con settings.CARRITO_INVITADO:
+#   'sesion': request.session['cart'] con nombre, marca, precio e imagen por
+#             renglón (el formato original); cada clic que cambia algo
+#             reescribe la sesión.
+#   'cookie': una cookie firmada con pares (producto, cantidad) en binario;
+#             los datos de cada producto se hidratan desde ProductoListado
+#             con caché. Los clics de un visitante no escriben en la base.
+
+COOKIE_CARRITO = 'carrito'
+SALT_COOKIE = 'watches.carrito_invitado'
+VIGENCIA_COOKIE = 60 * 60 * 24 * 30
+# 12 bytes de ObjectId + 2 de cantidad: 100 renglones caben holgados en 4 KB.
+RENGLON = struct.Struct('>12sH')
+MAX_RENGLONES_COOKIE = 100
+
+
+def _imagen(producto):
+    return producto.imgproducto.url.name if producto.imgproducto else ''
+
+
+def _aplicar(cantidades, operaciones, productos):
+    # Mismas operaciones que /api/carrito/batch/ sobre {id: cantidad}.
+    cantidades = dict(cantidades)
+    for tipo, producto_id, cantidad in operaciones:
+        pid = str(producto_id)
+        if tipo == 'add':
+            if producto_id not in productos:
+                raise ProductoListado.DoesNotExist
+            cantidades[pid] = cantidades.get(pid, 0) + cantidad
+        elif pid in cantidades:
+            if tipo == 'inc':
+                cantidades[pid] += cantidad
+            elif tipo == 'dec':
+                cantidades[pid] -= cantidad
+            elif tipo == 'set':
+                cantidades[pid] = cantidad
+            else:
+                cantidades[pid] = 0
+    return {pid: cantidad for pid, cantidad in cantidades.items() if cantidad > 0}
+
+
+def _contenido(items, version):
+    # items: [(id, {'name', 'brand', 'price', 'image_url'}, cantidad)]
+    cart_items = []
+    total_price = 0
+    total_items = 0
+
+    for pid, datos, cantidad in items:
+        subtotal = cantidad * float(datos['price'])
+        cart_items.append({
+            'id': pid, 'name': datos['name'], 'brand': datos.get('brand', ''),
+            'quantity': cantidad, 'price': float(datos['price']),
+            'image_url': datos['image_url'], 'subtotal': subtotal
+        })
+        total_price += subtotal
+        total_items += cantidad
+
+    return {
+        'cart_items': cart_items,
+        'total_price': total_price,
+        'total_items': total_items,
+        'version': version,
+    }
+
+
+class InvitadoSesion:
+
+    def _carrito(self, request):
+        return request.session.get('cart', {})
+
+    def cantidades(self, request):
+        return {pid: item['quantity'] for pid, item in self._carrito(request).items()}
+
+    def version(self, request):
+        return hashlib.md5(json.dumps(self._carrito(request), sort_keys=True).encode()).hexdigest()
+
+    def contenido(self, request):
+        carrito = self._carrito(request)
+        return _contenido(
+            [(pid, item, item['quantity']) for pid, item in carrito.items()],
+            self.version(request),
+        )
+
+    def aplicar(self, request, operaciones, productos):
+        carrito = self._carrito(request)
+        nuevo = {}
+        for pid, cantidad in _aplicar(self.cantidades(request), operaciones, productos).items():
+            item = carrito.get(pid)
+            if item is None:
+                producto = productos[ObjectId(pid)]
+                item = {
+                    'price': str(producto.precio), 'name': producto.nombre,
+                    'image_url': _imagen(producto), 'brand': producto.marca.nombre
+                }
+            nuevo[pid] = {**item, 'quantity': cantidad}
+        # Sin cambios (p. ej. quitar algo que no estaba) la sesión no se marca
+        # como modificada y SessionMiddleware no la escribe.
+        if nuevo != carrito:
+            request.session['cart'] = nuevo
+        return self.contenido(request)
+
+    def extraer(self, request):
+        cantidades = self.cantidades(request)
+        if cantidades:
+            request.session.pop('cart', None)
+        return cantidades
+
+
+class InvitadoCookie:
+
+    @staticmethod
+    def codificar(cantidades):
+        binario = b''.join(
+            RENGLON.pack(ObjectId(pid).binary, min(cantidad, 0xFFFF))
+            for pid, cantidad in cantidades.items()
+        )
+        return base64.urlsafe_b64encode(binario).rstrip(b'=').decode()
+
+    @staticmethod
+    def decodificar(texto):
+        try:
+            binario = base64.urlsafe_b64decode(texto + '=' * (-len(texto) % 4))
+            return {
+                str(ObjectId(oid)): cantidad
+                for oid, cantidad in RENGLON.iter_unpack(binario)
+                if cantidad > 0
+            }
+        except (binascii.Error, struct.error, InvalidId, ValueError):
+            return {}
+
+    def cantidades(self, request):
+        # Cacheado en la petición: lo que se escriba también se lee de aquí.
+        if not hasattr(request, '_carrito_cookie'):
+            texto = request.get_signed_cookie(
+                COOKIE_CARRITO, default=None, salt=SALT_COOKIE, max_age=VIGENCIA_COOKIE,
+            )
+            request._carrito_cookie = self.decodificar(texto) if texto else {}
+        return request._carrito_cookie
+
+    def guardar(self, request, cantidades):
+        if len(cantidades) > MAX_RENGLONES_COOKIE:
+            raise ValueError(f"El carrito admite hasta {MAX_RENGLONES_COOKIE} productos distintos")
+        request._carrito_cookie = cantidades
+        # CarritoInvitadoMiddleware escribe (o borra) la cookie en la respuesta.
+        request._carrito_cookie_pendiente = True
+
+    def version(self, request):
+        return hashlib.md5(self.codificar(self.cantidades(request)).encode()).hexdigest()
+
+    def _datos_productos(self, ids):
+        # Datos de despliegue por producto; la clave lleva la versión del
+        # catálogo, así que un cambio de producto invalida la entrada.
+        version = version_catalogo()
+        claves = {clave_fragmento(f'invitado:producto:{pid}', version): pid for pid in ids}
+        datos = {claves[clave]: valor for clave, valor in cache.get_many(list(claves)).items()}
+
+        faltantes = [ObjectId(pid) for pid in ids if pid not in datos]
+        if faltantes:
+            nuevos = {
+                str(producto.pk): {
+                    'name': producto.nombre, 'brand': producto.marca.nombre,
+                    'price': str(producto.precio), 'image_url': _imagen(producto),
+                }
+                for producto in ProductoListado.objects.filter(pk__in=faltantes)
+            }
+            cache.set_many(
+                {clave: nuevos[pid] for clave, pid in claves.items() if pid in nuevos},
+                TIMEOUT_FRAGMENTOS,
+            )
+            datos.update(nuevos)
+        return datos
+
+    def contenido(self, request):
+        cantidades = self.cantidades(request)
+        datos = self._datos_productos(list(cantidades))
+        # Los productos que ya no existen se omiten.
+        return _contenido(
+            [(pid, datos[pid], cantidad) for pid, cantidad in cantidades.items() if pid in datos],
+            self.version(request),
+        )
+
+    def aplicar(self, request, operaciones, productos):
+        nuevas = _aplicar(self.cantidades(request), operaciones, productos)
+        if nuevas != self.cantidades(request):
+            self.guardar(request, nuevas)
+        return self.contenido(request)
+
+    def extraer(self, request):
+        cantidades = self.cantidades(request)
+        if cantidades:
+            self.guardar(request, {})
+        return cantidades
+
+
+def escribir_cookie(request, response):
+    cantidades = request._carrito_cookie
+    if cantidades:
+        response.set_signed_cookie(
+            COOKIE_CARRITO, InvitadoCookie.codificar(cantidades), salt=SALT_COOKIE,
+            max_age=VIGENCIA_COOKIE, httponly=True, samesite='Lax',
+            secure=settings.SESSION_COOKIE_SECURE,
+        )
+    else:
+        response.delete_cookie(COOKIE_CARRITO, samesite='Lax')
+
+
+INVITADOS = {
+    'sesion': InvitadoSesion(),
+    'cookie': InvitadoCookie(),
+}
+
+
+def invitado():
+    return INVITADOS[settings.CARRITO_INVITADO]
+
+
+def contenido_invitado(request):
+    return invitado().contenido(request)
+
+
+def version_invitado(request):
+    return invitado().version(request)
+
+
+def total_items_invitado(request):
+    return sum(invitado().cantidades(request).values())
+
+
+def aplicar_invitado(request, operaciones, productos=None):
+    # `operaciones` con el formato de carrito.normalizar_lote.
+    if productos is None:
+        ids_agregar = [producto_id for tipo, producto_id, _ in operaciones if tipo == 'add']
+        productos = ProductoListado.objects.in_bulk(ids_agregar) if ids_agregar else {}
+    return invitado().aplicar(request, operaciones, productos)
+
+
+def extraer_invitado(request):
+    # {id: cantidad} del carrito del visitante, que queda vacío (al iniciar sesión).
+    return invitado().extraer(request)
+
+# --- FIN: CARRITO DE VISITANTES ---
@@ -0,0 +1,78 @@
+from django.db.models import Q
+
+
+# --- INICIO: CONSTRUCTOR DE CONSULTAS DEL CATÁLOGO ---
+
+# Cada rango de precio se traduce a lookups del ORM para que el filtro
+# se resuelva en el $match del pipeline y no en Python.
+RANGOS_PRECIO_CATALOGO = {
+    'up_to_5000': {'precio__lte': 5000},
+    '5000_10000': {'precio__gte': 5000, 'precio__lte': 10000},
+    'over_10000': {'precio__gt': 10000},
+}
+
+RANGOS_PRECIO_EXCLUSIVOS = {
+    'up_to_60000': {'precio__lte': 60000},
+    '60000_100000': {'precio__gte': 60000, 'precio__lte': 100000},
+    'over_100000': {'precio__gt': 100000},
+}
+
+# El _id siempre se agrega como desempate para que el orden sea estable
+# entre peticiones (lo necesita la paginación).
+ORDENAMIENTOS = {
+    'featured': ('id',),
+    'price_asc': ('precio', 'id'),
+    'price_desc': ('-precio', '-id'),
+    'name_asc': ('nombre', 'id'),
+}
+
+
+def leer_filtros(params):
+    return {
+        'type': (params.get('type') or '').lower(),
+        'price': (params.get('price') or '').lower(),
+        'gender': (params.get('gender') or '').lower(),
+        'brand': (params.get('brand') or '').lower(),
+        'sort': (params.get('sort') or 'featured').lower(),
+    }
+
+
+def filtros_actuales(filtros):
+    return {
+        'type': filtros['type'] or 'all',
+        'price': filtros['price'] or 'all',
+        'gender': filtros['gender'] or 'all',
+        'sort': filtros['sort'] or 'featured',
+        'brand': filtros['brand'] or 'all',
+    }
+
+
+def filtro_activo(valor):
+    return bool(valor) and valor != 'all'
+
+
+def condiciones_filtros(filtros, rangos_precio):
+    condiciones = Q()
+
+    if filtro_activo(filtros['type']):
+        condiciones &= Q(categoria__tipo__iexact=filtros['type'])
+    if filtro_activo(filtros['gender']):
+        condiciones &= Q(categoria__genero__iexact=filtros['gender'])
+    if filtro_activo(filtros['brand']):
+        condiciones &= Q(marca__nombre__iexact=filtros['brand'])
+    if filtro_activo(filtros['price']) and filtros['price'] in rangos_precio:
+        condiciones &= Q(**rangos_precio[filtros['price']])
+
+    return condiciones
+
+
+def ordenamiento(filtros):
+    return ORDENAMIENTOS.get(filtros['sort'], ORDENAMIENTOS['featured'])
+
+
+def aplicar_filtros(items, filtros, rangos_precio):
+    # Filtros y orden terminan en un solo pipeline de agregación
+    # ($lookup + $match + $sort) que ejecuta MongoDB.
+    return items.filter(condiciones_filtros(filtros, rangos_precio)).order_by(*ordenamiento(filtros))
+
+# --- FIN: CONSTRUCTOR DE CONSULTAS DEL CATÁLOGO ---
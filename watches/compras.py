@@ -0,0 +1,197 @@
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from bson.errors import InvalidId
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from .models import Domicilio, Envio, Pago, Pedido
+from .mongo import coleccion, columna
+from .paginacion import ADELANTE, ATRAS, PaginaCursor, codificar_cursor, decodificar_cursor
+
+
+# --- INICIO: HISTORIAL DE COMPRAS DEL ADMINISTRADOR ---
+# Cada página de gestionar_compras es un solo aggregate sobre Pedido:
+#   1. $match con los filtros de fecha, de método de pago (la copia en
+#      Pedido.metodo_pago) y el cursor, $sort + $limit sobre el índice
+#      pedido_fecha, o pedido_metodo_fecha si se filtra por método (fecha
+#      descendente, _id de desempate);
+#   2. ya recortada la página, $lookup del cliente y del domicilio del envío;
+#   3. los productos salen del resumen embebido (Pedido.lineas), sin tocar
+#      DetallesPedido ni Producto.
+# Las consultas por página no dependen de cuántos pedidos haya ni de qué tan
+# profunda sea la página (benchmark_compras).
+
+TAMANO_PAGINA_COMPRAS = 50
+
+METODOS_PAGO = dict(Pago.METODOS)
+
+
+def _decimal(valor):
+    return valor.to_decimal() if isinstance(valor, Decimal128) else Decimal(valor or 0)
+
+
+def _fecha(valor):
+    # pymongo entrega fechas UTC sin zona horaria.
+    if valor is not None and timezone.is_naive(valor):
+        return valor.replace(tzinfo=dt_timezone.utc)
+    return valor
+
+
+def _dia(texto):
+    try:
+        return date.fromisoformat(texto) if texto else None
+    except ValueError:
+        return None
+
+
+def filtros_compras(params):
+    # Filtros de la querystring: ?desde=AAAA-MM-DD&hasta=AAAA-MM-DD&metodo=paypal.
+    # Lo que no se entiende se ignora.
+    metodo = params.get('metodo')
+    return {
+        'desde': _dia(params.get('desde')),
+        'hasta': _dia(params.get('hasta')),
+        'metodo': metodo if metodo in METODOS_PAGO else None,
+    }
+
+
+def _inicio_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def _leer_cursor(token):
+    # (dirección, fecha, _id) del pedido frontera; _id None sin cursor válido.
+    decodificado = decodificar_cursor(token)
+    if decodificado:
+        direccion, valores = decodificado
+        try:
+            fecha, pedido_id = valores
+            return direccion, datetime.fromisoformat(fecha) if fecha else None, ObjectId(pedido_id)
+        except (ValueError, TypeError, InvalidId):
+            pass
+    return ADELANTE, None, None
+
+
+def _cursor(direccion, documento):
+    fecha = _fecha(documento.get('fecha'))
+    return codificar_cursor(direccion, [fecha.isoformat() if fecha else '', documento['_id']])
+
+
+def _condicion_cursor(direccion, fecha, pedido_id):
+    # Los pedidos sin fecha (importados de MySQL) quedan al final, como los
+    # ordena MongoDB: null es menor que cualquier fecha.
+    if direccion == ADELANTE:
+        if fecha is None:
+            return {'fecha': None, '_id': {'$lt': pedido_id}}
+        return {'$or': [
+            {'fecha': {'$lt': fecha}},
+            {'fecha': fecha, '_id': {'$lt': pedido_id}},
+            {'fecha': None},
+        ]}
+    if fecha is None:
+        return {'$or': [{'fecha': {'$ne': None}}, {'fecha': None, '_id': {'$gt': pedido_id}}]}
+    return {'$or': [{'fecha': {'$gt': fecha}}, {'fecha': fecha, '_id': {'$gt': pedido_id}}]}
+
+
+def _pipeline(filtros, direccion, fecha, pedido_id, tamano):
+    condiciones = []
+    if filtros['metodo']:
+        condiciones.append({'metodo_pago': filtros['metodo']})
+    rango = {}
+    if filtros['desde']:
+        rango['$gte'] = _inicio_dia(filtros['desde'])
+    if filtros['hasta']:
+        rango['$lt'] = _inicio_dia(filtros['hasta'] + timedelta(days=1))
+    if rango:
+        condiciones.append({'fecha': rango})
+    if pedido_id is not None:
+        condiciones.append(_condicion_cursor(direccion, fecha, pedido_id))
+
+    orden = -1 if direccion == ADELANTE else 1
+    pipeline = []
+    if condiciones:
+        pipeline.append({'$match': {'$and': condiciones}})
+    pipeline.append({'$sort': {'fecha': orden, '_id': orden}})
+    pipeline.append({'$limit': tamano + 1})
+
+    Usuario = get_user_model()
+    pipeline += [
+        {'$lookup': {
+            'from': Usuario._meta.db_table,
+            'localField': columna(Pedido, 'usuario'),
+            'foreignField': '_id',
+            'as': 'usuario',
+            'pipeline': [{'$project': {'username': 1, 'email': 1, 'first_name': 1, 'last_name': 1}}],
+        }},
+        {'$lookup': {
+            'from': Envio._meta.db_table,
+            'localField': columna(Pedido, 'envio'),
+            'foreignField': '_id',
+            'as': 'domicilio',
+            'pipeline': [
+                {'$lookup': {
+                    'from': Domicilio._meta.db_table,
+                    'localField': columna(Envio, 'domicilio'),
+                    'foreignField': '_id',
+                    'as': 'domicilio',
+                }},
+                {'$unwind': '$domicilio'},
+                {'$replaceWith': '$domicilio'},
+            ],
+        }},
+        {'$project': {
+            'fecha': 1, 'total_pagar': 1, 'usuario': 1, 'metodo_pago': 1, 'domicilio': 1,
+            'lineas.nombre': 1, 'lineas.cantidad': 1, 'lineas.precio_unitario': 1,
+        }},
+    ]
+    return pipeline
+
+
+def _compra(documento):
+    usuario = documento['usuario'][0] if documento['usuario'] else {}
+    metodo = documento.get('metodo_pago')
+    nombre = f"{usuario.get('first_name') or ''} {usuario.get('last_name') or ''}".strip()
+    return {
+        'id': documento['_id'],
+        'cliente': nombre or usuario.get('username', ''),
+        'email': usuario.get('email', ''),
+        'lineas': [
+            {
+                'nombre': linea['nombre'],
+                'cantidad': linea['cantidad'],
+                'precio_unitario': _decimal(linea['precio_unitario']),
+            }
+            for linea in documento.get('lineas') or []
+        ],
+        'total': _decimal(documento['total_pagar']),
+        'domicilio': documento['domicilio'][0] if documento['domicilio'] else None,
+        'metodo_pago': METODOS_PAGO.get(metodo, metodo) if metodo else 'No registrado',
+        'fecha': _fecha(documento.get('fecha')),
+    }
+
+
+def pagina_compras(filtros, cursor=None, tamano=TAMANO_PAGINA_COMPRAS):
+    # Regresa (compras, page_obj); page_obj es un PaginaCursor.
+    direccion, fecha, pedido_id = _leer_cursor(cursor)
+    documentos = list(coleccion(Pedido).aggregate(_pipeline(filtros, direccion, fecha, pedido_id, tamano)))
+    hay_mas = len(documentos) > tamano
+    documentos = documentos[:tamano]
+    if direccion == ATRAS:
+        documentos.reverse()
+
+    if direccion == ATRAS:
+        hay_siguiente, hay_anterior = pedido_id is not None, hay_mas
+    else:
+        hay_siguiente, hay_anterior = hay_mas, pedido_id is not None
+    compras = [_compra(documento) for documento in documentos]
+    page_obj = PaginaCursor(
+        compras,
+        _cursor(ADELANTE, documentos[-1]) if documentos and hay_siguiente else None,
+        _cursor(ATRAS, documentos[0]) if documentos and hay_anterior else None,
+    )
+    return compras, page_obj
+
+# --- FIN: HISTORIAL DE COMPRAS DEL ADMINISTRADOR ---
@@ -1,69 +1,57 @@
-from .models import Carrito, DetalleCarrito,  Producto, Marca, Favorito
-from django.db.models import Sum
+from django.utils.functional import SimpleLazyObject
 
+from .models import ProductoListado, Marca
+from .cache_catalogo import obtener_fragmento
+from .estado_usuario import estado_usuario
 
-def cart_context(request):
-    total_items = 0
-    if request.user.is_authenticated:
-        carrito_activo = Carrito.objects.filter(usuario=request.user, estado='activo').first()
-        if carrito_activo:
-            resultado = DetalleCarrito.objects.filter(carrito=carrito_activo).aggregate(total=Sum('cantidad'))
-            total_items = resultado['total'] or 0
-    else:
-        cart_session = request.session.get('cart', {})
-        total_items = sum(item.get('quantity', 0) for item in cart_session.values())
 
+def cart_context(request):
+    # El conteo se resuelve solo si la plantilla lo usa (ver estado_usuario).
+    estado = estado_usuario(request)
     return {
-        'cart_total_items': total_items
+        'cart_total_items': SimpleLazyObject(lambda: estado.cart_total_items)
     }
 
 # --- INICIO: LÓGICA COMPLETA DE LA VISTA DE HOME ---
 
-def home_page_context(request):
+def _secciones_home():
+    # Partes iguales para todos los visitantes; se guardan en la caché versionada.
+
     # --- SECCIÓN DE RELOJES DESTACADOS ---
-    relojes_destacados = Producto.objects.select_related(
-        'marca', 'imgproducto', 'categoria'
-    ).filter(
+    relojes_destacados = list(ProductoListado.objects.filter(
         fecha_borrado__isnull=True,
         es_exclusivo=False
-    )[:3]
+    )[:3])
 
     # --- SECCIÓN DE CATÁLOGO EN HOME ---
-    relojes_catalogo_home = Producto.objects.select_related(
-        'marca', 'imgproducto', 'categoria'
-    ).filter(
+    relojes_catalogo_home = list(ProductoListado.objects.filter(
         fecha_borrado__isnull=True,
         es_exclusivo=False
-    )[:8]
+    )[:8])
 
-    marcas = Marca.objects.all().order_by('nombre')
+    marcas = list(Marca.objects.all().order_by('nombre'))
 
     # --- SECCIÓN DEL RELOJ EXCLUSIVO ---
-    reloj_exclusivo_destacado = Producto.objects.select_related(
-        'marca', 'imgproducto', 'categoria'
-    ).filter(
+    reloj_exclusivo_destacado = ProductoListado.objects.filter(
         fecha_borrado__isnull=True,
         es_exclusivo=True,
         nombre__iexact="Royal Oak",
         marca__nombre__iexact="Audemars Piguet"
     ).first()
 
-    # --- LÓGICA PARA OBTENER FAVORITOS ---
-    favoritos_ids = []
-
-    if request.user.is_authenticated:
-        favoritos_ids = list(
-            Favorito.objects.filter(
-                usuario=request.user
-            ).values_list('producto_id', flat=True)
-        )
-
     return {
         'featured_watches': relojes_destacados,
         'catalog_watches': relojes_catalogo_home,
         'marcas': marcas,
         'exclusive_watch': reloj_exclusivo_destacado,
-        'favoritos_ids': favoritos_ids,
     }
 
+
+def home_page_context(request):
+    context = dict(obtener_fragmento('home', _secciones_home))
+
+    # --- FAVORITOS (por usuario, fuera de la caché) ---
+    context['favoritos_ids'] = estado_usuario(request).favoritos_ids
+    return context
+
 # --- FIN: LÓGICA COMPLETA DE LA VISTA DE HOME ---
@@ -0,0 +1,178 @@
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+
+from .carrito_invitado import total_items_invitado
+from .models import Carrito, CarritoDocumento, DetalleCarrito, Favorito
+from .mongo import coleccion, columna
+
+
+# --- INICIO: ESTADO DEL USUARIO POR PETICIÓN ---
+# El estado se guarda entre peticiones solo si la caché es compartida
+# (settings.CACHE_COMPARTIDA): invalidar_estado lo borra para todos los
+# workers. Con la caché local de cada proceso un borrado no llegaría a los
+# demás, así que cada petición hace su aggregate (uno, y solo si se usa).
+
+GRUPO_PROVEEDORES = 'Proveedores'
+TIMEOUT_ESTADO = 60 * 5
+
+
+def clave_estado(usuario_id):
+    return f'usuario:{usuario_id}:estado'
+
+
+def invalidar_estado(usuario_id):
+    if usuario_id is not None and settings.CACHE_COMPARTIDA:
+        cache.delete(clave_estado(usuario_id))
+
+
+def _lookup_carrito():
+    # Total de piezas del carrito activo según el almacenamiento configurado.
+    if settings.CARRITO_ALMACENAMIENTO == 'embebido':
+        return {'$lookup': {
+            'from': CarritoDocumento._meta.db_table,
+            'localField': '_id',
+            'foreignField': columna(CarritoDocumento, 'usuario'),
+            'pipeline': [
+                {'$match': {'estado': 'activo'}},
+                {'$limit': 1},
+                {'$project': {'total': '$total_items'}},
+            ],
+            'as': 'carrito',
+        }}
+
+    return {'$lookup': {
+        'from': Carrito._meta.db_table,
+        'let': {'usuario': '$_id'},
+        'pipeline': [
+            {'$match': {'$expr': {'$and': [
+                {'$eq': [f"${columna(Carrito, 'usuario')}", '$$usuario']},
+                {'$eq': ['$estado', 'activo']},
+            ]}}},
+            {'$sort': {'_id': 1}},
+            {'$limit': 1},
+            {'$lookup': {
+                'from': DetalleCarrito._meta.db_table,
+                'localField': '_id',
+                'foreignField': columna(DetalleCarrito, 'carrito'),
+                'as': 'detalles',
+            }},
+            {'$project': {'total': {'$sum': '$detalles.cantidad'}}},
+        ],
+        'as': 'carrito',
+    }}
+
+
+def _pipeline_estado(usuario_id):
+    # Un solo aggregate sobre la colección de usuarios: grupos, perfil de
+    # proveedor, carrito activo (total de piezas) y favoritos.
+    User = get_user_model()
+    Proveedor = apps.get_model('proveedores', 'Proveedor')
+    grupos = User.groups.through
+
+    return [
+        {'$match': {'_id': usuario_id}},
+        {'$lookup': {
+            'from': grupos._meta.db_table,
+            'let': {'usuario': '$_id'},
+            'pipeline': [
+                {'$match': {'$expr': {'$eq': [f"${columna(grupos, 'user')}", '$$usuario']}}},
+                {'$lookup': {
+                    'from': Group._meta.db_table,
+                    'localField': columna(grupos, 'group'),
+                    'foreignField': '_id',
+                    'as': 'grupo',
+                }},
+                {'$match': {'grupo.name': GRUPO_PROVEEDORES}},
+                {'$limit': 1},
+                {'$project': {'_id': 1}},
+            ],
+            'as': 'grupo_proveedores',
+        }},
+        {'$lookup': {
+            'from': Proveedor._meta.db_table,
+            'localField': '_id',
+            'foreignField': columna(Proveedor, 'user'),
+            'pipeline': [{'$limit': 1}, {'$project': {'_id': 1}}],
+            'as': 'proveedor',
+        }},
+        _lookup_carrito(),
+        {'$lookup': {
+            'from': Favorito._meta.db_table,
+            'localField': '_id',
+            'foreignField': columna(Favorito, 'usuario'),
+            'pipeline': [{'$project': {'_id': 0, 'producto': f"${columna(Favorito, 'producto')}"}}],
+            'as': 'favoritos',
+        }},
+        {'$project': {
+            '_id': 0,
+            'is_proveedor': {'$gt': [{'$size': {'$concatArrays': ['$grupo_proveedores', '$proveedor']}}, 0]},
+            'cart_total_items': {'$ifNull': [{'$first': '$carrito.total'}, 0]},
+            'favoritos_ids': '$favoritos.producto',
+        }},
+    ]
+
+
+def _consultar_estado(usuario_id):
+    User = get_user_model()
+    resultado = list(coleccion(User).aggregate(_pipeline_estado(usuario_id)))
+    datos = resultado[0] if resultado else {}
+    return {
+        'cart_total_items': datos.get('cart_total_items', 0),
+        'is_proveedor': datos.get('is_proveedor', False),
+        'favoritos_ids': datos.get('favoritos_ids', []),
+    }
+
+
+def cargar_estado(usuario_id):
+    if not settings.CACHE_COMPARTIDA:
+        return _consultar_estado(usuario_id)
+
+    clave = clave_estado(usuario_id)
+    datos = cache.get(clave)
+    if datos is None:
+        datos = _consultar_estado(usuario_id)
+        cache.set(clave, datos, TIMEOUT_ESTADO)
+    return datos
+
+
+class EstadoUsuario:
+    # Nada se consulta hasta que una plantilla o vista toca alguno de los valores.
+
+    def __init__(self, request):
+        self._request = request
+        self._datos = None
+
+    def _cargar(self):
+        if self._datos is None:
+            self._datos = cargar_estado(self._request.user.pk)
+        return self._datos
+
+    @property
+    def cart_total_items(self):
+        if not self._request.user.is_authenticated:
+            return total_items_invitado(self._request)
+        return self._cargar()['cart_total_items']
+
+    @property
+    def is_proveedor(self):
+        if not self._request.user.is_authenticated:
+            return False
+        return self._cargar()['is_proveedor']
+
+    @property
+    def favoritos_ids(self):
+        if not self._request.user.is_authenticated:
+            return []
+        return self._cargar()['favoritos_ids']
+
+
+def estado_usuario(request):
+    estado = getattr(request, '_estado_usuario', None)
+    if estado is None:
+        estado = request._estado_usuario = EstadoUsuario(request)
+    return estado
+
+# --- FIN: ESTADO DEL USUARIO POR PETICIÓN ---
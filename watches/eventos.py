@@ -0,0 +1,107 @@
+import asyncio
+import json
+import threading
+
+
+# --- INICIO: PUB/SUB EN PROCESO PARA EVENTOS EN VIVO ---
+# Los publicadores son código síncrono (servicio del carrito, señales de
+# Producto) y los suscriptores son flujos SSE asíncronos (views.cart_events).
+# Cada suscripción tiene su cola en el event loop que la creó; publicar la
+# alimenta con call_soon_threadsafe. Todo vive en un proceso: con varios
+# workers cada uno solo ve las escrituras que él mismo atendió.
+
+STOCK_BAJO = 3
+MAX_EVENTOS_EN_COLA = 100
+
+
+def canal_usuario(usuario_id):
+    return f'usuario:{usuario_id}'
+
+
+def canal_producto(producto_id):
+    return f'producto:{producto_id}'
+
+
+class Suscripcion:
+
+    def __init__(self, broker):
+        self._broker = broker
+        self._loop = asyncio.get_running_loop()
+        self._cola = asyncio.Queue(maxsize=MAX_EVENTOS_EN_COLA)
+        self.canales = set()
+
+    def entregar(self, evento, datos):
+        try:
+            self._loop.call_soon_threadsafe(self._encolar, evento, datos)
+        except RuntimeError:
+            # El loop ya se cerró: el cliente se fue.
+            pass
+
+    def _encolar(self, evento, datos):
+        # Un cliente lento pierde los eventos más viejos, no bloquea al publicador.
+        if self._cola.full():
+            self._cola.get_nowait()
+        self._cola.put_nowait((evento, datos))
+
+    async def siguiente(self, timeout):
+        return await asyncio.wait_for(self._cola.get(), timeout)
+
+    def cambiar_canales(self, canales):
+        self._broker._cambiar_canales(self, set(canales))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._broker._cambiar_canales(self, set())
+
+
+class Broker:
+
+    def __init__(self):
+        self._suscripciones = {}  # canal -> {Suscripcion}
+        self._candado = threading.Lock()
+
+    def suscribir(self, canales=()):
+        suscripcion = Suscripcion(self)
+        suscripcion.cambiar_canales(canales)
+        return suscripcion
+
+    def _cambiar_canales(self, suscripcion, canales):
+        with self._candado:
+            for canal in suscripcion.canales - canales:
+                suscritos = self._suscripciones.get(canal)
+                if suscritos is not None:
+                    suscritos.discard(suscripcion)
+                    if not suscritos:
+                        del self._suscripciones[canal]
+            for canal in canales - suscripcion.canales:
+                self._suscripciones.setdefault(canal, set()).add(suscripcion)
+            suscripcion.canales = canales
+
+    def publicar(self, canal, evento, datos):
+        with self._candado:
+            suscritos = list(self._suscripciones.get(canal, ()))
+        for suscripcion in suscritos:
+            suscripcion.entregar(evento, datos)
+
+
+broker = Broker()
+
+
+def publicar_carrito(usuario_id, total_items):
+    broker.publicar(canal_usuario(usuario_id), 'carrito', {'total_items': total_items})
+
+
+def publicar_stock(producto_id, stock):
+    broker.publicar(canal_producto(producto_id), 'stock', {
+        'id': str(producto_id),
+        'stock': stock,
+        'low': stock <= STOCK_BAJO,
+    })
+
+
+def formato_sse(evento, datos):
+    return f"event: {evento}\ndata: {json.dumps(datos)}\n\n"
+
+# --- FIN: PUB/SUB EN PROCESO PARA EVENTOS EN VIVO ---
@@ -0,0 +1,94 @@
+from .catalogo import filtro_activo
+from .models import ProductoListado
+from .mongo import coleccion
+
+
+# --- INICIO: FACETAS DE LOS FILTROS DEL CATÁLOGO ---
+
+OPERADORES_PRECIO = {'lte': '$lte', 'gte': '$gte', 'lt': '$lt', 'gt': '$gt'}
+
+
+def _condicion_precio_match(lookups):
+    # {'precio__gte': 5000, 'precio__lte': 10000} -> {'precio': {'$gte': 5000, '$lte': 10000}}
+    return {'precio': {OPERADORES_PRECIO[lookup.split('__')[1]]: valor for lookup, valor in lookups.items()}}
+
+
+def _condicion_precio_expr(lookups):
+    return {'$and': [
+        {OPERADORES_PRECIO[lookup.split('__')[1]]: ['$precio', valor]}
+        for lookup, valor in lookups.items()
+    ]}
+
+
+def _match_filtros(filtros, rangos_precio, excluir):
+    # Cada faceta se cuenta con todos los filtros activos menos el suyo,
+    # así el menú muestra cuántos productos quedarían al cambiar esa opción.
+    condiciones = []
+    for parametro, campo in (('type', 'tipo'), ('gender', 'genero'), ('brand', 'marca_clave')):
+        if parametro != excluir and filtro_activo(filtros[parametro]):
+            condiciones.append({campo: filtros[parametro]})
+    if excluir != 'price' and filtro_activo(filtros['price']) and filtros['price'] in rangos_precio:
+        condiciones.append(_condicion_precio_match(rangos_precio[filtros['price']]))
+    return {'$match': {'$and': condiciones}} if condiciones else {'$match': {}}
+
+
+def contar_facetas(base, filtros, rangos_precio):
+    # Un solo round trip sobre el modelo de lectura (marca y categoría ya
+    # vienen embebidas) + $facet con las cuatro facetas. Solo cuentan las
+    # piezas con stock: el listado muestra también las agotadas, pero el
+    # número de cada opción es lo que se puede comprar.
+    pipeline = [
+        {'$match': {**base, 'stock': {'$gt': 0}}},
+        {'$project': {
+            'precio': 1,
+            'tipo': {'$toLower': {'$ifNull': ['$categoria.tipo', '']}},
+            'genero': {'$toLower': {'$ifNull': ['$categoria.genero', '']}},
+            'marca_nombre': '$marca.nombre',
+            'marca_clave': {'$toLower': '$marca.nombre'},
+        }},
+        {'$facet': {
+            'type': [
+                _match_filtros(filtros, rangos_precio, 'type'),
+                {'$group': {'_id': '$tipo', 'total': {'$sum': 1}}},
+            ],
+            'gender': [
+                _match_filtros(filtros, rangos_precio, 'gender'),
+                {'$group': {'_id': '$genero', 'total': {'$sum': 1}}},
+            ],
+            'brand': [
+                _match_filtros(filtros, rangos_precio, 'brand'),
+                {'$group': {'_id': '$marca_clave', 'nombre': {'$first': '$marca_nombre'}, 'total': {'$sum': 1}}},
+            ],
+            'price': [
+                _match_filtros(filtros, rangos_precio, 'price'),
+                {'$group': {'_id': None, **{
+                    rango: {'$sum': {'$cond': [_condicion_precio_expr(lookups), 1, 0]}}
+                    for rango, lookups in rangos_precio.items()
+                }}},
+            ],
+        }},
+    ]
+
+    resultado = next(coleccion(ProductoListado).aggregate(pipeline), {})
+
+    precios = dict.fromkeys(rangos_precio, 0)
+    for grupo in resultado.get('price', []):
+        precios.update({rango: grupo.get(rango, 0) for rango in rangos_precio})
+
+    return {
+        'tipos': sorted(
+            ({'valor': g['_id'], 'total': g['total']} for g in resultado.get('type', []) if g['_id']),
+            key=lambda x: x['valor'],
+        ),
+        'generos': sorted(
+            ({'valor': g['_id'], 'total': g['total']} for g in resultado.get('gender', []) if g['_id']),
+            key=lambda x: x['valor'],
+        ),
+        'marcas': sorted(
+            ({'nombre': g['nombre'], 'total': g['total']} for g in resultado.get('brand', []) if g['_id']),
+            key=lambda x: x['nombre'].lower(),
+        ),
+        'precios': precios,
+    }
+
+# --- FIN: FACETAS DE LOS FILTROS DEL CATÁLOGO ---
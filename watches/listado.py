@@ -0,0 +1,95 @@
+from .models import (
+    Producto, ImgProducto, ProductoListado, MarcaListado, CategoriaListado, ImagenListado,
+)
+
+
+# --- INICIO: MODELO DE LECTURA DE LOS LISTADOS ---
+# ProductoListado se mantiene desde las señales de Producto, Marca, Categoria e
+# ImgProducto (ver watches/signals.py); las escrituras masivas que no disparan
+# señales deben llamar a estas funciones directamente.
+
+def marca_listado(marca):
+    return MarcaListado(nombre=marca.nombre)
+
+
+def categoria_listado(categoria):
+    return CategoriaListado(genero=categoria.genero, material=categoria.material, tipo=categoria.tipo)
+
+
+def imagen_listado(imagen):
+    return ImagenListado(url=imagen.url.name) if imagen is not None else None
+
+
+def documento_listado(producto, imagen=None):
+    return ProductoListado(
+        id=producto.id,
+        nombre=producto.nombre,
+        precio=producto.precio,
+        descripcion1=producto.descripcion1,
+        descripcion2=producto.descripcion2,
+        descripcion3=producto.descripcion3,
+        stock=producto.stock,
+        es_exclusivo=producto.es_exclusivo,
+        fecha_borrado=producto.fecha_borrado,
+        fecha_creacion=producto.fecha_creacion,
+        id_marca=producto.marca_id,
+        id_categoria=producto.categoria_id,
+        marca=marca_listado(producto.marca),
+        categoria=categoria_listado(producto.categoria),
+        imgproducto=imagen_listado(imagen),
+    )
+
+
+def sincronizar_producto(producto, con_stock=True):
+    # con_stock=False cuando el guardado no escribió el stock: el del listado
+    # lo mantienen los $inc de reservas, pedidos y reposiciones.
+    imagen = ImgProducto.objects.filter(producto_id=producto.id).first()
+    documento = documento_listado(producto, imagen)
+    if not con_stock:
+        campos = {
+            campo.name: getattr(documento, campo.name)
+            for campo in ProductoListado._meta.concrete_fields
+            if not campo.primary_key and campo.name != 'stock'
+        }
+        if ProductoListado.objects.filter(pk=producto.id).update(**campos):
+            return
+    documento.save()
+
+
+def eliminar_producto(producto_id):
+    ProductoListado.objects.filter(pk=producto_id).delete()
+
+
+def sincronizar_marca(marca):
+    ProductoListado.objects.filter(id_marca=marca.id).update(marca=marca_listado(marca))
+
+
+def sincronizar_categoria(categoria):
+    ProductoListado.objects.filter(id_categoria=categoria.id).update(categoria=categoria_listado(categoria))
+
+
+def sincronizar_imagen(producto_id, imagen):
+    ProductoListado.objects.filter(pk=producto_id).update(imgproducto=imagen_listado(imagen))
+
+
+def reconstruir_listado(lote=1000):
+    # Reescribe la colección completa (comando reconstruir_listado).
+    imagenes = {img.producto_id: img for img in ImgProducto.objects.all()}
+    ProductoListado.objects.all().delete()
+
+    pendientes = []
+    total = 0
+    for producto in Producto.objects.select_related('marca', 'categoria').iterator(chunk_size=lote):
+        pendientes.append(documento_listado(producto, imagenes.get(producto.id)))
+        if len(pendientes) >= lote:
+            ProductoListado.objects.bulk_create(pendientes)
+            total += len(pendientes)
+            pendientes = []
+
+    if pendientes:
+        ProductoListado.objects.bulk_create(pendientes)
+        total += len(pendientes)
+
+    return total
+
+# --- FIN: MODELO DE LECTURA DE LOS LISTADOS ---
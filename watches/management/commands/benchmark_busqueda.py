@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.test.utils import override_settings
+
+from watches import busqueda
+from watches.benchmarks import sembrar_catalogo, limpiar_catalogo, medir, formatear_resumen
+from watches.models import Producto
+
+
+CONSULTAS_BENCH = ['rolex', 'deportivo acero', 'relojes clásicos de oro', 'zafiro', 'Nautilus mujer']
+
+
+def buscar_con_regex(consulta):
+    # Camino anterior: ocho icontains en OR sobre colecciones unidas por $lookup.
+    return list(Producto.objects.select_related('categoria', 'marca').filter(
+        Q(nombre__icontains=consulta) |
+        Q(marca__nombre__icontains=consulta) |
+        Q(descripcion1__icontains=consulta) |
+        Q(descripcion2__icontains=consulta) |
+        Q(descripcion3__icontains=consulta) |
+        Q(categoria__material__icontains=consulta) |
+        Q(categoria__genero__icontains=consulta) |
+        Q(categoria__tipo__icontains=consulta)
+    ).values_list('id', flat=True))
+
+
+class Command(BaseCommand):
+    help = "Compara la búsqueda por regex contra el índice de texto de MongoDB y el índice en memoria."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--tamanos",
+            nargs="+",
+            type=int,
+            default=[1000, 10000, 100000],
+            help="Cantidades de productos sintéticos a medir."
+        )
+        parser.add_argument(
+            "--repeticiones",
+            type=int,
+            default=10,
+            help="Repeticiones por consulta."
+        )
+        parser.add_argument(
+            "--conservar",
+            action="store_true",
+            help="No borra los productos sintéticos al terminar."
+        )
+
+    def handle(self, *args, **options):
+        busqueda.crear_indice_texto()
+        repeticiones = options["repeticiones"]
+
+        try:
+            for tamano in sorted(options["tamanos"]):
+                self.stdout.write(self.style.WARNING(f"Sembrando hasta {tamano} productos..."))
+                sembrar_catalogo(tamano)
+
+                # El índice en memoria se reconstruye con el tamaño actual.
+                busqueda._indice_local = None
+                busqueda.indice_local()
+
+                self.stdout.write(self.style.SUCCESS(f"--- {tamano} productos ---"))
+                for consulta in CONSULTAS_BENCH:
+                    self.stdout.write(f"Consulta: {consulta!r}")
+                    self.stdout.write(formatear_resumen(
+                        "  Regex (icontains)", medir(lambda: buscar_con_regex(consulta), repeticiones)
+                    ))
+                    with override_settings(BUSQUEDA_MOTOR='mongo'):
+                        self.stdout.write(formatear_resumen(
+                            "  Índice de texto MongoDB", medir(lambda: busqueda.buscar(consulta), repeticiones)
+                        ))
+                    with override_settings(BUSQUEDA_MOTOR='local'):
+                        self.stdout.write(formatear_resumen(
+                            "  Índice invertido en memoria", medir(lambda: busqueda.buscar(consulta), repeticiones)
+                        ))
+        finally:
+            if not options["conservar"]:
+                self.stdout.write(self.style.WARNING("Borrando productos sintéticos..."))
+                limpiar_catalogo()
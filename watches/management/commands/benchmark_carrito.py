@@ -0,0 +1,66 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+
+from watches.benchmarks import PREFIJO_BENCH, sembrar_catalogo, limpiar_catalogo, medir, formatear_resumen
+from watches.carrito import ALMACENES
+from watches.models import ProductoListado
+from watches.views import get_cart_data
+
+
+class Command(BaseCommand):
+    help = "Compara la lectura y la mutación del carrito entre los almacenamientos 'colecciones' y 'embebido'."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--renglones",
+            nargs="+",
+            type=int,
+            default=[1, 10, 50],
+            help="Cantidades de renglones en el carrito a medir."
+        )
+        parser.add_argument(
+            "--repeticiones",
+            type=int,
+            default=50,
+            help="Repeticiones por medición."
+        )
+
+    def usuario_bench(self):
+        User = get_user_model()
+        usuario, _ = User.objects.get_or_create(
+            email=f'{PREFIJO_BENCH}carrito@chronoslux.test',
+            defaults={'username': f'{PREFIJO_BENCH}carrito'},
+        )
+        return usuario
+
+    def handle(self, *args, **options):
+        repeticiones = options["repeticiones"]
+        sembrar_catalogo(max(options["renglones"]))
+        productos = list(ProductoListado.objects.filter(marca__nombre__startswith=PREFIJO_BENCH))
+        usuario = self.usuario_bench()
+
+        peticion = RequestFactory().get(reverse('get_cart_data'))
+        peticion.user = usuario
+
+        try:
+            for renglones in sorted(options["renglones"]):
+                self.stdout.write(self.style.SUCCESS(f"--- {renglones} renglones ---"))
+                for modo, almacen in ALMACENES.items():
+                    almacen.descartar(usuario.pk)
+                    for producto in productos[:renglones]:
+                        almacen.agregar(usuario.pk, producto, 1)
+
+                    with override_settings(CARRITO_ALMACENAMIENTO=modo):
+                        lectura = medir(lambda: get_cart_data(peticion), repeticiones)
+                    mutacion = medir(lambda: almacen.agregar(usuario.pk, productos[0], 1), repeticiones)
+
+                    self.stdout.write(formatear_resumen(f"{modo}: GET /api/carrito/", lectura))
+                    self.stdout.write(formatear_resumen(f"{modo}: agregar producto", mutacion))
+        finally:
+            self.stdout.write(self.style.WARNING("Borrando carritos y productos sintéticos..."))
+            for almacen in ALMACENES.values():
+                almacen.descartar(usuario.pk)
+            usuario.delete()
+            limpiar_catalogo()
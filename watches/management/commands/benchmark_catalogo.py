@@ -0,0 +1,93 @@
+from django.core.management.base import BaseCommand
+
+from watches.benchmarks import preparar_base, sembrar_catalogo, limpiar_catalogo, medir, formatear_resumen
+from watches.catalogo import leer_filtros, aplicar_filtros, RANGOS_PRECIO_CATALOGO
+from watches.models import Producto
+
+
+FILTROS_BENCH = {
+    'type': 'deportivo',
+    'price': '5000_10000',
+    'gender': 'hombre',
+    'sort': 'price_asc',
+}
+
+
+def catalogo_en_python(filtros):
+    # Réplica del camino anterior: trae todo el catálogo y filtra/ordena en Python.
+    items = Producto.objects.select_related('categoria', 'marca', 'imgproducto').filter(es_exclusivo=False)
+
+    def coincide(x):
+        if filtros['type'] and (x.categoria.tipo or '').lower() != filtros['type']:
+            return False
+        if filtros['gender'] and (x.categoria.genero or '').lower() != filtros['gender']:
+            return False
+        if filtros['brand'] and (x.marca.nombre or '').lower() != filtros['brand']:
+            return False
+        if filtros['price'] == '5000_10000' and not 5000 <= float(x.precio) <= 10000:
+            return False
+        return True
+
+    items = [x for x in items if coincide(x)]
+    return sorted(items, key=lambda x: x.precio)
+
+
+def catalogo_en_mongo(filtros, tamano_pagina):
+    items = Producto.objects.select_related('categoria', 'marca', 'imgproducto').filter(es_exclusivo=False)
+    return list(aplicar_filtros(items, filtros, RANGOS_PRECIO_CATALOGO)[:tamano_pagina])
+
+
+class Command(BaseCommand):
+    help = "Mide la latencia del catálogo filtrando en Python vs. en el pipeline de MongoDB."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--tamanos",
+            nargs="+",
+            type=int,
+            default=[1000, 10000, 100000],
+            help="Cantidades de productos sintéticos a medir."
+        )
+        parser.add_argument(
+            "--repeticiones",
+            type=int,
+            default=10,
+            help="Repeticiones por medición."
+        )
+        parser.add_argument(
+            "--pagina",
+            type=int,
+            default=24,
+            help="Productos por página para el camino en MongoDB."
+        )
+        parser.add_argument(
+            "--database",
+            default=None,
+            help="Base de datos dedicada (mismo servidor) donde sembrar; obligatoria sin DEBUG."
+        )
+        parser.add_argument(
+            "--conservar",
+            action="store_true",
+            help="No borra los productos sintéticos al terminar."
+        )
+
+    def handle(self, *args, **options):
+        preparar_base(options["database"])
+        filtros = leer_filtros(FILTROS_BENCH)
+
+        try:
+            for tamano in sorted(options["tamanos"]):
+                self.stdout.write(self.style.WARNING(f"Sembrando hasta {tamano} productos..."))
+                sembrar_catalogo(tamano)
+
+                repeticiones = options["repeticiones"]
+                en_python = medir(lambda: catalogo_en_python(filtros), repeticiones)
+                en_mongo = medir(lambda: catalogo_en_mongo(filtros, options["pagina"]), repeticiones)
+
+                self.stdout.write(self.style.SUCCESS(f"--- {tamano} productos ---"))
+                self.stdout.write(formatear_resumen("Filtrado en Python", en_python))
+                self.stdout.write(formatear_resumen("Pipeline en MongoDB", en_mongo))
+        finally:
+            if not options["conservar"]:
+                self.stdout.write(self.style.WARNING("Borrando productos sintéticos..."))
+                limpiar_catalogo()
@@ -0,0 +1,177 @@
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+
+from bson import ObjectId
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from pymongo import monitoring
+
+from watches.benchmarks import PREFIJO_BENCH, medir, formatear_resumen
+from watches.models import DetallesPedido, Domicilio, Envio, LineaPedido, Pago, Pedido
+from watches.mongo import coleccion, columna
+from watches.paginacion import ADELANTE, codificar_cursor
+
+
+# Comandos del propio driver (handshake, sesiones), no consultas de la vista.
+COMANDOS_DRIVER = {'hello', 'ismaster', 'isMaster', 'ping', 'endSessions', 'saslStart', 'saslContinue', 'buildInfo'}
+
+
+class ContadorComandos(monitoring.CommandListener):
+
+    def __init__(self):
+        self.comandos = Counter()
+
+    def started(self, event):
+        if event.command_name not in COMANDOS_DRIVER:
+            self.comandos[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def contar(self, funcion):
+        self.comandos.clear()
+        funcion()
+        return sum(self.comandos.values()), dict(self.comandos)
+
+
+def compras_anteriores(usuario):
+    # El gestionar_compras anterior: dos consultas más por cada pedido.
+    compras = []
+    for pedido in Pedido.objects.select_related('usuario', 'envio__domicilio').filter(usuario=usuario).order_by('-fecha'):
+        detalles = list(DetallesPedido.objects.filter(pedido=pedido).select_related('producto'))
+        pago = Pago.objects.filter(pedido=pedido).first()
+        compras.append((pedido, detalles, pago))
+    return compras
+
+
+class Command(BaseCommand):
+    help = ("Siembra pedidos sintéticos y cuenta los comandos que MongoDB recibe por cada página del "
+            "historial de compras del administrador; el número debe ser el mismo con cualquier volumen.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--volumenes",
+            type=int,
+            nargs="+",
+            default=[10, 100, 1000],
+            help="Pedidos sembrados en cada medición (crecientes)."
+        )
+        parser.add_argument(
+            "--repeticiones",
+            type=int,
+            default=10,
+            help="Peticiones por página para medir el tiempo."
+        )
+
+    def usuario_bench(self):
+        User = get_user_model()
+        usuario, _ = User.objects.get_or_create(
+            email=f'{PREFIJO_BENCH}compras@chronoslux.test',
+            defaults={'username': f'{PREFIJO_BENCH}compras', 'is_staff': True},
+        )
+        return usuario
+
+    def sembrar(self, usuario, domicilio, desde, hasta):
+        # Pedidos con su envío, su pago y tres renglones de resumen, un minuto
+        # más viejos cada uno.
+        ahora = timezone.now()
+        metodos = [metodo for metodo, _ in Pago.METODOS]
+        envios, pedidos, pagos = [], [], []
+        for i in range(desde, hasta):
+            envio = Envio(id=ObjectId(), domicilio=domicilio, fecha_envio=ahora, fecha_llegada=ahora)
+            lineas = [
+                LineaPedido(
+                    producto_id=ObjectId(), nombre=f'{PREFIJO_BENCH} Reloj {n}', marca=f'{PREFIJO_BENCH} Marca',
+                    imagen='', cantidad=1, precio_unitario=Decimal('1000.00'), subtotal=Decimal('1000.00'),
+                )
+                for n in range(3)
+            ]
+            pedido = Pedido(
+                id=ObjectId(), usuario=usuario, envio=envio, fecha=ahora - timedelta(minutes=i),
+                subtotal=Decimal('3000.00'), total_pagar=Decimal('3000.00'), lineas=lineas, total_items=3,
+                metodo_pago=metodos[i % len(metodos)],
+            )
+            envios.append(envio)
+            pedidos.append(pedido)
+            pagos.append(Pago(
+                pedido=pedido, metodo_pago=pedido.metodo_pago, monto_pagar=pedido.total_pagar,
+                estado='aprobado', fecha_pago=pedido.fecha,
+            ))
+        Envio.objects.bulk_create(envios)
+        Pedido.objects.bulk_create(pedidos)
+        Pago.objects.bulk_create(pagos)
+
+    def handle(self, *args, **options):
+        volumenes = sorted(options["volumenes"])
+        # Los listeners de pymongo solo se enganchan a clientes nuevos: se
+        # registra antes de que la conexión se abra (o se reabra).
+        contador = ContadorComandos()
+        monitoring.register(contador)
+        connection.close()
+
+        usuario = self.usuario_bench()
+        domicilio = Domicilio.objects.create(
+            usuario=usuario, calle='Benchmark', num_ext='1', colonia='Centro',
+            estado='CDMX', cp='00000', pais='México',
+        )
+        cliente = Client()
+        cliente.force_login(usuario)
+        url = reverse('gestionar_compras')
+
+        def pagina(params=None):
+            cliente.get(url, params or {})
+
+        sembrados = 0
+        conteos = {}
+        try:
+            with override_settings(ALLOWED_HOSTS=['*']):
+                for volumen in volumenes:
+                    self.sembrar(usuario, domicilio, sembrados, volumen)
+                    sembrados = max(sembrados, volumen)
+                    # Un pedido a media lista del usuario: página profunda.
+                    medio = Pedido.objects.filter(usuario=usuario).order_by('-fecha')[sembrados // 2]
+                    profunda = {'cursor': codificar_cursor(ADELANTE, [medio.fecha.isoformat(), medio.pk])}
+                    paginas = [
+                        ("primera página", {}),
+                        ("filtro de método de pago", {'metodo': 'paypal'}),
+                        ("filtro de fechas", {'desde': f'{timezone.now() - timedelta(days=1):%Y-%m-%d}'}),
+                        ("página profunda", profunda),
+                    ]
+
+                    pagina()  # calentamiento (plantillas y sesión)
+                    self.stdout.write(self.style.MIGRATE_HEADING(f"\n{sembrados} pedidos"))
+                    for etiqueta, params in paginas:
+                        total, detalle = contador.contar(lambda: pagina(params))
+                        conteos.setdefault(etiqueta, set()).add(total)
+                        desglose = ', '.join(f'{nombre}={n}' for nombre, n in sorted(detalle.items()))
+                        self.stdout.write(f"  {etiqueta:<28} {total:>4} comandos ({desglose})")
+                        self.stdout.write("  " + formatear_resumen(
+                            etiqueta, medir(lambda: pagina(params), options["repeticiones"])
+                        ))
+                    anteriores, _ = contador.contar(lambda: compras_anteriores(usuario))
+                    self.stdout.write(f"  {'vista anterior (N+1)':<28} {anteriores:>4} comandos")
+
+            if not any(total for totales in conteos.values() for total in totales):
+                raise CommandError(
+                    "No se registró ningún comando: el cliente de MongoDB se creó antes que el listener."
+                )
+            variables = [etiqueta for etiqueta, totales in conteos.items() if len(totales) > 1]
+            if variables:
+                raise CommandError(f"Las consultas por página cambian con el volumen: {', '.join(variables)}")
+            self.stdout.write(self.style.SUCCESS("\nConsultas por página constantes en todos los volúmenes."))
+        finally:
+            self.stdout.write(self.style.WARNING("Borrando pedidos sintéticos..."))
+            pedido_ids = list(Pedido.objects.filter(usuario=usuario).values_list('pk', flat=True))
+            coleccion(Pago).delete_many({columna(Pago, 'pedido'): {'$in': pedido_ids}})
+            coleccion(Pedido).delete_many({'_id': {'$in': pedido_ids}})
+            coleccion(Envio).delete_many({columna(Envio, 'domicilio'): domicilio.pk})
+            # El usuario se lleva en cascada el domicilio y la sesión.
+            usuario.delete()
@@ -0,0 +1,73 @@
+import copy
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from accounts.forms import EmailAuthenticationForm, SignupForm
+from watches.benchmarks import medir, formatear_resumen
+from watches.models import Producto
+
+
+def formularios_eager(request):
+    # Reproduce el render anterior: formularios construidos y paneles incrustados
+    # en cada página.
+    return {
+        "login_form": EmailAuthenticationForm(request),
+        "signup_form": SignupForm(),
+        "open_auth_modal": True,
+    }
+
+
+def _templates_eager():
+    templates = copy.deepcopy(settings.TEMPLATES)
+    procesadores = templates[0]['OPTIONS']['context_processors']
+    procesadores[procesadores.index('accounts.context_processors.auth_forms')] = (
+        'watches.management.commands.benchmark_paginas.formularios_eager'
+    )
+    return templates
+
+
+class Command(BaseCommand):
+    help = "Compara el tiempo de render por página con los formularios de login/registro incrustados y bajo demanda."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repeticiones",
+            type=int,
+            default=30,
+            help="Peticiones por página y variante."
+        )
+
+    def paginas(self):
+        urls = [
+            ("Home", reverse('home')),
+            ("Catálogo", reverse('catalog')),
+            ("Exclusivos", reverse('exclusivos_catalog')),
+        ]
+        producto = Producto.objects.filter(fecha_borrado__isnull=True).first()
+        if producto:
+            urls.append(("Detalle de producto", reverse('product_detail', kwargs={'producto_id': producto.id})))
+        return urls
+
+    def medir_paginas(self, repeticiones):
+        cliente = Client()
+        resultados = {}
+        for etiqueta, url in self.paginas():
+            cliente.get(url)  # calentamiento (plantillas y cachés)
+            resultados[etiqueta] = medir(lambda: cliente.get(url), repeticiones)
+        return resultados
+
+    def handle(self, *args, **options):
+        repeticiones = options["repeticiones"]
+
+        with override_settings(ALLOWED_HOSTS=['*']):
+            with override_settings(TEMPLATES=_templates_eager()):
+                antes = self.medir_paginas(repeticiones)
+            despues = self.medir_paginas(repeticiones)
+
+        for etiqueta in antes:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n{etiqueta} (visitante anónimo)"))
+            self.stdout.write(formatear_resumen("Formularios en cada página", antes[etiqueta]))
+            self.stdout.write(formatear_resumen("Formularios bajo demanda", despues[etiqueta]))
@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from watches.benchmarks import PREFIJO_BENCH, sembrar_catalogo, limpiar_catalogo
+from watches.models import Domicilio, Pedido, Producto, ProductoListado, Tarea
+from watches.mongo import coleccion
+from watches.pedidos import colocar_pedido, nueva_clave_pedido, StockInsuficiente, PedidoRepetido
+
+
+class Command(BaseCommand):
+    help = ("Lanza checkouts simultáneos de dos renglones (uno con stock de sobra y otro con poco) "
+            "y verifica que no se vendan más piezas de las que hay ni quede stock descontado por "
+            "los pedidos rechazados.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--pedidos",
+            type=int,
+            default=50,
+            help="Checkouts simultáneos (uno por hilo)."
+        )
+        parser.add_argument(
+            "--stock",
+            type=int,
+            default=1,
+            help="Stock inicial del producto escaso."
+        )
+        parser.add_argument(
+            "--misma-clave",
+            action="store_true",
+            help="Todos los checkouts reenvían la misma llave de idempotencia (doble clic, reintentos)."
+        )
+
+    def usuario_bench(self):
+        User = get_user_model()
+        usuario, _ = User.objects.get_or_create(
+            email=f'{PREFIJO_BENCH}pedidos@chronoslux.test',
+            defaults={'username': f'{PREFIJO_BENCH}pedidos'},
+        )
+        return usuario
+
+    def handle(self, *args, **options):
+        total_pedidos, stock = options["pedidos"], options["stock"]
+        sembrar_catalogo(2)
+        # El renglón abundante va primero: en un pedido rechazado su $inc ya
+        # se aplicó cuando falla el escaso, y solo el abort lo revierte.
+        abundante, producto = Producto.objects.filter(marca__nombre__startswith=PREFIJO_BENCH)[:2]
+        stock_abundante = total_pedidos * 2
+        for pk, piezas in ((abundante.pk, stock_abundante), (producto.pk, stock)):
+            Producto.objects.filter(pk=pk).update(stock=piezas)
+            ProductoListado.objects.filter(pk=pk).update(stock=piezas)
+
+        usuario = self.usuario_bench()
+        domicilio = Domicilio.objects.create(
+            usuario=usuario, calle='Benchmark', num_ext='1', colonia='Centro',
+            estado='CDMX', cp='00000', pais='México',
+        )
+        lineas = [
+            {
+                'producto_id': p.pk, 'nombre': p.nombre, 'marca': p.marca.nombre,
+                'imagen': '', 'cantidad': 1, 'precio_unitario': p.precio, 'subtotal': p.precio,
+            }
+            for p in (abundante, producto)
+        ]
+
+        clave = nueva_clave_pedido() if options["misma_clave"] else None
+        resultados = Counter()
+        candado = threading.Lock()
+        salida = threading.Barrier(total_pedidos)
+
+        def checkout():
+            salida.wait()
+            try:
+                colocar_pedido(usuario, domicilio, 'paypal', None, lineas, clave or nueva_clave_pedido())
+                resultado = 'colocados'
+            except PedidoRepetido:
+                resultado = 'repetidos'
+            except StockInsuficiente:
+                resultado = 'rechazados'
+            except Exception as error:
+                resultado = f'error: {type(error).__name__}'
+            finally:
+                connection.close()
+            with candado:
+                resultados[resultado] += 1
+
+        try:
+            hilos = [threading.Thread(target=checkout) for _ in range(total_pedidos)]
+            inicio = time.perf_counter()
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+            duracion = (time.perf_counter() - inicio) * 1000
+
+            stock_final = Producto.objects.get(pk=producto.pk).stock
+            abundante_final = Producto.objects.get(pk=abundante.pk).stock
+            pedidos = Pedido.objects.filter(usuario=usuario).count()
+
+            self.stdout.write(self.style.SUCCESS(
+                f"--- {total_pedidos} checkouts simultáneos, stock inicial {stock} ({duracion:.0f} ms) ---"
+            ))
+            for resultado, cuantos in sorted(resultados.items()):
+                self.stdout.write(f"{resultado:<30} {cuantos}")
+            self.stdout.write(f"{'pedidos en la base':<30} {pedidos}")
+            self.stdout.write(f"{'stock final':<30} {stock_final}")
+            self.stdout.write(f"{'stock final del abundante':<30} {abundante_final} de {stock_abundante}")
+
+            esperados = min(stock, 1 if clave else total_pedidos)
+            if resultados['colocados'] != esperados or pedidos != esperados or stock_final != stock - esperados:
+                raise CommandError(f"Se esperaban {esperados} pedidos y stock final {stock - esperados}.")
+            if abundante_final != stock_abundante - pedidos:
+                raise CommandError("Los pedidos rechazados dejaron stock descontado del renglón abundante.")
+            self.stdout.write(self.style.SUCCESS("Sin sobreventa y sin descuentos a medias."))
+        finally:
+            self.stdout.write(self.style.WARNING("Borrando pedidos y productos sintéticos..."))
+            pedido_ids = [str(pk) for pk in Pedido.objects.filter(usuario=usuario).values_list('pk', flat=True)]
+            coleccion(Tarea).delete_many({'datos.pedido_id': {'$in': pedido_ids}})
+            # Borrar el usuario se lleva en cascada domicilio, envíos, pedidos, detalles y pagos.
+            usuario.delete()
+            limpiar_catalogo()
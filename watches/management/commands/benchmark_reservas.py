@@ -0,0 +1,106 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from watches.benchmarks import PREFIJO_BENCH, sembrar_catalogo, limpiar_catalogo, formatear_resumen
+from watches.models import Producto, ProductoListado, Reserva
+from watches.reservas import reservar_lineas, liberar_reservas, VIGENCIA_RESERVA
+
+
+class Command(BaseCommand):
+    help = ("Mide las reservas de checkout bajo contención: muchos usuarios apartando a la vez "
+            "las mismas piezas únicas, y verifica que ninguna se aparte dos veces.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--usuarios",
+            type=int,
+            default=50,
+            help="Usuarios que abren el checkout al mismo tiempo (uno por hilo)."
+        )
+        parser.add_argument(
+            "--productos",
+            type=int,
+            default=3,
+            help="Productos calientes en el carrito de todos, con stock 1 cada uno."
+        )
+
+    def usuarios_bench(self, cuantos):
+        User = get_user_model()
+        User.objects.bulk_create([
+            User(username=f'{PREFIJO_BENCH}reservas{i}', email=f'{PREFIJO_BENCH}reservas{i}@chronoslux.test')
+            for i in range(cuantos)
+        ])
+        return list(User.objects.filter(username__startswith=f'{PREFIJO_BENCH}reservas'))
+
+    def handle(self, *args, **options):
+        sembrar_catalogo(options["productos"])
+        productos = list(Producto.objects.filter(marca__nombre__startswith=PREFIJO_BENCH)[:options["productos"]])
+        ids = [producto.pk for producto in productos]
+        Producto.objects.filter(pk__in=ids).update(stock=1)
+        ProductoListado.objects.filter(pk__in=ids).update(stock=1)
+        lineas = [{'producto_id': producto.pk, 'cantidad': 1, 'nombre': producto.nombre} for producto in productos]
+
+        usuarios = self.usuarios_bench(options["usuarios"])
+        tiempos = []
+        errores = []
+        candado = threading.Lock()
+        salida = threading.Barrier(len(usuarios))
+
+        def checkout(usuario):
+            salida.wait()
+            inicio = time.perf_counter()
+            try:
+                reservar_lineas(usuario.pk, lineas)
+            except Exception as error:
+                with candado:
+                    errores.append(type(error).__name__)
+            finally:
+                connection.close()
+            with candado:
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+
+        try:
+            hilos = [threading.Thread(target=checkout, args=(usuario,)) for usuario in usuarios]
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+
+            self.stdout.write(self.style.SUCCESS(
+                f"--- {len(usuarios)} checkouts simultáneos sobre {len(ids)} pieza(s) única(s) ---"
+            ))
+            self.stdout.write(formatear_resumen("reservar_lineas", tiempos))
+            if errores:
+                self.stdout.write(self.style.ERROR(f"errores: {', '.join(sorted(set(errores)))} ({len(errores)})"))
+
+            reservas = {producto_id: 0 for producto_id in ids}
+            for reserva in Reserva.objects.filter(producto_id__in=ids):
+                reservas[reserva.producto_id] += reserva.cantidad
+            stocks = dict(Producto.objects.filter(pk__in=ids).values_list('pk', 'stock'))
+            for producto in productos:
+                self.stdout.write(
+                    f"  {producto.nombre:<30} apartadas={reservas[producto.pk]}  stock={stocks[producto.pk]}"
+                )
+            if any(reservas[pk] + stocks[pk] != 1 or stocks[pk] < 0 for pk in ids):
+                raise CommandError("Stock y reservas no cuadran: hubo sobreventa o se perdieron piezas.")
+
+            # Como si hubiera pasado la vigencia: todo debe volver al stock.
+            inicio = time.perf_counter()
+            liberadas = liberar_reservas(timezone.now() + VIGENCIA_RESERVA + timedelta(seconds=1))
+            self.stdout.write(
+                f"liberar_reservas: {liberadas} reservas en {(time.perf_counter() - inicio) * 1000:.1f} ms"
+            )
+            if Producto.objects.filter(pk__in=ids, stock=1).count() != len(ids):
+                raise CommandError("La liberación no devolvió todo el stock.")
+            self.stdout.write(self.style.SUCCESS("Sin piezas apartadas dos veces."))
+        finally:
+            self.stdout.write(self.style.WARNING("Borrando usuarios, reservas y productos sintéticos..."))
+            Reserva.objects.filter(producto_id__in=ids).delete()
+            get_user_model().objects.filter(username__startswith=f'{PREFIJO_BENCH}reservas').delete()
+            limpiar_catalogo()
@@ -0,0 +1,147 @@
+import random
+import time
+from importlib import import_module
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from watches.benchmarks import PREFIJO_BENCH, sembrar_catalogo, limpiar_catalogo
+from watches.models import ProductoListado
+from watches.sesiones_lru import cache_sesiones
+
+
+class ContadorEscrituras:
+    # Cuenta las escrituras de sesión: las que pide SessionMiddleware
+    # (SessionStore.save) y las que llegan a MongoDB (Session.save más los
+    # volcados del LRU).
+
+    def __init__(self, motor):
+        self.store = import_module(motor).SessionStore
+        self.guardados = 0
+        self.escrituras_bd = 0
+
+    def __enter__(self):
+        guardar_store, guardar_modelo = self.store.save, Session.save
+
+        def contar_store(store, must_create=False):
+            # create() se llama a sí mismo con must_create=True: se cuenta una vez.
+            if not must_create:
+                self.guardados += 1
+            return guardar_store(store, must_create=must_create)
+
+        def contar_modelo(sesion, *args, **kwargs):
+            self.escrituras_bd += 1
+            return guardar_modelo(sesion, *args, **kwargs)
+
+        self._volcados = cache_sesiones.escrituras_bd
+        self._parches = [
+            mock.patch.object(self.store, 'save', contar_store),
+            mock.patch.object(Session, 'save', contar_modelo),
+        ]
+        for parche in self._parches:
+            parche.start()
+        return self
+
+    def __exit__(self, *exc):
+        for parche in self._parches:
+            parche.stop()
+        cache_sesiones.volcar()
+        self.escrituras_bd += cache_sesiones.escrituras_bd - self._volcados
+
+
+class Command(BaseCommand):
+    help = (
+        "Prueba de carga de los endpoints del carrito para visitantes: mide cuántas escrituras "
+        "de sesión (y cuántas a MongoDB) genera cada petición con cada motor de sesiones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--visitantes",
+            type=int,
+            default=20,
+            help="Visitantes simulados (cada uno con su propia sesión)."
+        )
+        parser.add_argument(
+            "--clics",
+            type=int,
+            default=25,
+            help="Operaciones de carrito por visitante."
+        )
+        parser.add_argument(
+            "--motores",
+            nargs="+",
+            default=sorted(settings.SESIONES_MOTORES),
+            choices=sorted(settings.SESIONES_MOTORES),
+            help="Motores de sesión a medir."
+        )
+
+    def simular(self, productos, visitantes, clics):
+        rng = random.Random(0)
+        peticiones = 0
+        clientes = []
+        for _ in range(visitantes):
+            cliente = Client()
+            clientes.append(cliente)
+            en_carrito = []
+            for _ in range(clics):
+                accion = rng.random()
+                if accion < 0.4 or not en_carrito:
+                    producto = rng.choice(productos)
+                    cliente.post(reverse('add_to_cart', args=[producto]))
+                    en_carrito.append(producto)
+                elif accion < 0.7:
+                    cliente.post(
+                        reverse('cart_batch'),
+                        {'operations': [{'op': 'inc', 'id': rng.choice(en_carrito)}]},
+                        content_type='application/json',
+                    )
+                elif accion < 0.9:
+                    cliente.get(reverse('get_cart_data'))
+                else:
+                    cliente.post(reverse('remove_from_cart', args=[en_carrito.pop()]))
+                peticiones += 1
+        return peticiones, clientes
+
+    def handle(self, *args, **options):
+        sembrar_catalogo(50)
+        productos = [
+            str(pk) for pk in ProductoListado.objects.filter(
+                marca__nombre__startswith=PREFIJO_BENCH).values_list('pk', flat=True)[:50]
+        ]
+        llaves = []
+
+        self.stdout.write(
+            f"{'motor':<8} {'carrito':<8} {'peticiones':>10} {'guardados':>10} {'escr. Mongo':>12} "
+            f"{'guard./pet.':>12} {'Mongo/pet.':>11} {'ms/pet.':>8}"
+        )
+        try:
+            for motor in options["motores"]:
+                for formato in ('sesion', 'cookie'):
+                    with override_settings(
+                        ALLOWED_HOSTS=['*'],
+                        SESSION_ENGINE=settings.SESIONES_MOTORES[motor],
+                        CARRITO_INVITADO=formato,
+                    ):
+                        with ContadorEscrituras(settings.SESIONES_MOTORES[motor]) as contador:
+                            inicio = time.perf_counter()
+                            peticiones, clientes = self.simular(productos, options["visitantes"], options["clics"])
+                            duracion = (time.perf_counter() - inicio) * 1000
+
+                    llaves += [
+                        c.cookies[settings.SESSION_COOKIE_NAME].value
+                        for c in clientes if settings.SESSION_COOKIE_NAME in c.cookies
+                    ]
+                    self.stdout.write(
+                        f"{motor:<8} {formato:<8} {peticiones:>10} {contador.guardados:>10} "
+                        f"{contador.escrituras_bd:>12} {contador.guardados / peticiones:>12.2f} "
+                        f"{contador.escrituras_bd / peticiones:>11.2f} {duracion / peticiones:>8.2f}"
+                    )
+        finally:
+            self.stdout.write(self.style.WARNING("Borrando sesiones y productos sintéticos..."))
+            Session.objects.filter(pk__in=llaves).delete()
+            limpiar_catalogo()
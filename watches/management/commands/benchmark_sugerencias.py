@@ -0,0 +1,69 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from watches import sugerencias
+from watches.benchmarks import sembrar_catalogo, limpiar_catalogo, medir, formatear_resumen, resumen, NOMBRES_BENCH
+from watches.views import sugerencias_api
+
+
+OBJETIVO_P99_MS = 5
+
+
+class Command(BaseCommand):
+    help = "Mide la latencia del endpoint de autocompletado contra el objetivo de p99 < 5 ms."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--productos",
+            type=int,
+            default=10000,
+            help="Cantidad de productos sintéticos en el índice."
+        )
+        parser.add_argument(
+            "--consultas",
+            type=int,
+            default=2000,
+            help="Cantidad de prefijos a consultar."
+        )
+        parser.add_argument(
+            "--conservar",
+            action="store_true",
+            help="No borra los productos sintéticos al terminar."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            self.stdout.write(self.style.WARNING(f"Sembrando hasta {options['productos']} productos..."))
+            sembrar_catalogo(options["productos"])
+
+            inicio = time.perf_counter()
+            sugerencias.invalidar_indice()
+            sugerencias.indice()
+            construccion = (time.perf_counter() - inicio) * 1000
+            self.stdout.write(f"Construcción del índice: {construccion:.1f} ms")
+
+            # Prefijos de 1 a 6 letras, como los que manda el navegador al teclear.
+            rng = random.Random(7)
+            palabras = NOMBRES_BENCH + ['rolex', 'omega', 'acero', 'oro', 'titanio']
+            prefijos = [
+                palabra[:rng.randint(1, min(6, len(palabra)))].lower()
+                for palabra in (rng.choice(palabras) for _ in range(options["consultas"]))
+            ]
+
+            fabrica = RequestFactory()
+            peticiones = iter([fabrica.get('/api/buscar/sugerencias/', {'q': p}) for p in prefijos])
+            tiempos = medir(lambda: sugerencias_api(next(peticiones)), len(prefijos))
+
+            self.stdout.write(formatear_resumen("Autocompletado (vista completa)", tiempos))
+            p99 = resumen(tiempos)['p99']
+            if p99 < OBJETIVO_P99_MS:
+                self.stdout.write(self.style.SUCCESS(f"p99 {p99:.2f} ms < {OBJETIVO_P99_MS} ms"))
+            else:
+                self.stdout.write(self.style.ERROR(f"p99 {p99:.2f} ms >= {OBJETIVO_P99_MS} ms"))
+        finally:
+            if not options["conservar"]:
+                self.stdout.write(self.style.WARNING("Borrando productos sintéticos..."))
+                limpiar_catalogo()
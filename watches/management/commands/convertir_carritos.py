@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from watches.carrito import ALMACENES, trasladar_carritos
+
+
+class Command(BaseCommand):
+    help = "Traslada los carritos activos entre los almacenamientos 'colecciones' y 'embebido'."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--a",
+            dest="destino",
+            choices=sorted(ALMACENES),
+            default=None,
+            help="Almacenamiento destino (por defecto, el de CARRITO_ALMACENAMIENTO)."
+        )
+
+    def handle(self, *args, **options):
+        destino = options["destino"] or settings.CARRITO_ALMACENAMIENTO
+        origen = next(nombre for nombre in ALMACENES if nombre != destino)
+
+        self.stdout.write(self.style.WARNING(f"Trasladando carritos activos de '{origen}' a '{destino}'..."))
+        trasladados, omitidos = trasladar_carritos(origen, destino)
+        self.stdout.write(self.style.SUCCESS(f"Carritos trasladados: {trasladados}"))
+        if omitidos:
+            self.stdout.write(self.style.WARNING(
+                f"Omitidos (el usuario ya tenía carrito activo en '{destino}'): {omitidos}"
+            ))
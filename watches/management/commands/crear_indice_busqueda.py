@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from watches.busqueda import CONTADOR_BUSQUEDA, terminos_producto, crear_indice_texto
+from watches.models import Producto
+from watches.mongo import incrementar_contador
+
+
+class Command(BaseCommand):
+    help = "Recalcula los términos de búsqueda de cada producto y crea el índice de texto en MongoDB."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=500,
+            help="Productos por escritura en bloque."
+        )
+
+    def handle(self, *args, **options):
+        lote = options["lote"]
+        pendientes = []
+        total = 0
+
+        self.stdout.write(self.style.WARNING("Recalculando términos de búsqueda..."))
+        for producto in Producto.objects.select_related('marca', 'categoria').iterator(chunk_size=lote):
+            producto.busqueda = terminos_producto(producto)
+            pendientes.append(producto)
+            if len(pendientes) >= lote:
+                Producto.objects.bulk_update(pendientes, ['busqueda'])
+                total += len(pendientes)
+                pendientes = []
+
+        if pendientes:
+            Producto.objects.bulk_update(pendientes, ['busqueda'])
+            total += len(pendientes)
+
+        # bulk_update no dispara señales: los índices locales de los workers
+        # se reconstruyen al ver el contador nuevo.
+        incrementar_contador(CONTADOR_BUSQUEDA)
+        self.stdout.write(self.style.SUCCESS(f"Productos actualizados: {total}"))
+
+        nombre = crear_indice_texto()
+        self.stdout.write(self.style.SUCCESS(f"Índice de texto listo: {nombre}"))
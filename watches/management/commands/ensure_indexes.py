@@ -0,0 +1,128 @@
+import re
+from datetime import timedelta
+
+from bson import ObjectId
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from watches.catalogo import ORDENAMIENTOS
+from watches.models import (
+    Carrito, CarritoDocumento, DetalleCarrito, Devolucion, Pedido, Producto, ProductoListado, Resena,
+    Reserva,
+)
+from watches.mongo import coleccion
+
+
+ETAPAS_RE = re.compile(r'"stage"\s*:\s*"(\w+)"')
+INDICES_RE = re.compile(r'"indexName"\s*:\s*"(\w+)"')
+
+
+def _primer_id(modelo):
+    return modelo.objects.values_list('pk', flat=True).first() or ObjectId()
+
+
+def consultas_por_vista():
+    # Consultas representativas de cada vista, con ids reales si hay datos.
+    usuario_id = _primer_id(get_user_model())
+    producto_id = _primer_id(Producto)
+    carrito_id = _primer_id(Carrito)
+    pedido_id = _primer_id(Pedido)
+    pagina = slice(0, 25)
+
+    return [
+        ('home', 'destacados', ProductoListado.objects.filter(
+            fecha_borrado__isnull=True, es_exclusivo=False)[pagina]),
+        ('catalog', 'destacados', ProductoListado.objects.filter(
+            es_exclusivo=False).order_by(*ORDENAMIENTOS['featured'])[pagina]),
+        ('catalog', 'precio ascendente', ProductoListado.objects.filter(
+            es_exclusivo=False, precio__lte=5000).order_by(*ORDENAMIENTOS['price_asc'])[pagina]),
+        ('catalog', 'nombre ascendente', ProductoListado.objects.filter(
+            es_exclusivo=False).order_by(*ORDENAMIENTOS['name_asc'])[pagina]),
+        ('exclusivos_catalog', 'precio descendente', ProductoListado.objects.filter(
+            es_exclusivo=True).order_by(*ORDENAMIENTOS['price_desc'])[pagina]),
+        ('carrito', 'carrito activo', Carrito.objects.filter(
+            usuario_id=usuario_id, estado='activo')),
+        ('carrito', 'renglón del carrito', DetalleCarrito.objects.filter(
+            carrito_id=carrito_id, producto_id=producto_id)),
+        ('carrito', 'carrito embebido activo', CarritoDocumento.objects.filter(
+            usuario_id=usuario_id, estado='activo')),
+        ('checkout', 'reservas del usuario', Reserva.objects.filter(
+            usuario_id=usuario_id)),
+        ('checkout', 'reservas vencidas del producto', Reserva.objects.filter(
+            producto_id=producto_id, fecha_expiracion__lt=timezone.now())),
+        ('product_detail', 'reseñas', Resena.objects.filter(
+            producto_id=producto_id).order_by('-fecha')),
+        ('mis_compras', 'pedidos del usuario', Pedido.objects.filter(
+            usuario_id=usuario_id).order_by('-fecha')),
+        ('mis_compras', 'devoluciones del pedido', Devolucion.objects.filter(
+            pedido_id=pedido_id)),
+        ('gestionar_compras', 'pedidos por fecha', Pedido.objects.filter(
+            fecha__gte=timezone.now() - timedelta(days=30)).order_by('-fecha', '-id')[pagina]),
+        ('gestionar_compras', 'pedidos por método de pago', Pedido.objects.filter(
+            metodo_pago='paypal').order_by('-fecha', '-id')[pagina]),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Crea los índices y restricciones únicas declarados en Meta que falten en MongoDB y, con --explain, "
+        "muestra qué índice usa cada consulta de las vistas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--explain",
+            action="store_true",
+            help="Reporta el plan ganador (IXSCAN/COLLSCAN) de las consultas de cada vista."
+        )
+
+    def handle(self, *args, **options):
+        self.crear_indices()
+        if options["explain"]:
+            self.explicar()
+
+    def crear_indices(self):
+        # Desde MongoDB 4.2 todas las construcciones son "híbridas": solo bloquean
+        # la colección al inicio y al final, la app sigue leyendo y escribiendo.
+        creados = 0
+        with connection.schema_editor() as editor:
+            for modelo in apps.get_app_config('watches').get_models():
+                # Las restricciones únicas también son índices en MongoDB.
+                declarados = [
+                    *((indice, editor.add_index) for indice in modelo._meta.indexes),
+                    *((restriccion, editor.add_constraint) for restriccion in modelo._meta.constraints),
+                ]
+                if not declarados:
+                    continue
+                existentes = coleccion(modelo).index_information()
+                for indice, crear in declarados:
+                    if indice.name in existentes:
+                        self.stdout.write(f"  {modelo._meta.db_table}.{indice.name}: ya existe")
+                        continue
+                    crear(modelo, indice)
+                    creados += 1
+                    self.stdout.write(self.style.SUCCESS(f"  {modelo._meta.db_table}.{indice.name}: creado"))
+
+        self.stdout.write(self.style.SUCCESS(f"Índices creados: {creados}"))
+
+    def explicar(self):
+        self.stdout.write(self.style.MIGRATE_HEADING("\nCobertura de índices por vista"))
+        sin_indice = 0
+        for vista, descripcion, queryset in consultas_por_vista():
+            plan = queryset.explain()
+            etapas = ETAPAS_RE.findall(plan)
+            indices = sorted(set(INDICES_RE.findall(plan)))
+            etiqueta = f"{vista} / {descripcion}"
+            if 'COLLSCAN' in etapas:
+                sin_indice += 1
+                self.stdout.write(self.style.ERROR(f"  {etiqueta:<45} COLLSCAN"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"  {etiqueta:<45} IXSCAN ({', '.join(indices) or '_id_'})"))
+
+        if sin_indice:
+            self.stdout.write(self.style.WARNING(f"Consultas sin índice: {sin_indice}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Todas las consultas usan un índice."))
@@ -0,0 +1,82 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from watches.carrito import expirar_carritos
+from watches.models import BarridoCarritos, CarritoDocumento
+from watches.mongo import coleccion
+
+
+INDICE_TTL = 'carritodoc_expirados_ttl'
+
+
+class Command(BaseCommand):
+    help = (
+        "Marca como expirados los carritos activos vencidos (un update_many por almacenamiento) "
+        "y registra cuántos expiró cada barrido. Pensado para cron o para correr con --cada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--cada",
+            type=int,
+            default=0,
+            help="Segundos entre barridos; 0 ejecuta uno solo."
+        )
+        parser.add_argument(
+            "--ttl-dias",
+            type=int,
+            default=None,
+            help="Crea un índice TTL que borra los carritos embebidos expirados tras N días."
+        )
+        parser.add_argument(
+            "--historial",
+            type=int,
+            default=0,
+            help="Muestra los últimos N barridos registrados y termina."
+        )
+
+    def handle(self, *args, **options):
+        if options["historial"]:
+            self.mostrar_historial(options["historial"])
+            return
+
+        if options["ttl_dias"] is not None:
+            self.crear_ttl(options["ttl_dias"])
+
+        while True:
+            barrido = expirar_carritos()
+            self.stdout.write(self.style.SUCCESS(
+                f"[{barrido.fecha:%Y-%m-%d %H:%M:%S}] expirados: "
+                f"colecciones={barrido.expirados_colecciones} embebido={barrido.expirados_embebidos} "
+                f"({barrido.duracion_ms:.1f} ms)"
+            ))
+            if not options["cada"]:
+                break
+            time.sleep(options["cada"])
+
+    def crear_ttl(self, dias):
+        # Solo CarritoDocumento: sus renglones van dentro del documento. En modo
+        # 'colecciones' un TTL dejaría DetalleCarrito huérfanos.
+        carritos = coleccion(CarritoDocumento)
+        segundos = dias * 24 * 60 * 60
+        actual = carritos.index_information().get(INDICE_TTL)
+        if actual and actual.get('expireAfterSeconds') == segundos:
+            self.stdout.write(f"  {INDICE_TTL}: ya existe ({dias} días)")
+            return
+        if actual:
+            carritos.drop_index(INDICE_TTL)
+        carritos.create_index(
+            'fecha_expiracion',
+            name=INDICE_TTL,
+            expireAfterSeconds=segundos,
+            partialFilterExpression={'estado': 'expirado'},
+        )
+        self.stdout.write(self.style.SUCCESS(f"  {INDICE_TTL}: creado ({dias} días)"))
+
+    def mostrar_historial(self, cantidad):
+        for barrido in BarridoCarritos.objects.all()[:cantidad]:
+            self.stdout.write(
+                f"{barrido.fecha:%Y-%m-%d %H:%M:%S}  colecciones={barrido.expirados_colecciones:<6} "
+                f"embebido={barrido.expirados_embebidos:<6} {barrido.duracion_ms:8.1f} ms"
+            )
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from watches.reservas import liberar_reservas, ReservaFallida
+
+
+class Command(BaseCommand):
+    help = (
+        "Devuelve al stock las reservas de checkout vencidas (por lotes, una transacción cada uno). "
+        "Pensado para cron o para correr con --cada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--cada",
+            type=int,
+            default=0,
+            help="Segundos entre barridos; 0 ejecuta uno solo."
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            inicio = time.perf_counter()
+            ahora = timezone.now()
+            try:
+                liberadas = liberar_reservas(ahora)
+            except ReservaFallida as error:
+                # Lo que quedó pendiente se reintenta en el siguiente barrido.
+                if not options["cada"]:
+                    raise
+                self.stdout.write(self.style.WARNING(f"[{ahora:%Y-%m-%d %H:%M:%S}] {error}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f"[{ahora:%Y-%m-%d %H:%M:%S}] reservas liberadas: {liberadas} "
+                    f"({(time.perf_counter() - inicio) * 1000:.1f} ms)"
+                ))
+            if not options["cada"]:
+                break
+            time.sleep(options["cada"])
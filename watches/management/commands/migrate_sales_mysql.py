@@ -392,7 +392,7 @@ class Command(BaseCommand):
                             omitidos += 1
                             continue
 
-                        Pago.objects.update_or_create(
+                        pago, _ = Pago.objects.update_or_create(
                             pedido=pedido,
                             defaults={
                                 "metodo_pago": row.get("metodo_pago") or "tarjeta",
@@ -401,6 +401,7 @@ class Command(BaseCommand):
                                 "monto_pagar": money(row.get("monto_pagar")),
                             }
                         )
+                        Pedido.objects.filter(pk=pedido.pk).update(metodo_pago=pago.metodo_pago)
 
                         migrados += 1
 
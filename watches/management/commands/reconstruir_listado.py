@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from watches.listado import reconstruir_listado
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el modelo de lectura de los listados (ProductoListado) a partir de Producto."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=1000,
+            help="Documentos por escritura en bloque."
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING("Reconstruyendo ProductoListado..."))
+        total = reconstruir_listado(options["lote"])
+        self.stdout.write(self.style.SUCCESS(f"Documentos escritos: {total}"))
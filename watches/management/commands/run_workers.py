@@ -0,0 +1,117 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from watches.models import Tarea
+from watches.mongo import coleccion
+from watches.reservas import liberar_reservas
+from watches.tareas import pool, tomar_tarea, ejecutar_tarea
+
+
+INDICE_TTL = 'tarea_hechas_ttl'
+
+
+class Command(BaseCommand):
+    help = (
+        "Atiende la cola de tareas del pedido (correo de confirmación) con un pool de hilos y barre "
+        "las reservas de checkout vencidas; los fallos se reintentan con espera exponencial."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hilos",
+            type=int,
+            default=4,
+            help="Hilos trabajadores."
+        )
+        parser.add_argument(
+            "--una-vez",
+            action="store_true",
+            help="Atiende lo que esté disponible en este momento y termina."
+        )
+        parser.add_argument(
+            "--estado",
+            action="store_true",
+            help="Muestra cuántas tareas hay en cada estado y las últimas fallidas, y termina."
+        )
+        parser.add_argument(
+            "--reintentar-fallidas",
+            action="store_true",
+            help="Devuelve las tareas fallidas a pendiente con los intentos en cero."
+        )
+        parser.add_argument(
+            "--ttl-dias",
+            type=int,
+            default=None,
+            help="Crea un índice TTL que borra las tareas hechas tras N días."
+        )
+
+    def handle(self, *args, **options):
+        if options["estado"]:
+            self.mostrar_estado()
+            return
+
+        if options["reintentar_fallidas"]:
+            reintentadas = Tarea.objects.filter(estado='fallida').update(
+                estado='pendiente', intentos=0, disponible_en=timezone.now(),
+            )
+            self.stdout.write(self.style.SUCCESS(f"Tareas devueltas a pendiente: {reintentadas}"))
+
+        if options["ttl_dias"] is not None:
+            self.crear_ttl(options["ttl_dias"])
+
+        if options["una_vez"]:
+            self.vaciar()
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"Atendiendo tareas con {options['hilos']} hilos (Ctrl+C para salir)..."))
+        pool.iniciar(options["hilos"])
+        try:
+            while True:
+                time.sleep(60)
+                self.stdout.write(f"[{timezone.now():%Y-%m-%d %H:%M:%S}] hechas={pool.hechas} fallos={pool.fallos}")
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Deteniendo trabajadores..."))
+            pool.detener()
+
+    def vaciar(self):
+        # Sin pool no hay barrido periódico: se barren las reservas vencidas
+        # una vez antes de atender la cola.
+        liberadas = liberar_reservas()
+        self.stdout.write(f"reservas liberadas={liberadas}")
+        hechas = fallos = 0
+        while (tarea := tomar_tarea()) is not None:
+            if ejecutar_tarea(tarea):
+                hechas += 1
+            else:
+                fallos += 1
+        self.stdout.write(self.style.SUCCESS(f"hechas={hechas} fallos={fallos}"))
+
+    def mostrar_estado(self):
+        conteos = {
+            fila['_id']: fila['total']
+            for fila in coleccion(Tarea).aggregate([{'$group': {'_id': '$estado', 'total': {'$sum': 1}}}])
+        }
+        for estado, _ in Tarea.ESTADOS:
+            self.stdout.write(f"{estado:<12} {conteos.get(estado, 0)}")
+        for tarea in Tarea.objects.filter(estado='fallida').order_by('-fecha_fin')[:10]:
+            ultima_linea = tarea.error.strip().splitlines()[-1] if tarea.error.strip() else ''
+            self.stdout.write(self.style.ERROR(f"  {tarea.pk} {tarea.tipo} {tarea.datos}: {ultima_linea}"))
+
+    def crear_ttl(self, dias):
+        tareas = coleccion(Tarea)
+        segundos = dias * 24 * 60 * 60
+        actual = tareas.index_information().get(INDICE_TTL)
+        if actual and actual.get('expireAfterSeconds') == segundos:
+            self.stdout.write(f"  {INDICE_TTL}: ya existe ({dias} días)")
+            return
+        if actual:
+            tareas.drop_index(INDICE_TTL)
+        tareas.create_index(
+            'fecha_fin',
+            name=INDICE_TTL,
+            expireAfterSeconds=segundos,
+            partialFilterExpression={'estado': 'hecha'},
+        )
+        self.stdout.write(self.style.SUCCESS(f"  {INDICE_TTL}: creado ({dias} días)"))
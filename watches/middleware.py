@@ -0,0 +1,15 @@
+from .carrito_invitado import escribir_cookie
+
+
+class CarritoInvitadoMiddleware:
+    # Escribe la cookie del carrito de visitantes cuando una vista la modificó
+    # (CARRITO_INVITADO = 'cookie'); en modo 'sesion' no hace nada.
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if getattr(request, '_carrito_cookie_pendiente', False):
+            escribir_cookie(request, response)
+        return response
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+from watches.busqueda import terminos_producto
+
+
+def calcular_terminos(apps, schema_editor):
+    # Los productos existentes no pasan por la señal pre_save: sin esto el
+    # índice de texto no los encontraría hasta correr crear_indice_busqueda.
+    Producto = apps.get_model('watches', 'Producto')
+
+    pendientes = []
+    for producto in Producto.objects.select_related('marca', 'categoria').iterator(chunk_size=500):
+        producto.busqueda = terminos_producto(producto)
+        pendientes.append(producto)
+        if len(pendientes) == 500:
+            Producto.objects.bulk_update(pendientes, ['busqueda'])
+            pendientes = []
+    if pendientes:
+        Producto.objects.bulk_update(pendientes, ['busqueda'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('watches', '0002_alter_pago_metodo_pago'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='busqueda',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(calcular_terminos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:40
+
+import django_mongodb_backend.fields
+from django.db import migrations, models
+
+
+def poblar_listado(apps, schema_editor):
+    Producto = apps.get_model('watches', 'Producto')
+    ImgProducto = apps.get_model('watches', 'ImgProducto')
+    ProductoListado = apps.get_model('watches', 'ProductoListado')
+    MarcaListado = apps.get_model('watches', 'MarcaListado')
+    CategoriaListado = apps.get_model('watches', 'CategoriaListado')
+    ImagenListado = apps.get_model('watches', 'ImagenListado')
+
+    imagenes = {img.producto_id: img.url.name for img in ImgProducto.objects.all()}
+    documentos = [
+        ProductoListado(
+            id=p.id,
+            nombre=p.nombre,
+            precio=p.precio,
+            descripcion1=p.descripcion1,
+            descripcion2=p.descripcion2,
+            descripcion3=p.descripcion3,
+            stock=p.stock,
+            es_exclusivo=p.es_exclusivo,
+            fecha_borrado=p.fecha_borrado,
+            fecha_creacion=p.fecha_creacion,
+            id_marca=p.marca_id,
+            id_categoria=p.categoria_id,
+            marca=MarcaListado(nombre=p.marca.nombre),
+            categoria=CategoriaListado(genero=p.categoria.genero, material=p.categoria.material, tipo=p.categoria.tipo),
+            imgproducto=ImagenListado(url=imagenes[p.id]) if p.id in imagenes else None,
+        )
+        for p in Producto.objects.select_related('marca', 'categoria')
+    ]
+    ProductoListado.objects.bulk_create(documentos, batch_size=1000)
+
+
+def vaciar_listado(apps, schema_editor):
+    apps.get_model('watches', 'ProductoListado').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('watches', '0003_producto_busqueda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoriaListado',
+            fields=[
+                ('id', django_mongodb_backend.fields.ObjectIdAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('genero', models.CharField(max_length=60)),
+                ('material', models.CharField(max_length=60)),
+                ('tipo', models.CharField(blank=True, max_length=60, null=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ImagenListado',
+            fields=[
+                ('id', django_mongodb_backend.fields.ObjectIdAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.ImageField(upload_to='watches/')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='MarcaListado',
+            fields=[
+                ('id', django_mongodb_backend.fields.ObjectIdAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=60)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductoListado',
+            fields=[
+                ('id', django_mongodb_backend.fields.ObjectIdAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=60)),
+                ('precio', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('descripcion1', models.CharField(blank=True, max_length=140, null=True)),
+                ('descripcion2', models.CharField(blank=True, max_length=140, null=True)),
+                ('descripcion3', models.CharField(blank=True, max_length=140, null=True)),
+                ('stock', models.IntegerField(default=0)),
+                ('es_exclusivo', models.BooleanField(default=False)),
+                ('fecha_borrado', models.DateTimeField(blank=True, null=True)),
+                ('fecha_creacion', models.DateTimeField(blank=True, null=True)),
+                ('id_marca', django_mongodb_backend.fields.ObjectIdField()),
+                ('id_categoria', django_mongodb_backend.fields.ObjectIdField()),
+                ('marca', django_mongodb_backend.fields.EmbeddedModelField('watches.marcalistado')),
+                ('categoria', django_mongodb_backend.fields.EmbeddedModelField('watches.categorialistado')),
+                ('imgproducto', django_mongodb_backend.fields.EmbeddedModelField('watches.imagenlistado', blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(poblar_listado, vaciar_listado),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('watches', '0004_productolistado'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['es_exclusivo', 'fecha_borrado', 'precio'], name='producto_excl_borr_precio'),
+        ),
+        migrations.AddIndex(
+            model_name='productolistado',
+            index=models.Index(fields=['es_exclusivo', 'fecha_borrado', 'precio'], name='listado_excl_borr_precio'),
+        ),
+        migrations.AddIndex(
+            model_name='productolistado',
+            index=models.Index(fields=['es_exclusivo', 'precio', 'id'], name='listado_excl_precio_id'),
+        ),
+        migrations.AddIndex(
+            model_name='productolistado',
+            index=models.Index(fields=['es_exclusivo', 'nombre', 'id'], name='listado_excl_nombre_id'),
+        ),
+        migrations.AddIndex(
+            model_name='productolistado',
+            index=models.Index(fields=['id_marca'], name='listado_id_marca'),
+        ),
+        migrations.AddIndex(
+            model_name='productolistado',
+            index=models.Index(fields=['id_categoria'], name='listado_id_categoria'),
+        ),
+        migrations.AddIndex(
+            model_name='carrito',
+            index=models.Index(fields=['usuario', 'estado'], name='carrito_usuario_estado'),
+        ),
+        migrations.AddIndex(
+            model_name='detallecarrito',
+            index=models.Index(fields=['carrito', 'producto'], name='detallecarrito_carrito_prod'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['usuario', '-fecha'], name='pedido_usuario_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='resena',
+            index=models.Index(fields=['producto', '-fecha'], name='resena_producto_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='devolucion',
+            index=models.Index(fields=['pedido'], name='devolucion_pedido'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:20
+
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fusionar_duplicados(apps, schema_editor):
+    # Las restricciones únicas fallan si ya hay duplicados: se fusionan antes.
+    Carrito = apps.get_model('watches', 'Carrito')
+    DetalleCarrito = apps.get_model('watches', 'DetalleCarrito')
+    sin_fecha = datetime.min.replace(tzinfo=timezone.utc)
+
+    # 1. Varios carritos activos por usuario: se queda el más reciente, recibe
+    #    los renglones de los demás y los demás quedan expirados.
+    usuarios = (
+        Carrito.objects.filter(estado='activo').values('usuario_id')
+        .annotate(carritos=Count('id')).filter(carritos__gt=1).values_list('usuario_id', flat=True)
+    )
+    for usuario_id in list(usuarios):
+        carritos = list(Carrito.objects.filter(usuario_id=usuario_id, estado='activo'))
+        conservado = max(carritos, key=lambda carrito: (carrito.fecha_creacion or sin_fecha, carrito.pk))
+        otros = [carrito.pk for carrito in carritos if carrito.pk != conservado.pk]
+        DetalleCarrito.objects.filter(carrito_id__in=otros).update(carrito_id=conservado.pk)
+        Carrito.objects.filter(pk__in=otros).update(estado='expirado')
+
+    # 2. Varios renglones del mismo producto en un carrito: se suman en el
+    #    primero y se borran los demás.
+    repetidos = (
+        DetalleCarrito.objects.values('carrito_id', 'producto_id')
+        .annotate(renglones=Count('id')).filter(renglones__gt=1)
+    )
+    for clave in list(repetidos):
+        primero, *resto = DetalleCarrito.objects.filter(
+            carrito_id=clave['carrito_id'], producto_id=clave['producto_id'],
+        ).order_by('pk')
+        primero.cantidad += sum(detalle.cantidad for detalle in resto)
+        primero.subtotal = primero.precio_unitario * primero.cantidad
+        primero.save(update_fields=['cantidad', 'subtotal'])
+        DetalleCarrito.objects.filter(pk__in=[detalle.pk for detalle in resto]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('watches', '0005_indices'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='detallecarrito',
+            name='detallecarrito_carrito_prod',
+        ),
+        migrations.RunPython(fusionar_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='carrito',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado', 'activo')), fields=('usuario',), name='carrito_activo_unico'),
+        ),
+        migrations.AddConstraint(
+            model_name='detallecarrito',
+            constraint=models.UniqueConstraint(fields=('carrito', 'producto'), name='detallecarrito_unico'),
+        ),
+    ]
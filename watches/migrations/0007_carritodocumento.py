@@ -0,0 +1,50 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:02
+
+import django.db.models.deletion
+import django_mongodb_backend.fields
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('watches', '0006_carrito_restricciones'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LineaCarrito',
+            fields=[
+                ('id', django_mongodb_backend.fields.ObjectIdAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('producto_id', django_mongodb_backend.fields.ObjectIdField()),
+                ('nombre', models.CharField(max_length=60)),
+                ('marca', models.CharField(max_length=60)),
+                ('imagen', models.CharField(blank=True, default='', max_length=255)),
+                ('cantidad', models.IntegerField()),
+                ('precio_unitario', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=12)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='CarritoDocumento',
+            fields=[
+                ('id', django_mongodb_backend.fields.ObjectIdAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado', models.CharField(choices=[('activo', 'Activo'), ('expirado', 'Expirado'), ('convertido', 'Convertido')], default='activo', max_length=20)),
+                ('fecha_creacion', models.DateTimeField(blank=True, null=True)),
+                ('fecha_expiracion', models.DateTimeField(blank=True, null=True)),
+                ('lineas', django_mongodb_backend.fields.EmbeddedModelArrayField('watches.lineacarrito', default=list)),
+                ('total_items', models.IntegerField(default=0)),
+                ('total_price', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['usuario', 'estado'], name='carritodoc_usuario_estado')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('estado', 'activo')), fields=('usuario',), name='carritodoc_activo_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:40
+
+import django_mongodb_backend.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('watches', '0007_carritodocumento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BarridoCarritos',
+            fields=[
+                ('id', django_mongodb_backend.fields.ObjectIdAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField()),
+                ('expirados_colecciones', models.IntegerField(default=0)),
+                ('expirados_embebidos', models.IntegerField(default=0)),
+                ('duracion_ms', models.FloatField(default=0)),
+            ],
+            options={
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='carrito',
+            index=models.Index(fields=['estado', 'fecha_expiracion'], name='carrito_estado_expira'),
+        ),
+        migrations.AddIndex(
+            model_name='carritodocumento',
+            index=models.Index(fields=['estado', 'fecha_expiracion'], name='carritodoc_estado_expira'),
+        ),
+    ]
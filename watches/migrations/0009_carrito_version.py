@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('watches', '0008_barrido_carritos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='carrito',
+            name='version',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='carritodocumento',
+            name='version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:05
+
+import django.db.models.deletion
+import django_mongodb_backend.fields
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('watches', '0009_carrito_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reserva',
+            fields=[
+                ('id', django_mongodb_backend.fields.ObjectIdAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.IntegerField()),
+                ('fecha_expiracion', models.DateTimeField()),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='watches.producto')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fecha_expiracion'], name='reserva_expira'), models.Index(fields=['producto', 'fecha_expiracion'], name='reserva_producto_expira')],
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'producto'), name='reserva_usuario_producto')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:40
+
+import django.db.models.deletion
+import django_mongodb_backend.fields
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('watches', '0010_reserva'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClavePedido',
+            fields=[
+                ('id', django_mongodb_backend.fields.ObjectIdAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=32)),
+                ('fecha', models.DateTimeField()),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='watches.pedido')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'clave'), name='clavepedido_unica')],
+            },
+        ),
+    ]
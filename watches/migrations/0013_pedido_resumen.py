@@ -0,0 +1,68 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:50
+
+import django_mongodb_backend.fields
+from django.db import migrations, models
+
+
+def poblar_resumen(apps, schema_editor):
+    Pedido = apps.get_model('watches', 'Pedido')
+    DetallesPedido = apps.get_model('watches', 'DetallesPedido')
+    ImgProducto = apps.get_model('watches', 'ImgProducto')
+    LineaPedido = apps.get_model('watches', 'LineaPedido')
+
+    imagenes = {img.producto_id: img.url.name for img in ImgProducto.objects.all()}
+    lineas = {}
+    for detalle in DetallesPedido.objects.select_related('producto__marca'):
+        lineas.setdefault(detalle.pedido_id, []).append(LineaPedido(
+            producto_id=detalle.producto_id,
+            nombre=detalle.producto.nombre,
+            marca=detalle.producto.marca.nombre,
+            imagen=imagenes.get(detalle.producto_id, ''),
+            cantidad=detalle.cantidad,
+            precio_unitario=detalle.precio_unitario,
+            subtotal=detalle.cantidad * detalle.precio_unitario,
+        ))
+
+    pedidos = []
+    for pedido in Pedido.objects.filter(pk__in=list(lineas)):
+        pedido.lineas = lineas[pedido.pk]
+        pedido.total_items = sum(linea.cantidad for linea in pedido.lineas)
+        pedidos.append(pedido)
+    Pedido.objects.bulk_update(pedidos, ['lineas', 'total_items'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('watches', '0012_tarea'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LineaPedido',
+            fields=[
+                ('id', django_mongodb_backend.fields.ObjectIdAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('producto_id', django_mongodb_backend.fields.ObjectIdField()),
+                ('nombre', models.CharField(max_length=60)),
+                ('marca', models.CharField(max_length=60)),
+                ('imagen', models.CharField(blank=True, default='', max_length=255)),
+                ('cantidad', models.IntegerField()),
+                ('precio_unitario', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=12)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='lineas',
+            field=django_mongodb_backend.fields.EmbeddedModelArrayField('watches.lineapedido', default=list),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='total_items',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(poblar_resumen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-18 23:40
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def poblar_totales(apps, schema_editor):
+    Carrito = apps.get_model('watches', 'Carrito')
+    DetalleCarrito = apps.get_model('watches', 'DetalleCarrito')
+
+    totales = {}
+    for detalle in DetalleCarrito.objects.filter(carrito__estado='activo').only('carrito_id', 'cantidad', 'subtotal'):
+        items, precio = totales.get(detalle.carrito_id, (0, Decimal('0')))
+        totales[detalle.carrito_id] = (items + detalle.cantidad, precio + (detalle.subtotal or 0))
+
+    carritos = []
+    for carrito in Carrito.objects.filter(pk__in=list(totales)):
+        carrito.total_items, carrito.total_price = totales[carrito.pk]
+        carritos.append(carrito)
+    Carrito.objects.bulk_update(carritos, ['total_items', 'total_price'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('watches', '0014_pedido_fecha'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='carrito',
+            name='total_items',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='carrito',
+            name='total_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(poblar_totales, migrations.RunPython.noop),
+    ]
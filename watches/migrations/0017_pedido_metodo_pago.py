@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:10
+
+from django.db import migrations, models
+
+
+def copiar_metodo_pago(apps, schema_editor):
+    Pedido = apps.get_model('watches', 'Pedido')
+    Pago = apps.get_model('watches', 'Pago')
+
+    pedidos = []
+    for pedido_id, metodo_pago in Pago.objects.values_list('pedido_id', 'metodo_pago').iterator():
+        pedidos.append(Pedido(pk=pedido_id, metodo_pago=metodo_pago))
+        if len(pedidos) == 500:
+            Pedido.objects.bulk_update(pedidos, ['metodo_pago'])
+            pedidos = []
+    if pedidos:
+        Pedido.objects.bulk_update(pedidos, ['metodo_pago'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('watches', '0016_contador'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='metodo_pago',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+        migrations.RunPython(copiar_metodo_pago, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['metodo_pago', '-fecha', '-id'], name='pedido_metodo_fecha'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
+from django_mongodb_backend.fields import EmbeddedModelArrayField, EmbeddedModelField, ObjectIdField
+from django_mongodb_backend.models import EmbeddedModel
 
 
 class Usuario(models.Model):
@@ -44,6 +46,13 @@ class Producto(models.Model):
     fecha_actualizacion = models.DateTimeField(blank=True, null=True)
     marca = models.ForeignKey(Marca, on_delete=models.CASCADE)
     categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE)
+    # Términos normalizados por campo; los cubre el índice de texto (ver watches/busqueda.py).
+    busqueda = models.JSONField(blank=True, null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['es_exclusivo', 'fecha_borrado', 'precio'], name='producto_excl_borr_precio'),
+        ]
 
     def __str__(self):
         return self.nombre
@@ -58,6 +67,55 @@ class ImgProducto(models.Model):
         return f"Imagen de {self.producto.nombre}"
 
 
+# --- MODELO DE LECTURA PARA LISTADOS (ver watches/listado.py) ---
+# Copia desnormalizada de Producto con marca, categoría e imagen embebidas,
+# para que los listados lean una sola colección sin $lookup.
+
+class MarcaListado(EmbeddedModel):
+    nombre = models.CharField(max_length=60)
+
+
+class CategoriaListado(EmbeddedModel):
+    genero = models.CharField(max_length=60)
+    material = models.CharField(max_length=60)
+    tipo = models.CharField(max_length=60, blank=True, null=True)
+
+
+class ImagenListado(EmbeddedModel):
+    url = models.ImageField(upload_to='watches/')
+
+
+class ProductoListado(models.Model):
+    # Mismo _id que el Producto de origen.
+    nombre = models.CharField(max_length=60)
+    precio = models.DecimalField(max_digits=12, decimal_places=2)
+    descripcion1 = models.CharField(max_length=140, blank=True, null=True)
+    descripcion2 = models.CharField(max_length=140, blank=True, null=True)
+    descripcion3 = models.CharField(max_length=140, blank=True, null=True)
+    stock = models.IntegerField(default=0)
+    es_exclusivo = models.BooleanField(default=False)
+    fecha_borrado = models.DateTimeField(blank=True, null=True)
+    fecha_creacion = models.DateTimeField(blank=True, null=True)
+    id_marca = ObjectIdField()
+    id_categoria = ObjectIdField()
+    marca = EmbeddedModelField(MarcaListado)
+    categoria = EmbeddedModelField(CategoriaListado)
+    imgproducto = EmbeddedModelField(ImagenListado, blank=True, null=True)
+
+    class Meta:
+        # Cubren los filtros + orden del catálogo y el keyset (precio, _id).
+        indexes = [
+            models.Index(fields=['es_exclusivo', 'fecha_borrado', 'precio'], name='listado_excl_borr_precio'),
+            models.Index(fields=['es_exclusivo', 'precio', 'id'], name='listado_excl_precio_id'),
+            models.Index(fields=['es_exclusivo', 'nombre', 'id'], name='listado_excl_nombre_id'),
+            models.Index(fields=['id_marca'], name='listado_id_marca'),
+            models.Index(fields=['id_categoria'], name='listado_id_categoria'),
+        ]
+
+    def __str__(self):
+        return self.nombre
+
+
 class Carrito(models.Model):
     ESTADOS = (
         ('activo', 'Activo'),
@@ -68,6 +126,26 @@ class Carrito(models.Model):
     fecha_expiracion = models.DateTimeField(blank=True, null=True)
     estado = models.CharField(max_length=20, choices=ESTADOS, default='activo')
     usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # Se incrementa con cada cambio de renglones; alimenta el ETag de /api/carrito/.
+    version = models.IntegerField(default=0)
+    # Totales de los renglones, al día con cada mutación (watches/carrito.py).
+    total_items = models.IntegerField(default=0)
+    total_price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['usuario', 'estado'], name='carrito_usuario_estado'),
+            # Barrido de expirar_carritos.
+            models.Index(fields=['estado', 'fecha_expiracion'], name='carrito_estado_expira'),
+        ]
+        constraints = [
+            # Un solo carrito activo por usuario (ver watches/carrito.carrito_activo).
+            models.UniqueConstraint(
+                fields=['usuario'],
+                condition=models.Q(estado='activo'),
+                name='carrito_activo_unico',
+            ),
+        ]
 
     def __str__(self):
         return f"Carrito {self.id} de {self.usuario.email}"
@@ -80,10 +158,103 @@ class DetalleCarrito(models.Model):
     precio_unitario = models.DecimalField(max_digits=12, decimal_places=2)
     subtotal = models.DecimalField(max_digits=12, decimal_places=2)
 
+    class Meta:
+        constraints = [
+            # Destino de los upserts del carrito: un renglón por producto.
+            models.UniqueConstraint(fields=['carrito', 'producto'], name='detallecarrito_unico'),
+        ]
+
     def __str__(self):
         return f"{self.cantidad} x {self.producto.nombre}"
 
 
+# --- CARRITO COMO DOCUMENTO ÚNICO (CARRITO_ALMACENAMIENTO = 'embebido') ---
+# Renglones embebidos con los datos que muestra el cajón del carrito y
+# totales precalculados: leer el carrito es un solo find_one sin joins.
+
+class LineaCarrito(EmbeddedModel):
+    producto_id = ObjectIdField()
+    nombre = models.CharField(max_length=60)
+    marca = models.CharField(max_length=60)
+    imagen = models.CharField(max_length=255, blank=True, default='')
+    cantidad = models.IntegerField()
+    precio_unitario = models.DecimalField(max_digits=12, decimal_places=2)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2)
+
+
+class CarritoDocumento(models.Model):
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    estado = models.CharField(max_length=20, choices=Carrito.ESTADOS, default='activo')
+    fecha_creacion = models.DateTimeField(blank=True, null=True)
+    fecha_expiracion = models.DateTimeField(blank=True, null=True)
+    lineas = EmbeddedModelArrayField(LineaCarrito, default=list)
+    total_items = models.IntegerField(default=0)
+    total_price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    version = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['usuario', 'estado'], name='carritodoc_usuario_estado'),
+            models.Index(fields=['estado', 'fecha_expiracion'], name='carritodoc_estado_expira'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['usuario'],
+                condition=models.Q(estado='activo'),
+                name='carritodoc_activo_unico',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Carrito {self.id} de {self.usuario_id}"
+
+
+class BarridoCarritos(models.Model):
+    # Una fila por ejecución de expirar_carritos.
+    fecha = models.DateTimeField()
+    expirados_colecciones = models.IntegerField(default=0)
+    expirados_embebidos = models.IntegerField(default=0)
+    duracion_ms = models.FloatField(default=0)
+
+    class Meta:
+        ordering = ['-fecha']
+
+    def __str__(self):
+        return f"Barrido {self.fecha:%Y-%m-%d %H:%M}: {self.expirados_colecciones + self.expirados_embebidos} expirados"
+
+
+class Contador(models.Model):
+    # Contadores compartidos por todos los procesos (versión del catálogo
+    # cuando la caché es local, ver watches/cache_catalogo.py).
+    nombre = models.CharField(max_length=50, unique=True)
+    valor = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.nombre}: {self.valor}"
+
+
+class Reserva(models.Model):
+    # Piezas apartadas durante el checkout (watches/reservas.py); el stock de
+    # Producto ya las tiene descontadas mientras la reserva exista.
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    cantidad = models.IntegerField()
+    fecha_expiracion = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # Barrido de liberar_reservas y liberación en caliente por producto.
+            models.Index(fields=['fecha_expiracion'], name='reserva_expira'),
+            models.Index(fields=['producto', 'fecha_expiracion'], name='reserva_producto_expira'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'producto'], name='reserva_usuario_producto'),
+        ]
+
+    def __str__(self):
+        return f"{self.cantidad} x {self.producto_id} para {self.usuario_id}"
+
+
 class Domicilio(models.Model):
     usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     telefono = models.CharField(max_length=30, blank=True, null=True)
@@ -108,6 +279,20 @@ class Envio(models.Model):
         return f"Envio {self.id}"
 
 
+# --- RESUMEN DEL PEDIDO ---
+# Copia inmutable de los renglones al momento de la compra: mis_compras y la
+# confirmación se pintan desde el propio Pedido, sin DetallesPedido ni Producto.
+
+class LineaPedido(EmbeddedModel):
+    producto_id = ObjectIdField()
+    nombre = models.CharField(max_length=60)
+    marca = models.CharField(max_length=60)
+    imagen = models.CharField(max_length=255, blank=True, default='')
+    cantidad = models.IntegerField()
+    precio_unitario = models.DecimalField(max_digits=12, decimal_places=2)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2)
+
+
 class Pedido(models.Model):
     usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     carrito = models.ForeignKey(Carrito, on_delete=models.SET_NULL, blank=True, null=True)
@@ -115,11 +300,42 @@ class Pedido(models.Model):
     fecha = models.DateTimeField(blank=True, null=True)
     subtotal = models.DecimalField(max_digits=12, decimal_places=2)
     total_pagar = models.DecimalField(max_digits=12, decimal_places=2)
+    lineas = EmbeddedModelArrayField(LineaPedido, default=list)
+    total_items = models.IntegerField(default=0)
+    # Copia de Pago.metodo_pago: el historial del administrador filtra por él
+    # sin $lookup (watches/compras.py). Se escribe junto con el Pago.
+    metodo_pago = models.CharField(max_length=20, blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['usuario', '-fecha'], name='pedido_usuario_fecha'),
+            # Historial de compras del administrador (watches/compras.py).
+            models.Index(fields=['-fecha', '-id'], name='pedido_fecha'),
+            models.Index(fields=['metodo_pago', '-fecha', '-id'], name='pedido_metodo_fecha'),
+        ]
 
     def __str__(self):
         return f"Pedido {self.id} - {self.usuario}"
 
 
+class ClavePedido(models.Model):
+    # Llave de idempotencia del checkout: cada visita al checkout lleva una en
+    # el formulario y place_order la registra dentro de la transacción del
+    # pedido (watches/pedidos.py). Un reenvío con la misma llave no crea otro.
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    clave = models.CharField(max_length=32)
+    pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE)
+    fecha = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'clave'], name='clavepedido_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.clave} -> pedido {self.pedido_id}"
+
+
 class DetallesPedido(models.Model):
     pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE)
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
@@ -157,6 +373,34 @@ class Pago(models.Model):
         return f"Pago {self.id} - {self.metodo_pago}"
 
 
+class Tarea(models.Model):
+    # Bandeja de salida de trabajos diferidos (watches/tareas.py): se inserta
+    # en la misma transacción que el pedido y la atienden los trabajadores.
+    ESTADOS = (
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En proceso'),
+        ('hecha', 'Hecha'),
+        ('fallida', 'Fallida'),
+    )
+    tipo = models.CharField(max_length=40)
+    datos = models.JSONField(default=dict)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
+    intentos = models.IntegerField(default=0)
+    # Siguiente intento (pendiente) o fin del bloqueo del trabajador (en_proceso).
+    disponible_en = models.DateTimeField()
+    fecha_creacion = models.DateTimeField()
+    fecha_fin = models.DateTimeField(blank=True, null=True)
+    error = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado', 'disponible_en'], name='tarea_estado_disponible'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} ({self.estado}, {self.intentos} intentos)"
+
+
 class Resena(models.Model):
     usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
@@ -164,6 +408,11 @@ class Resena(models.Model):
     comentario = models.TextField(blank=True, null=True)
     fecha = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['producto', '-fecha'], name='resena_producto_fecha'),
+        ]
+
     def __str__(self):
         return f"Reseña de {self.usuario} sobre {self.producto}"
 
@@ -180,6 +429,11 @@ class Devolucion(models.Model):
     descripcion_devolucion = models.TextField(blank=True, null=True)
     estado = models.CharField(max_length=20, choices=ESTADOS, default='solicitada')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['pedido'], name='devolucion_pedido'),
+        ]
+
     def __str__(self):
         return f"Devolución {self.id} - {self.pedido}"
 
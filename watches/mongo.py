@@ -0,0 +1,105 @@
+import random
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, connection
+from django_mongodb_backend import transaction
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+from .models import Contador
+
+
+# --- INICIO: ACCESO DIRECTO A COLECCIONES DE MONGODB ---
+
+def coleccion(modelo):
+    # Colección de pymongo detrás de un modelo, para las operaciones que el ORM
+    # no expresa ($text, $facet, upserts atómicos, bulk_write...).
+    return connection.get_collection(modelo._meta.db_table)
+
+
+def columna(modelo, campo):
+    return modelo._meta.get_field(campo).column
+
+# --- FIN: ACCESO DIRECTO A COLECCIONES DE MONGODB ---
+
+# --- INICIO: CONTADORES COMPARTIDOS ---
+# Un documento Contador por nombre; todos los procesos leen el mismo valor
+# (a diferencia de la caché local de cada worker).
+
+def leer_contador(nombre):
+    documento = coleccion(Contador).find_one({'nombre': nombre}, {'valor': 1})
+    return documento['valor'] if documento else 0
+
+
+def incrementar_contador(nombre):
+    return coleccion(Contador).find_one_and_update(
+        {'nombre': nombre}, {'$inc': {'valor': 1}},
+        projection={'valor': 1}, upsert=True, return_document=ReturnDocument.AFTER,
+    )['valor']
+
+# --- FIN: CONTADORES COMPARTIDOS ---
+
+# --- INICIO: TRANSACCIONES ---
+# django.db.transaction.atomic() no hace nada con este backend
+# (supports_transactions=False): la transacción multi-documento la abre
+# django_mongodb_backend.transaction.atomic(), que deja la sesión en
+# connection.session. Requiere replica set o sharded cluster.
+# Dos transacciones que escriben el mismo documento chocan con WriteConflict:
+# la que pierde se aborta y se reintenta completa.
+
+MAX_INTENTOS_TRANSACCION = 5
+ESPERA_REINTENTO = 0.02
+
+
+class SinTransaccion(RuntimeError):
+    # Una escritura de varios pasos se intentó fuera de una transacción: sin
+    # ella nada revierte los pasos ya aplicados si uno posterior falla.
+    pass
+
+
+def sesion_transaccion():
+    # Sesión de la transacción abierta por en_transaccion. El ORM la toma solo
+    # de connection.session; las operaciones con pymongo directo deben
+    # pasarla como `session`.
+    if connection.session is None:
+        raise SinTransaccion('No hay una transacción de MongoDB abierta')
+    return connection.session
+
+
+def error_transitorio(error):
+    # El backend puede envolver el error de pymongo en un DatabaseError.
+    if isinstance(error, DatabaseError) and error.__cause__ is not None:
+        error = error.__cause__
+    return isinstance(error, PyMongoError) and error.has_error_label('TransientTransactionError')
+
+
+def _cerrar_sesion():
+    # Si el commit falla con un error de pymongo, atomic() no cierra la sesión
+    # y la siguiente transacción del hilo la reusaría. end_session() aborta lo
+    # que haya quedado abierto.
+    if connection.session is not None and not connection.in_atomic_block_mongo:
+        sesion, connection.session = connection.session, None
+        sesion.end_session()
+
+
+def en_transaccion(funcion, *args, **kwargs):
+    # funcion(sesion, *args, **kwargs) dentro de una transacción multi-documento;
+    # cualquier excepción la aborta sin dejar nada escrito, y las transitorias
+    # la reintentan con espera exponencial con jitter.
+    if not connection.features._supports_transactions:
+        raise ImproperlyConfigured(
+            'Las transacciones requieren que MongoDB corra como replica set o sharded cluster.'
+        )
+    for intento in range(MAX_INTENTOS_TRANSACCION):
+        try:
+            with transaction.atomic():
+                return funcion(sesion_transaccion(), *args, **kwargs)
+        except (PyMongoError, DatabaseError) as error:
+            if not error_transitorio(error) or intento == MAX_INTENTOS_TRANSACCION - 1:
+                raise
+        finally:
+            _cerrar_sesion()
+        time.sleep(ESPERA_REINTENTO * (2 ** intento) * random.uniform(0.5, 1.5))
+
+# --- FIN: TRANSACCIONES ---
@@ -0,0 +1,154 @@
+import base64
+import json
+
+from django.db.models import Q
+
+
+# --- INICIO: PAGINACIÓN POR CURSOR (KEYSET) ---
+
+TAMANO_PAGINA = 24
+
+ADELANTE = 'n'
+ATRAS = 'p'
+
+
+class PaginaCursor:
+    def __init__(self, object_list, cursor_siguiente=None, cursor_anterior=None):
+        self.object_list = object_list
+        self.next_cursor = cursor_siguiente
+        self.previous_cursor = cursor_anterior
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def codificar_cursor(direccion, valores):
+    crudo = json.dumps([direccion, [str(v) for v in valores]], separators=(',', ':'))
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(token):
+    if not token:
+        return None
+    try:
+        relleno = '=' * (-len(token) % 4)
+        direccion, valores = json.loads(base64.urlsafe_b64decode(token + relleno))
+    except (ValueError, TypeError):
+        return None
+    if direccion not in (ADELANTE, ATRAS) or not isinstance(valores, list):
+        return None
+    return direccion, valores
+
+
+def _nombre(campo):
+    return campo.lstrip('-')
+
+
+def _invertir(orden):
+    return tuple(_nombre(c) if c.startswith('-') else f'-{c}' for c in orden)
+
+
+def _condicion_keyset(orden, valores):
+    # (a, b) > (x, y)  ==>  a > x  OR  (a = x AND b > y), respetando asc/desc.
+    condicion = Q()
+    iguales = {}
+    for campo, valor in zip(orden, valores):
+        lookup = 'lt' if campo.startswith('-') else 'gt'
+        condicion |= Q(**iguales, **{f'{_nombre(campo)}__{lookup}': valor})
+        iguales[_nombre(campo)] = valor
+    return condicion
+
+
+def _valores_de(obj, orden):
+    return [getattr(obj, _nombre(campo)) for campo in orden]
+
+
+def _convertir_valores(modelo, orden, valores):
+    if len(valores) != len(orden):
+        return None
+    try:
+        return [
+            modelo._meta.get_field('id' if _nombre(c) == 'pk' else _nombre(c)).to_python(v)
+            for c, v in zip(orden, valores)
+        ]
+    except Exception:
+        return None
+
+
+def paginar(queryset, orden, cursor=None, tamano=TAMANO_PAGINA):
+    # Cada página es un $match sobre (campo de orden, _id) + $limit, así que
+    # cuesta lo mismo sin importar qué tan profunda sea.
+    decodificado = decodificar_cursor(cursor)
+    valores = None
+    direccion = ADELANTE
+    if decodificado:
+        direccion, crudos = decodificado
+        valores = _convertir_valores(queryset.model, orden, crudos)
+        if valores is None:
+            direccion = ADELANTE
+
+    orden_consulta = orden if direccion == ADELANTE else _invertir(orden)
+    consulta = queryset.order_by(*orden_consulta)
+    if valores is not None:
+        consulta = consulta.filter(_condicion_keyset(orden_consulta, valores))
+
+    filas = list(consulta[:tamano + 1])
+    hay_mas = len(filas) > tamano
+    filas = filas[:tamano]
+
+    if direccion == ATRAS:
+        filas.reverse()
+        hay_siguiente = valores is not None
+        hay_anterior = hay_mas
+    else:
+        hay_siguiente = hay_mas
+        hay_anterior = valores is not None
+
+    cursor_siguiente = None
+    cursor_anterior = None
+    if filas and hay_siguiente:
+        cursor_siguiente = codificar_cursor(ADELANTE, _valores_de(filas[-1], orden))
+    if filas and hay_anterior:
+        cursor_anterior = codificar_cursor(ATRAS, _valores_de(filas[0], orden))
+
+    return PaginaCursor(filas, cursor_siguiente, cursor_anterior)
+
+
+def paginar_lista(ids, cursor=None, tamano=TAMANO_PAGINA):
+    # Para rankings ya ordenados y acotados en memoria (resultados de búsqueda):
+    # el cursor guarda la posición dentro de la lista.
+    decodificado = decodificar_cursor(cursor)
+    inicio = 0
+    if decodificado:
+        try:
+            inicio = max(0, int(decodificado[1][0]))
+        except (IndexError, ValueError):
+            inicio = 0
+
+    pagina = ids[inicio:inicio + tamano]
+    cursor_siguiente = codificar_cursor(ADELANTE, [inicio + tamano]) if inicio + tamano < len(ids) else None
+    cursor_anterior = codificar_cursor(ATRAS, [max(0, inicio - tamano)]) if inicio > 0 else None
+    return pagina, cursor_siguiente, cursor_anterior
+
+
+def querystring_sin_cursor(params):
+    copia = params.copy()
+    copia.pop('cursor', None)
+    return copia.urlencode()
+
+# --- FIN: PAGINACIÓN POR CURSOR (KEYSET) ---
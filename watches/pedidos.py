@@ -0,0 +1,226 @@
+import re
+import uuid
+
+from bson import ObjectId
+from django.utils import timezone
+from pymongo.errors import DuplicateKeyError
+
+from .carrito import convertir_carrito, carrito_vaciado, usa_colecciones
+from .models import Envio, Pago, Pedido, DetallesPedido, LineaPedido, Producto, ClavePedido
+from .mongo import coleccion, columna, en_transaccion
+from .reservas import ajustar_stock, consumir_reservas, publicar_stocks, reservas_usuario
+from .tareas import DIAS_ENTREGA, dias_habiles_despues, encolar, despertar_trabajadores
+
+
+# --- INICIO: COLOCACIÓN DE PEDIDOS ---
+# Un pedido es una sola transacción multi-documento de MongoDB (mongo.en_transaccion):
+#   0. se registra la llave de idempotencia del formulario (ClavePedido, única
+#      por usuario); un reenvío choca aquí antes de tocar carrito o stock, y
+#      si el pedido falla después, el abort la borra y la llave sigue libre;
+#   1. el carrito pasa de 'activo' a 'convertido' (un doble envío no pasa de aquí);
+#   2. se consumen las reservas del usuario (watches/reservas.py) y un bulk_write
+#      descuenta solo lo que no estaba apartado, con $inc condicionado a
+#      stock >= cantidad; si algún renglón no alcanza, se aborta todo;
+#   3. el Envio, el Pedido, su Pago, los DetallesPedido (un bulk_create) y la
+#      tarea del correo de confirmación.
+# Todas las escrituras van en la sesión de la transacción: las de pymongo con
+# session=sesion y las del ORM (Envio, Pedido, Pago, DetallesPedido), que la toman de
+# connection.session. Si un renglón posterior no alcanza, el abort revierte
+# también los $inc ya aplicados de los anteriores, el carrito y las reservas.
+# Dos checkouts que tocan el mismo producto chocan con WriteConflict: el que
+# pierde reintenta la transacción completa y ya ve el stock descontado.
+
+MAX_INTENTOS_PEDIDO = 3
+CLAVE_RE = re.compile(r'[0-9a-f]{32}')
+
+
+class StockInsuficiente(Exception):
+
+    def __init__(self, linea, disponible):
+        super().__init__(f"No hay suficiente stock para '{linea['nombre']}'")
+        self.linea = linea
+        self.disponible = disponible
+
+
+class CarritoNoDisponible(Exception):
+    pass
+
+
+class PedidoRepetido(Exception):
+    # La llave ya se usó: el pedido original está en pedido_id.
+
+    def __init__(self, pedido_id):
+        super().__init__(f"Pedido ya colocado: {pedido_id}")
+        self.pedido_id = pedido_id
+
+
+class _SinStock(Exception):
+    # Interna: aborta la transacción; el renglón culpable se busca fuera de ella.
+    pass
+
+
+def nueva_clave_pedido():
+    return uuid.uuid4().hex
+
+
+def clave_valida(clave):
+    return bool(clave) and CLAVE_RE.fullmatch(clave) is not None
+
+
+def pedido_por_clave(usuario_id, clave):
+    # Id del pedido ya colocado con esta llave, o None. Un find_one sobre el
+    # índice único: los reintentos no pasan de aquí. La llave y el pedido se
+    # escriben en la misma transacción, pero una llave huérfana (sin Pedido)
+    # no debe mandar al usuario a una confirmación inexistente: se borra y la
+    # llave queda libre.
+    documento = coleccion(ClavePedido).find_one(
+        {columna(ClavePedido, 'usuario'): usuario_id, 'clave': clave},
+        {columna(ClavePedido, 'pedido'): 1},
+    )
+    if documento is None:
+        return None
+    pedido_id = documento[columna(ClavePedido, 'pedido')]
+    if coleccion(Pedido).count_documents({'_id': pedido_id}, limit=1):
+        return pedido_id
+    coleccion(ClavePedido).delete_one({'_id': documento['_id']})
+    return None
+
+
+def _linea_sin_stock(usuario_id, lineas):
+    # Tras el rollback: el primer renglón que ya no alcanza contando lo que el
+    # usuario tiene apartado (None si otro pedido liberó stock entre tanto y
+    # vale la pena reintentar).
+    reservadas = reservas_usuario(usuario_id)
+    stocks = {
+        documento['_id']: documento['stock']
+        for documento in coleccion(Producto).find(
+            {'_id': {'$in': [linea['producto_id'] for linea in lineas]}}, {'stock': 1},
+        )
+    }
+    for linea in lineas:
+        disponible = stocks.get(linea['producto_id'], 0) + reservadas.get(linea['producto_id'], 0)
+        if disponible < linea['cantidad']:
+            return linea, disponible
+    return None
+
+
+def _escribir_pedido(sesion, usuario, domicilio, metodo_pago, carrito_id, lineas, total, clave):
+    ahora = timezone.now()
+    pedido_id = ObjectId()
+    if clave is not None:
+        coleccion(ClavePedido).insert_one({
+            columna(ClavePedido, 'usuario'): usuario.pk,
+            'clave': clave,
+            columna(ClavePedido, 'pedido'): pedido_id,
+            'fecha': ahora,
+        }, session=sesion)
+
+    if carrito_id is not None and not convertir_carrito(carrito_id, sesion=sesion):
+        raise CarritoNoDisponible
+
+    # Lo apartado ya salió del stock; lo apartado que ya no se pide vuelve.
+    ajustes = {producto_id: -piezas for producto_id, piezas in consumir_reservas(usuario.pk, sesion).items()}
+    for linea in lineas:
+        ajustes[linea['producto_id']] = ajustes.get(linea['producto_id'], 0) + linea['cantidad']
+    if not ajustar_stock(ajustes, sesion):
+        raise _SinStock
+
+    fecha_envio = dias_habiles_despues(ahora, 1)
+    envio = Envio.objects.create(
+        domicilio=domicilio,
+        fecha_envio=fecha_envio,
+        fecha_llegada=dias_habiles_despues(fecha_envio, DIAS_ENTREGA)
+    )
+
+    pedido = Pedido.objects.create(
+        id=pedido_id,
+        usuario=usuario,
+        envio=envio,
+        # En modo 'embebido' el carrito no es un Carrito del ORM.
+        carrito_id=carrito_id if usa_colecciones() else None,
+        fecha=ahora,
+        subtotal=total,
+        total_pagar=total,
+        # Resumen inmutable para mis_compras y la confirmación.
+        lineas=[
+            LineaPedido(
+                producto_id=linea['producto_id'],
+                nombre=linea['nombre'],
+                marca=linea['marca'],
+                imagen=linea['imagen'],
+                cantidad=linea['cantidad'],
+                precio_unitario=linea['precio_unitario'],
+                subtotal=linea['subtotal']
+            )
+            for linea in lineas
+        ],
+        total_items=sum(linea['cantidad'] for linea in lineas),
+        metodo_pago=metodo_pago
+    )
+
+    Pago.objects.create(
+        pedido=pedido,
+        metodo_pago=metodo_pago,
+        monto_pagar=total,
+        estado='aprobado',
+        fecha_pago=ahora
+    )
+
+    DetallesPedido.objects.bulk_create([
+        DetallesPedido(
+            pedido=pedido,
+            producto_id=linea['producto_id'],
+            cantidad=linea['cantidad'],
+            precio_unitario=linea['precio_unitario']
+        )
+        for linea in lineas
+    ])
+
+    # Solo el correo sale de la petición: queda en la bandeja de salida y lo
+    # atiende run_workers (watches/tareas.py). Si la transacción aborta, la
+    # tarea desaparece con ella.
+    encolar([
+        ('pedido.correo', {'pedido_id': str(pedido_id)}),
+    ], sesion=sesion)
+    return pedido, list(ajustes)
+
+
+def colocar_pedido(usuario, domicilio, metodo_pago, carrito_id, lineas, clave=None):
+    # `lineas` con el formato de carrito.lineas_carrito. carrito_id=None no
+    # convierte ningún carrito (benchmark_pedidos). Lanza StockInsuficiente,
+    # CarritoNoDisponible o PedidoRepetido; en todos los casos no queda nada
+    # escrito.
+    total = sum(linea['subtotal'] for linea in lineas)
+
+    for _ in range(MAX_INTENTOS_PEDIDO):
+        try:
+            pedido, producto_ids = en_transaccion(
+                _escribir_pedido, usuario, domicilio, metodo_pago, carrito_id, lineas, total, clave,
+            )
+        except DuplicateKeyError:
+            # Otro envío con la misma llave ganó la carrera y ya hizo commit.
+            pedido_id = pedido_por_clave(usuario.pk, clave)
+            if pedido_id is not None:
+                raise PedidoRepetido(pedido_id)
+            # Era una llave huérfana y ya se borró: se intenta de nuevo.
+            continue
+        except _SinStock:
+            faltante = _linea_sin_stock(usuario.pk, lineas)
+            if faltante is not None:
+                raise StockInsuficiente(*faltante)
+            continue
+
+        if carrito_id is not None:
+            carrito_vaciado(usuario.pk)
+        # Los eventos de stock se publican aquí y no desde una tarea: el broker
+        # SSE vive en memoria del proceso web (watches/eventos.py) y un
+        # `run_workers` aparte los publicaría donde ningún cliente escucha.
+        publicar_stocks(producto_ids)
+        despertar_trabajadores()
+        return pedido
+
+    # Agotados los intentos con el stock cambiando entre uno y otro.
+    faltante = _linea_sin_stock(usuario.pk, lineas)
+    raise StockInsuficiente(*(faltante or (lineas[0], 0)))
+
+# --- FIN: COLOCACIÓN DE PEDIDOS ---
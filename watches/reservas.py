@@ -0,0 +1,239 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from pymongo import DeleteOne, UpdateOne
+
+from .cache_catalogo import incrementar_version_catalogo
+from .eventos import publicar_stock
+from .models import Producto, ProductoListado, Reserva
+from .mongo import coleccion, columna, en_transaccion, SinTransaccion
+
+
+# --- INICIO: RESERVAS DE STOCK DURANTE EL CHECKOUT ---
+# Al abrir el checkout se apartan las piezas del carrito: el stock de Producto
+# se descuenta con $inc condicionado y se anota una Reserva por (usuario,
+# producto) con fecha_expiracion, todo en una transacción. Mientras la reserva
+# exista nadie más puede comprar esas piezas.
+#   - pedidos.colocar_pedido consume las reservas del usuario en la misma
+#     transacción del pedido (el carrito se convierte y las piezas ya son suyas);
+#   - las vencidas las devuelve liberar_reservas: el barrido periódico de los
+#     trabajadores de tareas (settings.RESERVAS_BARRIDO), el comando del mismo
+#     nombre y, en caliente, reservar_lineas cuando un producto no alcanza;
+#   - al cerrar sesión, liberar_reservas_usuario devuelve las del usuario.
+# Cada paso que toca stock y reservas a la vez corre en una transacción
+# (mongo.en_transaccion): si algo falla, ni el stock ni las reservas cambian.
+# Sin índice TTL a propósito: MongoDB borraría la reserva sin devolver el stock.
+# Como las reservas viven dentro de Producto.stock, nadie debe escribir el
+# stock con el valor de una instancia leída antes (producto.save() completo):
+# las entradas van por reponer_stock y las ediciones excluyen el campo.
+
+VIGENCIA_RESERVA = timedelta(minutes=10)
+LOTE_LIBERACION = 500
+INTENTOS_RESERVA = 3
+
+
+class ReservaFallida(RuntimeError):
+    # La transacción se abortó sin cambiar nada porque el stock no cuadró.
+    # En una petición se avisa al usuario; una liberación pendiente la
+    # reintenta el siguiente barrido.
+    pass
+
+
+def ajustar_stock(ajustes, sesion):
+    # ajustes: {producto_id: piezas a descontar (negativo devuelve)}. Solo
+    # descuenta donde alcanza y devuelve False si algún producto no alcanzó;
+    # el llamador aborta la transacción. ProductoListado sigue al stock.
+    # El bulk_write es ordenado y se detiene en el primer fallo, pero los $inc
+    # previos ya se aplicaron: fuera de una transacción quedarían a medias.
+    if sesion is None:
+        raise SinTransaccion('ajustar_stock requiere la sesión de una transacción')
+    ajustes = {producto_id: piezas for producto_id, piezas in ajustes.items() if piezas}
+    if not ajustes:
+        return True
+
+    resultado = coleccion(Producto).bulk_write([
+        UpdateOne({'_id': producto_id, 'stock': {'$gte': piezas}}, {'$inc': {'stock': -piezas}})
+        for producto_id, piezas in ajustes.items()
+    ], session=sesion)
+    if resultado.matched_count < len(ajustes):
+        return False
+
+    coleccion(ProductoListado).bulk_write([
+        UpdateOne({'_id': producto_id}, {'$inc': {'stock': -piezas}})
+        for producto_id, piezas in ajustes.items()
+    ], ordered=False, session=sesion)
+    return True
+
+
+def publicar_stocks(producto_ids):
+    # Después del commit: los $inc de stock no pasan por Producto.save(), así
+    # que las señales (eventos SSE, versión del catálogo) se disparan aquí.
+    producto_ids = list(producto_ids)
+    if not producto_ids:
+        return
+    for documento in coleccion(Producto).find({'_id': {'$in': producto_ids}}, {'stock': 1}):
+        publicar_stock(documento['_id'], documento['stock'])
+    incrementar_version_catalogo()
+
+
+def reservas_usuario(usuario_id, sesion=None):
+    # {producto_id: piezas apartadas}, vencidas o no: mientras no se liberen
+    # el stock sigue descontado y son del usuario.
+    return {
+        reserva[columna(Reserva, 'producto')]: reserva['cantidad']
+        for reserva in coleccion(Reserva).find(
+            {columna(Reserva, 'usuario'): usuario_id},
+            {columna(Reserva, 'producto'): 1, 'cantidad': 1},
+            session=sesion,
+        )
+    }
+
+
+def consumir_reservas(usuario_id, sesion):
+    # Dentro de la transacción del pedido: las reservas desaparecen y sus
+    # piezas pasan al pedido (o vuelven al stock si ya no se piden).
+    reservadas = reservas_usuario(usuario_id, sesion)
+    if reservadas:
+        coleccion(Reserva).delete_many({columna(Reserva, 'usuario'): usuario_id}, session=sesion)
+    return reservadas
+
+
+def _reservar(sesion, usuario_id, deseadas, expira):
+    actuales = reservas_usuario(usuario_id, sesion)
+    ids = deseadas.keys() | actuales.keys()
+    stocks = {
+        documento['_id']: documento['stock']
+        for documento in coleccion(Producto).find({'_id': {'$in': list(ids)}}, {'stock': 1}, session=sesion)
+    }
+
+    # Lo propio ya está descontado del stock: se puede subir hasta propio + disponible.
+    reservadas = {
+        producto_id: min(
+            deseadas.get(producto_id, 0),
+            actuales.get(producto_id, 0) + max(stocks.get(producto_id, 0), 0),
+        )
+        for producto_id in ids
+    }
+    ajustes = {producto_id: reservadas[producto_id] - actuales.get(producto_id, 0) for producto_id in ids}
+    # Con la lectura de arriba en la misma transacción, solo un WriteConflict
+    # (que en_transaccion reintenta) puede dejar un descuento sin aplicar; la
+    # excepción aborta y revierte los $inc ya aplicados.
+    if not ajustar_stock(ajustes, sesion):
+        raise ReservaFallida('El stock cambió dentro de la transacción de reserva')
+
+    usuario = columna(Reserva, 'usuario')
+    producto = columna(Reserva, 'producto')
+    operaciones = [
+        UpdateOne(
+            {usuario: usuario_id, producto: producto_id},
+            {'$set': {'cantidad': piezas, 'fecha_expiracion': expira}},
+            upsert=True,
+        ) if piezas > 0 else DeleteOne({usuario: usuario_id, producto: producto_id})
+        for producto_id, piezas in reservadas.items()
+        if piezas > 0 or producto_id in actuales
+    ]
+    if operaciones:
+        coleccion(Reserva).bulk_write(operaciones, ordered=False, session=sesion)
+
+    return reservadas, [producto_id for producto_id, piezas in ajustes.items() if piezas]
+
+
+def reservar_lineas(usuario_id, lineas):
+    # Aparta las piezas de `lineas` (formato de carrito.lineas_carrito) y
+    # renueva la vigencia; lo que ya no está en el carrito se devuelve.
+    # Regresa ({producto_id: piezas apartadas}, fecha de expiración).
+    deseadas = {linea['producto_id']: linea['cantidad'] for linea in lineas}
+    expira = timezone.now() + VIGENCIA_RESERVA
+
+    reservadas, cambiados = _reservar_con_reintento(usuario_id, deseadas, expira)
+    cortos = [producto_id for producto_id, piezas in deseadas.items() if reservadas[producto_id] < piezas]
+    # Un producto que no alcanza puede tener reservas vencidas sin barrer. Si
+    # liberarlas falla, el barrido lo reintenta; la petición sigue con lo que hay.
+    liberadas = 0
+    if cortos:
+        try:
+            liberadas = liberar_reservas(producto_ids=cortos)
+        except ReservaFallida:
+            pass
+    if liberadas:
+        reservadas, mas = _reservar_con_reintento(usuario_id, deseadas, expira)
+        cambiados += mas
+
+    publicar_stocks(set(cambiados))
+    return reservadas, expira
+
+
+def _reservar_con_reintento(usuario_id, deseadas, expira):
+    # Cada intento es una transacción nueva que vuelve a leer el stock.
+    for intento in range(INTENTOS_RESERVA):
+        try:
+            return en_transaccion(_reservar, usuario_id, deseadas, expira)
+        except ReservaFallida:
+            if intento == INTENTOS_RESERVA - 1:
+                raise
+
+
+def _liberar(sesion, filtro):
+    reservas = coleccion(Reserva)
+    producto = columna(Reserva, 'producto')
+    vencidas = list(reservas.find(filtro, {producto: 1, 'cantidad': 1}, session=sesion).limit(LOTE_LIBERACION))
+    if not vencidas:
+        return 0, {}
+
+    devolver = {}
+    for reserva in vencidas:
+        devolver[reserva[producto]] = devolver.get(reserva[producto], 0) - reserva['cantidad']
+    # Las reservas de productos ya borrados solo se eliminan: no hay stock al
+    # cual devolverlas, y dejarlas atoraría el lote en cada barrido.
+    existentes = set(coleccion(Producto).distinct('_id', {'_id': {'$in': list(devolver)}}, session=sesion))
+    devolver = {producto_id: piezas for producto_id, piezas in devolver.items() if producto_id in existentes}
+    reservas.delete_many({'_id': {'$in': [reserva['_id'] for reserva in vencidas]}}, session=sesion)
+    # Borrar la reserva y devolver su stock van juntos o no van.
+    if not ajustar_stock(devolver, sesion):
+        raise ReservaFallida('No se pudo devolver el stock de las reservas liberadas')
+    return len(vencidas), devolver
+
+
+def liberar_reservas(ahora=None, producto_ids=None):
+    # Devuelve al stock las reservas vencidas. Regresa cuántas liberó.
+    filtro = {'fecha_expiracion': {'$lt': ahora or timezone.now()}}
+    if producto_ids is not None:
+        filtro[columna(Reserva, 'producto')] = {'$in': list(producto_ids)}
+    return _liberar_lotes(filtro)
+
+
+def liberar_reservas_usuario(usuario_id):
+    # Al cerrar sesión: las piezas del usuario vuelven al stock aunque sus
+    # reservas no hayan vencido.
+    return _liberar_lotes({columna(Reserva, 'usuario'): usuario_id})
+
+
+def _liberar_lotes(filtro):
+    # Por lotes de LOTE_LIBERACION, una transacción cada uno.
+    liberadas = 0
+    productos = set()
+    while True:
+        cuantas, devolver = en_transaccion(_liberar, filtro)
+        liberadas += cuantas
+        productos.update(devolver)
+        if cuantas < LOTE_LIBERACION:
+            break
+
+    publicar_stocks(productos)
+    return liberadas
+
+
+def _reponer(sesion, ajustes):
+    if not ajustar_stock(ajustes, sesion):
+        raise ReservaFallida('Uno de los productos repuestos ya no existe')
+
+
+def reponer_stock(entradas):
+    # entradas: {producto_id: piezas que llegan} (compras a proveedores). Un
+    # $inc sobre el stock vigente, en Producto y en su ProductoListado.
+    ajustes = {producto_id: -piezas for producto_id, piezas in entradas.items() if piezas > 0}
+    if ajustes:
+        en_transaccion(_reponer, ajustes)
+        publicar_stocks(ajustes)
+
+# --- FIN: RESERVAS DE STOCK DURANTE EL CHECKOUT ---
@@ -0,0 +1,155 @@
+import atexit
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.contrib.sessions.models import Session
+from django.utils import timezone
+from pymongo import UpdateOne
+
+from .mongo import coleccion
+
+
+# --- INICIO: SESIONES EN LRU CON ESCRITURA DIFERIDA ---
+# SESSION_ENGINE = 'watches.sesiones_lru' (SESIONES_MOTOR = 'lru').
+# Las lecturas salen de un LRU en memoria; las escrituras se acumulan y un hilo
+# las vuelca a django_session en un bulk_write cada SESIONES_LRU_INTERVALO
+# segundos. Varias escrituras a la misma sesión entre volcados cuestan una.
+# La creación de sesiones sí va directo a MongoDB (necesita la llave única).
+# El LRU es del proceso: con varios workers usar SESIONES_MOTOR = 'cache'.
+
+
+class CacheSesiones:
+
+    def __init__(self):
+        self._entradas = OrderedDict()  # llave -> (session_data, expire_date)
+        self._pendientes = {}
+        self._candado = threading.Lock()
+        self._hilo = None
+        # Para benchmark_sesiones.
+        self.escrituras_bd = 0
+
+    def obtener(self, llave):
+        with self._candado:
+            entrada = self._entradas.get(llave)
+            if entrada is None:
+                # Desalojada del LRU pero aún sin volcar: lo pendiente es lo
+                # vigente, django_session todavía tiene la versión anterior.
+                entrada = self._pendientes.get(llave)
+                if entrada is None or entrada[1] <= timezone.now():
+                    return None
+                return entrada
+            if entrada[1] <= timezone.now():
+                del self._entradas[llave]
+                return None
+            self._entradas.move_to_end(llave)
+            return entrada
+
+    def guardar(self, llave, session_data, expire_date, pendiente=True):
+        with self._candado:
+            self._entradas[llave] = (session_data, expire_date)
+            self._entradas.move_to_end(llave)
+            if pendiente:
+                self._pendientes[llave] = (session_data, expire_date)
+            # Una sesión pendiente que sale del LRU se escribe igual en el volcado.
+            while len(self._entradas) > settings.SESIONES_LRU_MAX:
+                self._entradas.popitem(last=False)
+        if pendiente:
+            self._iniciar()
+
+    def quitar(self, llave):
+        with self._candado:
+            self._entradas.pop(llave, None)
+            self._pendientes.pop(llave, None)
+
+    def volcar(self):
+        with self._candado:
+            pendientes, self._pendientes = self._pendientes, {}
+        if not pendientes:
+            return 0
+
+        try:
+            coleccion(Session).bulk_write([
+                UpdateOne(
+                    {'_id': llave},
+                    {'$set': {'session_data': session_data, 'expire_date': expire_date}},
+                    upsert=True,
+                )
+                for llave, (session_data, expire_date) in pendientes.items()
+            ], ordered=False)
+        except Exception:
+            # Se reintenta en el siguiente volcado, salvo lo que ya se reescribió.
+            with self._candado:
+                for llave, valor in pendientes.items():
+                    self._pendientes.setdefault(llave, valor)
+            raise
+
+        self.escrituras_bd += len(pendientes)
+        return len(pendientes)
+
+    def _iniciar(self):
+        if self._hilo is not None:
+            return
+        with self._candado:
+            if self._hilo is not None:
+                return
+            self._hilo = threading.Thread(target=self._ciclo, name='sesiones-lru', daemon=True)
+            self._hilo.start()
+        atexit.register(self.volcar)
+
+    def _ciclo(self):
+        while True:
+            time.sleep(settings.SESIONES_LRU_INTERVALO)
+            try:
+                self.volcar()
+            except Exception:
+                pass
+
+
+cache_sesiones = CacheSesiones()
+
+
+class SessionStore(DBStore):
+
+    def _get_session_from_db(self):
+        sesion = super()._get_session_from_db()
+        if sesion is not None:
+            cache_sesiones.guardar(sesion.session_key, sesion.session_data, sesion.expire_date, pendiente=False)
+        return sesion
+
+    def load(self):
+        entrada = cache_sesiones.obtener(self.session_key) if self.session_key else None
+        if entrada is not None:
+            return self.decode(entrada[0])
+        return super().load()
+
+    def exists(self, session_key):
+        return cache_sesiones.obtener(session_key) is not None or super().exists(session_key)
+
+    def save(self, must_create=False):
+        if self.session_key is None or must_create:
+            super().save(must_create=must_create)
+            sesion = self.create_model_instance(self._get_session(no_load=must_create))
+            cache_sesiones.guardar(sesion.session_key, sesion.session_data, sesion.expire_date, pendiente=False)
+            return
+
+        sesion = self.create_model_instance(self._get_session())
+        entrada = cache_sesiones.obtener(sesion.session_key)
+        # Mismo contenido que lo ya escrito: solo se refresca la expiración en memoria.
+        pendiente = entrada is None or entrada[0] != sesion.session_data
+        cache_sesiones.guardar(sesion.session_key, sesion.session_data, sesion.expire_date, pendiente=pendiente)
+
+    def delete(self, session_key=None):
+        llave = session_key or self.session_key
+        if llave is not None:
+            cache_sesiones.quitar(llave)
+        super().delete(session_key)
+
+    @classmethod
+    def clear_expired(cls):
+        cache_sesiones.volcar()
+        super().clear_expired()
+
+# --- FIN: SESIONES EN LRU CON ESCRITURA DIFERIDA ---
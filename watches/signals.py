@@ -0,0 +1,266 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from proveedores.models import Proveedor
+from .models import (
+    Producto, Marca, Categoria, ImgProducto, Carrito, CarritoDocumento, DetalleCarrito, Favorito, Reserva,
+)
+from . import busqueda, sugerencias, listado
+from .cache_catalogo import incrementar_version_catalogo
+from .estado_usuario import invalidar_estado
+from .mongo import incrementar_contador
+from .carrito import fusionar_carrito_invitado
+from .carrito_invitado import extraer_invitado
+from .eventos import publicar_stock
+from .reservas import liberar_reservas_usuario, ReservaFallida
+
+
+# --- INICIO: BORRADOS EN LOTE ---
+# Borrar catálogo con un queryset (benchmarks.limpiar_catalogo) dispara los
+# receptores de post_delete por cada objeto: un incremento de contador y un
+# borrado de ProductoListado por producto. Dentro de borrado_en_lote() esos
+# receptores no hacen nada; al salir, los índices locales y la caché del
+# catálogo se invalidan una sola vez. El ProductoListado lo borra quien llama.
+
+_borrado_en_lote = ContextVar('borrado_en_lote', default=False)
+
+
+@contextmanager
+def borrado_en_lote():
+    token = _borrado_en_lote.set(True)
+    try:
+        yield
+    finally:
+        _borrado_en_lote.reset(token)
+        incrementar_contador(busqueda.CONTADOR_BUSQUEDA)
+        incrementar_contador(sugerencias.CONTADOR_SUGERENCIAS)
+        incrementar_version_catalogo()
+
+
+def _por_objeto(receptor):
+    @wraps(receptor)
+    def envoltura(*args, **kwargs):
+        if not _borrado_en_lote.get():
+            receptor(*args, **kwargs)
+    return envoltura
+
+# --- FIN: BORRADOS EN LOTE ---
+
+# --- INICIO: ÍNDICE DE BÚSQUEDA ---
+
+@receiver(pre_save, sender=Producto)
+def calcular_terminos_busqueda(sender, instance, **kwargs):
+    instance.busqueda = busqueda.terminos_producto(instance)
+
+
+@receiver(post_save, sender=Producto)
+def indexar_producto(sender, instance, **kwargs):
+    busqueda.actualizar_indice_local(instance.id, instance.busqueda)
+    busqueda.terminos_cambiados()
+
+
+@receiver(post_delete, sender=Producto)
+@_por_objeto
+def desindexar_producto(sender, instance, **kwargs):
+    busqueda.eliminar_de_indice_local(instance.id)
+    busqueda.terminos_cambiados()
+
+
+@receiver(post_save, sender=Marca)
+@receiver(post_save, sender=Categoria)
+def reindexar_productos_relacionados(sender, instance, created, **kwargs):
+    if created:
+        return
+
+    filtro = {'marca': instance} if sender is Marca else {'categoria': instance}
+    productos = list(Producto.objects.select_related('marca', 'categoria').filter(**filtro))
+    for producto in productos:
+        producto.busqueda = busqueda.terminos_producto(producto)
+        busqueda.actualizar_indice_local(producto.id, producto.busqueda)
+        sugerencias.actualizar_producto(producto)
+    Producto.objects.bulk_update(productos, ['busqueda'], batch_size=500)
+    if productos:
+        busqueda.terminos_cambiados()
+
+# --- FIN: ÍNDICE DE BÚSQUEDA ---
+
+# --- INICIO: ÍNDICE DE AUTOCOMPLETADO ---
+
+# Cada cambio incrementa el contador 'sugerencias' para que los demás
+# procesos reconstruyan su índice (watches/sugerencias.py).
+
+@receiver(post_save, sender=Producto)
+def sugerencias_producto(sender, instance, **kwargs):
+    sugerencias.actualizar_producto(instance)
+    sugerencias.sugerencias_cambiadas()
+
+
+@receiver(post_delete, sender=Producto)
+@_por_objeto
+def sugerencias_producto_eliminado(sender, instance, **kwargs):
+    sugerencias.eliminar_producto(instance.id)
+    sugerencias.sugerencias_cambiadas()
+
+
+@receiver(post_save, sender=Marca)
+def sugerencias_marca(sender, instance, **kwargs):
+    sugerencias.actualizar_marca(instance)
+    sugerencias.sugerencias_cambiadas()
+
+
+@receiver(post_delete, sender=Marca)
+@_por_objeto
+def sugerencias_marca_eliminada(sender, instance, **kwargs):
+    sugerencias.eliminar_marca(instance.id)
+    sugerencias.sugerencias_cambiadas()
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+@_por_objeto
+def sugerencias_material(sender, instance, **kwargs):
+    sugerencias.sincronizar_materiales()
+    sugerencias.sugerencias_cambiadas()
+
+# --- FIN: ÍNDICE DE AUTOCOMPLETADO ---
+
+# --- INICIO: MODELO DE LECTURA DE LOS LISTADOS ---
+# Va antes que la versión del catálogo: la caché del home se recalcula ya con
+# el listado actualizado.
+
+@receiver(post_save, sender=Producto)
+def listado_producto(sender, instance, update_fields=None, **kwargs):
+    listado.sincronizar_producto(instance, con_stock=update_fields is None or 'stock' in update_fields)
+
+
+@receiver(post_delete, sender=Producto)
+@_por_objeto
+def listado_producto_eliminado(sender, instance, **kwargs):
+    listado.eliminar_producto(instance.id)
+
+
+@receiver(post_save, sender=Marca)
+def listado_marca(sender, instance, created, **kwargs):
+    if not created:
+        listado.sincronizar_marca(instance)
+
+
+@receiver(post_save, sender=Categoria)
+def listado_categoria(sender, instance, created, **kwargs):
+    if not created:
+        listado.sincronizar_categoria(instance)
+
+
+@receiver(post_save, sender=ImgProducto)
+def listado_imagen(sender, instance, **kwargs):
+    listado.sincronizar_imagen(instance.producto_id, instance)
+
+
+@receiver(post_delete, sender=ImgProducto)
+@_por_objeto
+def listado_imagen_eliminada(sender, instance, **kwargs):
+    listado.sincronizar_imagen(instance.producto_id, None)
+
+# --- FIN: MODELO DE LECTURA DE LOS LISTADOS ---
+
+# --- INICIO: VERSIÓN DEL CATÁLOGO (CACHÉ DEL HOME) ---
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=Marca)
+@receiver(post_delete, sender=Marca)
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_save, sender=ImgProducto)
+@receiver(post_delete, sender=ImgProducto)
+@_por_objeto
+def invalidar_cache_catalogo(sender, **kwargs):
+    incrementar_version_catalogo()
+
+# --- FIN: VERSIÓN DEL CATÁLOGO (CACHÉ DEL HOME) ---
+
+# --- INICIO: ESTADO DEL USUARIO (CARRITO, ROLES, FAVORITOS) ---
+
+@receiver(post_save, sender=Carrito)
+@receiver(post_delete, sender=Carrito)
+@receiver(post_save, sender=CarritoDocumento)
+@receiver(post_delete, sender=CarritoDocumento)
+@receiver(post_save, sender=Favorito)
+@receiver(post_delete, sender=Favorito)
+def invalidar_estado_por_usuario(sender, instance, **kwargs):
+    invalidar_estado(instance.usuario_id)
+
+
+@receiver(post_save, sender=DetalleCarrito)
+@receiver(post_delete, sender=DetalleCarrito)
+def invalidar_estado_por_detalle(sender, instance, **kwargs):
+    usuario_id = Carrito.objects.filter(pk=instance.carrito_id).values_list('usuario_id', flat=True).first()
+    invalidar_estado(usuario_id)
+
+
+@receiver(post_save, sender=Proveedor)
+@receiver(post_delete, sender=Proveedor)
+def invalidar_estado_por_proveedor(sender, instance, **kwargs):
+    invalidar_estado(instance.user_id)
+
+
+@receiver(m2m_changed, sender=get_user_model().groups.through)
+def invalidar_estado_por_grupos(sender, instance, action, reverse, pk_set, **kwargs):
+    # En clear se invalida antes, mientras la relación todavía existe.
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        invalidar_estado(instance.pk)
+    else:
+        # group.user_set.add(...): instance es el grupo y pk_set trae usuarios.
+        for usuario_id in pk_set or instance.user_set.values_list('pk', flat=True):
+            invalidar_estado(usuario_id)
+
+# --- FIN: ESTADO DEL USUARIO (CARRITO, ROLES, FAVORITOS) ---
+
+# --- INICIO: CARRITO DE SESIÓN AL INICIAR SESIÓN ---
+
+@receiver(user_logged_in)
+def fusionar_carrito_al_iniciar_sesion(sender, request, user, **kwargs):
+    # login() conserva los datos de la sesión al rotar la llave (y la cookie
+    # del carrito no se toca): el carrito anónimo se vuelca al del usuario.
+    if request is None:
+        return
+    cantidades = extraer_invitado(request)
+    if cantidades:
+        fusionar_carrito_invitado(user.pk, cantidades)
+
+# --- FIN: CARRITO DE SESIÓN AL INICIAR SESIÓN ---
+
+# --- INICIO: RESERVAS AL CERRAR SESIÓN ---
+
+@receiver(user_logged_out)
+def liberar_reservas_al_cerrar_sesion(sender, request, user, **kwargs):
+    # Quien cierra sesión ya no va a pagar: sus piezas apartadas vuelven al
+    # stock sin esperar a que venzan. El exists() evita abrir una transacción
+    # para la mayoría, que no tiene nada apartado.
+    # Si la liberación falla, las reservas vencen y las devuelve el barrido.
+    if user is not None and Reserva.objects.filter(usuario_id=user.pk).exists():
+        try:
+            liberar_reservas_usuario(user.pk)
+        except ReservaFallida:
+            pass
+
+# --- FIN: RESERVAS AL CERRAR SESIÓN ---
+
+# --- INICIO: EVENTOS EN VIVO (STOCK) ---
+
+@receiver(post_save, sender=Producto)
+def publicar_stock_producto(sender, instance, update_fields=None, **kwargs):
+    # Solo lo reciben los flujos SSE que tienen el producto en su carrito. Un
+    # guardado sin 'stock' no lo cambió (y el de la instancia puede ser viejo).
+    if update_fields is None or 'stock' in update_fields:
+        publicar_stock(instance.id, instance.stock)
+
+# --- FIN: EVENTOS EN VIVO (STOCK) ---
@@ -0,0 +1,217 @@
+import bisect
+import threading
+
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from .busqueda import normalizar
+from .models import Producto, Marca, Categoria
+from .mongo import incrementar_contador, leer_contador
+
+
+# --- INICIO: ÍNDICE DE PREFIJOS PARA AUTOCOMPLETADO ---
+
+LIMITE_SUGERENCIAS = 8
+# Cuántas entradas del rango del prefijo se revisan como máximo antes de
+# ordenar; mantiene acotado el costo de prefijos de una sola letra.
+LIMITE_ESCANEO = 200
+
+PRIORIDAD = {
+    'marca': 0,
+    'producto': 1,
+    'material': 2,
+}
+
+
+class IndicePrefijos:
+    # Arreglo ordenado de (clave, prioridad, texto, detalle, tipo, ref) + bisect.
+    # Cada nombre se indexa también desde cada palabra ("oak" -> "Royal Oak").
+    # `version` es el valor del contador 'sugerencias' con el que se construyó.
+
+    def __init__(self, version=0):
+        self.version = version
+        self._lock = threading.Lock()
+        self._entradas = []
+        self._por_ref = {}
+
+    @staticmethod
+    def _claves(texto):
+        palabras = normalizar(texto).split()
+        return {' '.join(palabras[i:]) for i in range(len(palabras))}
+
+    def _entradas_de(self, tipo, ref, texto, detalle):
+        return [(clave, PRIORIDAD[tipo], texto, detalle, tipo, ref) for clave in self._claves(texto)]
+
+    def cargar(self, registros):
+        # Carga inicial: [(tipo, ref, texto, detalle)]. Se juntan todas las
+        # entradas y se ordenan una vez (insort por entrada sería O(n²)).
+        with self._lock:
+            for tipo, ref, texto, detalle in registros:
+                self._quitar(tipo, ref)
+                if texto:
+                    entradas = self._entradas_de(tipo, ref, texto, detalle)
+                    self._entradas.extend(entradas)
+                    self._por_ref[(tipo, ref)] = entradas
+            self._entradas.sort(key=lambda e: e[:3])
+
+    def poner(self, tipo, ref, texto, detalle=''):
+        with self._lock:
+            self._quitar(tipo, ref)
+            if not texto:
+                return
+            entradas = self._entradas_de(tipo, ref, texto, detalle)
+            for entrada in entradas:
+                bisect.insort(self._entradas, entrada, key=lambda e: e[:3])
+            self._por_ref[(tipo, ref)] = entradas
+
+    def quitar(self, tipo, ref):
+        with self._lock:
+            self._quitar(tipo, ref)
+
+    def refs(self, tipo):
+        with self._lock:
+            return {ref for t, ref in self._por_ref if t == tipo}
+
+    def _quitar(self, tipo, ref):
+        for entrada in self._por_ref.pop((tipo, ref), ()):
+            i = bisect.bisect_left(self._entradas, entrada[:3], key=lambda e: e[:3])
+            while i < len(self._entradas) and self._entradas[i][:3] == entrada[:3]:
+                if self._entradas[i] == entrada:
+                    del self._entradas[i]
+                    break
+                i += 1
+
+    def buscar(self, prefijo, limite=LIMITE_SUGERENCIAS):
+        prefijo = ' '.join(normalizar(prefijo).split())
+        if not prefijo:
+            return []
+
+        with self._lock:
+            i = bisect.bisect_left(self._entradas, prefijo, key=lambda e: e[0])
+            candidatos = []
+            while i < len(self._entradas) and len(candidatos) < LIMITE_ESCANEO:
+                entrada = self._entradas[i]
+                if not entrada[0].startswith(prefijo):
+                    break
+                candidatos.append(entrada)
+                i += 1
+
+        vistos = set()
+        resultado = []
+        for clave, prioridad, texto, detalle, tipo, ref in sorted(candidatos, key=lambda e: (e[1], len(e[2]), e[2])):
+            if (tipo, ref) in vistos:
+                continue
+            vistos.add((tipo, ref))
+            resultado.append({'tipo': tipo, 'ref': ref, 'texto': texto, 'detalle': detalle})
+            if len(resultado) >= limite:
+                break
+        return resultado
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+# El índice es de cada proceso. Los cambios que hace otro worker se notan por
+# el contador compartido 'sugerencias' (una lectura por consulta), como el
+# índice local de watches/busqueda.py: si no coincide, se reconstruye.
+CONTADOR_SUGERENCIAS = 'sugerencias'
+
+_indice = None
+_indice_lock = threading.Lock()
+
+
+def _materiales():
+    # {material normalizado: texto} de las categorías existentes.
+    materiales = {}
+    for material in Categoria.objects.values_list('material', flat=True).distinct():
+        if material:
+            materiales.setdefault(normalizar(material), material)
+    return materiales
+
+
+def construir_indice(version=0):
+    registros = [('marca', str(marca.id), marca.nombre, '') for marca in Marca.objects.all()]
+    registros += [('material', ref, material, '') for ref, material in _materiales().items()]
+    registros += [
+        ('producto', str(producto.id), producto.nombre, producto.marca.nombre)
+        for producto in Producto.objects.select_related('marca').filter(fecha_borrado__isnull=True)
+    ]
+    indice = IndicePrefijos(version)
+    indice.cargar(registros)
+    return indice
+
+
+def indice():
+    global _indice
+    version = leer_contador(CONTADOR_SUGERENCIAS)
+    if _indice is None or _indice.version != version:
+        with _indice_lock:
+            if _indice is None or _indice.version != version:
+                _indice = construir_indice(version)
+    return _indice
+
+
+def invalidar_indice():
+    global _indice
+    _indice = None
+
+
+# Las actualizaciones incrementales solo aplican si el índice ya se construyó.
+
+def actualizar_producto(producto):
+    if _indice is None:
+        return
+    if producto.fecha_borrado:
+        _indice.quitar('producto', str(producto.id))
+    else:
+        _indice.poner('producto', str(producto.id), producto.nombre, producto.marca.nombre)
+
+
+def eliminar_producto(producto_id):
+    if _indice is not None:
+        _indice.quitar('producto', str(producto_id))
+
+
+def actualizar_marca(marca):
+    if _indice is not None:
+        _indice.poner('marca', str(marca.id), marca.nombre)
+
+
+def eliminar_marca(marca_id):
+    if _indice is not None:
+        _indice.quitar('marca', str(marca_id))
+
+
+def sincronizar_materiales():
+    # Tras guardar o borrar una Categoria: un material renombrado o sin
+    # categorías deja de sugerirse. Es un distinct sobre pocas categorías.
+    if _indice is None:
+        return
+    materiales = _materiales()
+    for ref in _indice.refs('material') - set(materiales):
+        _indice.quitar('material', ref)
+    for ref, material in materiales.items():
+        _indice.poner('material', ref, material)
+
+
+def sugerencias_cambiadas():
+    # Después de aplicar un cambio al índice de este proceso. Si nadie más
+    # cambió sugerencias desde su construcción, queda al día con la versión
+    # nueva; si no, se reconstruye en la siguiente consulta.
+    version = incrementar_contador(CONTADOR_SUGERENCIAS)
+    actual = _indice
+    if actual is not None and actual.version == version - 1:
+        actual.version = version
+
+
+def sugerir(prefijo, limite=LIMITE_SUGERENCIAS):
+    sugerencias = []
+    for s in indice().buscar(prefijo, limite):
+        if s['tipo'] == 'producto':
+            url = reverse('product_detail', kwargs={'producto_id': s['ref']})
+        else:
+            url = f"{reverse('catalog')}?{urlencode({'q': s['texto']})}"
+        sugerencias.append({'texto': s['texto'], 'detalle': s['detalle'], 'tipo': s['tipo'], 'url': url})
+    return sugerencias
+
+# --- FIN: ÍNDICE DE PREFIJOS PARA AUTOCOMPLETADO ---
@@ -0,0 +1,259 @@
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from bson import ObjectId
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import connection
+from django.utils import timezone
+from pymongo import ReturnDocument
+
+from .models import Envio, Pago, Pedido, Tarea
+from .mongo import coleccion
+from .reservas import liberar_reservas
+
+
+# --- INICIO: COLA DE TAREAS CON BANDEJA DE SALIDA EN MONGODB ---
+# Los pasos que no necesita la respuesta del checkout (hoy, el correo de
+# confirmación) se encolan como documentos Tarea dentro de la transacción del pedido
+# (mongo.en_transaccion): si el pedido hace commit las tareas existen, si no,
+# tampoco. Un manejador corre en cualquier proceso (hilos del servidor o
+# run_workers), así que no debe depender de estado en memoria del proceso web
+# como el broker de eventos SSE.
+# Los trabajadores las toman con un find_one_and_update (una sola a la vez por
+# documento) que además las bloquea BLOQUEO_TAREA; si un trabajador muere a
+# medias, la tarea vuelve a estar disponible al vencer el bloqueo. Por eso
+# los manejadores deben poder repetirse sin duplicar efectos.
+#
+# Trabajadores: procesos `manage.py run_workers`. settings.TAREAS_HILOS (0 por
+# omisión) arranca además hilos dentro de cada proceso web con el primer
+# pedido; solo para desarrollo, porque con varios workers de gunicorn/uvicorn
+# cada uno levanta su propio pool.
+# Entre tarea y tarea, cada pool barre además las reservas de checkout
+# vencidas cada settings.RESERVAS_BARRIDO segundos (watches/reservas.py).
+
+MAX_INTENTOS_TAREA = 6
+ESPERA_BASE_TAREA = 5  # segundos: 5, 10, 20, 40, 80
+BLOQUEO_TAREA = timedelta(minutes=5)
+
+_manejadores = {}
+
+
+class Reintentar(Exception):
+    # Un manejador que aún no puede correr (p. ej. falta un paso previo).
+    pass
+
+
+def manejador(tipo):
+    def registrar(funcion):
+        _manejadores[tipo] = funcion
+        return funcion
+    return registrar
+
+
+def encolar(tareas, sesion=None):
+    # tareas: [(tipo, datos)]; datos debe ser serializable a JSON.
+    ahora = timezone.now()
+    coleccion(Tarea).insert_many([
+        {
+            'tipo': tipo, 'datos': datos, 'estado': 'pendiente', 'intentos': 0,
+            'disponible_en': ahora, 'fecha_creacion': ahora, 'fecha_fin': None, 'error': '',
+        }
+        for tipo, datos in tareas
+    ], session=sesion)
+
+
+def tomar_tarea():
+    ahora = timezone.now()
+    return coleccion(Tarea).find_one_and_update(
+        {'estado': {'$in': ['pendiente', 'en_proceso']}, 'disponible_en': {'$lte': ahora}},
+        {'$set': {'estado': 'en_proceso', 'disponible_en': ahora + BLOQUEO_TAREA}, '$inc': {'intentos': 1}},
+        sort=[('disponible_en', 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def ejecutar_tarea(tarea):
+    # True si terminó; si falla se reprograma con espera exponencial o, sin
+    # intentos restantes, queda 'fallida' para revisarla (run_workers --estado).
+    tareas = coleccion(Tarea)
+    # Solo el dueño actual del bloqueo la cierra.
+    filtro = {'_id': tarea['_id'], 'intentos': tarea['intentos']}
+    try:
+        _manejadores[tarea['tipo']](**tarea['datos'])
+    except Exception as error:
+        ahora = timezone.now()
+        if tarea['intentos'] >= MAX_INTENTOS_TAREA:
+            cambios = {'estado': 'fallida', 'fecha_fin': ahora}
+        else:
+            espera = timedelta(seconds=ESPERA_BASE_TAREA * 2 ** (tarea['intentos'] - 1))
+            cambios = {'estado': 'pendiente', 'disponible_en': ahora + espera}
+        detalle = str(error) if isinstance(error, Reintentar) else traceback.format_exc()
+        tareas.update_one(filtro, {'$set': {**cambios, 'error': detalle}})
+        return False
+
+    tareas.update_one(filtro, {'$set': {'estado': 'hecha', 'fecha_fin': timezone.now(), 'error': ''}})
+    return True
+
+
+class PoolTrabajadores:
+
+    def __init__(self):
+        self._hilos = []
+        self._candado = threading.Lock()
+        self._aviso = threading.Event()
+        self._detener = threading.Event()
+        self._proximo_barrido = 0
+        # Para run_workers.
+        self.hechas = 0
+        self.fallos = 0
+
+    def iniciar(self, hilos):
+        with self._candado:
+            if self._hilos:
+                return
+            self._detener.clear()
+            self._hilos = [
+                threading.Thread(target=self._ciclo, name=f'tareas-{i}', daemon=True)
+                for i in range(hilos)
+            ]
+            for hilo in self._hilos:
+                hilo.start()
+
+    def despertar(self):
+        self._aviso.set()
+
+    def detener(self):
+        self._detener.set()
+        self._aviso.set()
+        for hilo in self._hilos:
+            hilo.join()
+        self._hilos = []
+
+    def _barrer_reservas(self):
+        # Un solo hilo del pool por turno; varios procesos barriendo a la vez
+        # solo chocan en WriteConflict, que en_transaccion reintenta.
+        if not settings.RESERVAS_BARRIDO:
+            return
+        with self._candado:
+            if time.monotonic() < self._proximo_barrido:
+                return
+            self._proximo_barrido = time.monotonic() + settings.RESERVAS_BARRIDO
+        try:
+            liberar_reservas()
+        except Exception:
+            traceback.print_exc()
+
+    def _ciclo(self):
+        try:
+            while not self._detener.is_set():
+                self._barrer_reservas()
+                try:
+                    tarea = tomar_tarea()
+                except Exception:
+                    tarea = None
+                if tarea is None:
+                    self._aviso.wait(settings.TAREAS_INTERVALO)
+                    self._aviso.clear()
+                    continue
+                terminada = ejecutar_tarea(tarea)
+                with self._candado:
+                    if terminada:
+                        self.hechas += 1
+                    else:
+                        self.fallos += 1
+        finally:
+            connection.close()
+
+
+pool = PoolTrabajadores()
+
+
+def iniciar_trabajadores():
+    # Arranca los hilos del proceso web si están configurados (idempotente).
+    # Solo lo llama despertar_trabajadores; el checkout no arranca hilos, el
+    # barrido de reservas lo hacen run_workers o liberar_reservas.
+    if settings.TAREAS_HILOS:
+        pool.iniciar(settings.TAREAS_HILOS)
+
+
+def despertar_trabajadores():
+    # Tras el commit que encoló tareas: les avisa a los hilos para no esperar
+    # al siguiente sondeo.
+    iniciar_trabajadores()
+    pool.despertar()
+
+# --- FIN: COLA DE TAREAS CON BANDEJA DE SALIDA EN MONGODB ---
+
+# --- INICIO: TAREAS DEL PEDIDO ---
+
+DIAS_ENTREGA = 5  # días hábiles
+
+
+def dias_habiles_despues(fecha, dias):
+    while dias:
+        fecha += timedelta(days=1)
+        if fecha.weekday() < 5:
+            dias -= 1
+    return fecha
+
+
+# 'pedido.envio' y 'pedido.pago' ya no se encolan (el pedido crea Envio y
+# Pago en su transacción); siguen registrados para las tareas que quedaron
+# pendientes de antes.
+
+@manejador('pedido.envio')
+def crear_envio(pedido_id, domicilio_id):
+    pedido = Pedido.objects.get(pk=pedido_id)
+    if pedido.envio_id is not None:
+        return
+
+    fecha_envio = dias_habiles_despues(pedido.fecha, 1)
+    envio = Envio.objects.create(
+        domicilio_id=ObjectId(domicilio_id),
+        fecha_envio=fecha_envio,
+        fecha_llegada=dias_habiles_despues(fecha_envio, DIAS_ENTREGA)
+    )
+    # Si otro intento ya lo asignó, este envío sobra.
+    if not Pedido.objects.filter(pk=pedido.pk, envio__isnull=True).update(envio=envio):
+        envio.delete()
+
+
+@manejador('pedido.pago')
+def registrar_pago(pedido_id, metodo_pago, monto):
+    pedido = Pedido.objects.get(pk=pedido_id)
+    pago, _ = Pago.objects.get_or_create(
+        pedido=pedido,
+        defaults={
+            'metodo_pago': metodo_pago,
+            'monto_pagar': monto,
+            'estado': 'aprobado',
+            'fecha_pago': timezone.now(),
+        }
+    )
+    Pedido.objects.filter(pk=pedido.pk).update(metodo_pago=pago.metodo_pago)
+
+
+@manejador('pedido.correo')
+def enviar_confirmacion(pedido_id):
+    pedido = Pedido.objects.select_related('usuario', 'envio').get(pk=pedido_id)
+    if pedido.envio is None:
+        raise Reintentar('El envío del pedido aún no se calcula')
+
+    # Desde el resumen embebido del pedido, sin DetallesPedido ni Producto.
+    renglones = '\n'.join(
+        f"  {linea.cantidad} x {linea.nombre}  ${linea.precio_unitario:,.2f}"
+        for linea in pedido.lineas
+    )
+    send_mail(
+        f'ChronosLux: confirmación de tu pedido #{pedido.id}',
+        f"Gracias por tu compra.\n\n{renglones}\n\n"
+        f"Total: ${pedido.total_pagar:,.2f}\n"
+        f"Llegada estimada: {timezone.localtime(pedido.envio.fecha_llegada):%d/%m/%Y}\n",
+        None,
+        [pedido.usuario.email],
+    )
+
+# --- FIN: TAREAS DEL PEDIDO ---
@@ -0,0 +1,1337 @@
+import asyncio
+import json
+import threading
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from bson import ObjectId
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.messages import get_messages
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
+from django.db.models import Q
+from django.test import SimpleTestCase, TestCase, override_settings, skipUnlessDBFeature
+from django.urls import reverse
+from django.utils import timezone
+
+from . import busqueda, sugerencias
+from .benchmarks import limpiar_catalogo, sembrar_catalogo
+from .cache_catalogo import incrementar_version_catalogo, obtener_fragmento, version_catalogo
+from .carrito import (
+    agregar_al_carrito, aplicar_lote, cambiar_cantidad, contenido_carrito, expirar_carritos, lineas_carrito,
+    normalizar_lote, fusionar_carrito_invitado, quitar_del_carrito, version_carrito, MAX_OPERACIONES_LOTE,
+    VIGENCIA_CARRITO,
+)
+from .carrito_invitado import COOKIE_CARRITO, InvitadoCookie, MAX_RENGLONES_COOKIE
+from .catalogo import aplicar_filtros, condiciones_filtros, leer_filtros, ordenamiento, RANGOS_PRECIO_CATALOGO
+from .compras import filtros_compras, pagina_compras
+from .estado_usuario import cargar_estado, clave_estado
+from .eventos import Broker, canal_producto, canal_usuario, MAX_EVENTOS_EN_COLA
+from .facetas import contar_facetas
+from .models import (
+    BarridoCarritos, Carrito, CarritoDocumento, Categoria, ClavePedido, DetalleCarrito, DetallesPedido, Domicilio,
+    Envio, ImgProducto, Marca, Pago, Pedido, Producto, ProductoListado, Reserva, Tarea,
+)
+from .mongo import coleccion, incrementar_contador, leer_contador
+from .paginacion import ADELANTE, codificar_cursor, decodificar_cursor, paginar, paginar_lista
+from .pedidos import colocar_pedido, nueva_clave_pedido, pedido_por_clave, PedidoRepetido, StockInsuficiente
+from .reservas import liberar_reservas, reponer_stock, reservar_lineas, ReservaFallida, VIGENCIA_RESERVA
+from .sesiones_lru import CacheSesiones, SessionStore as SesionLru
+from .sugerencias import IndicePrefijos
+from .tareas import (
+    encolar, ejecutar_tarea, manejador, tomar_tarea, Reintentar, ESPERA_BASE_TAREA, MAX_INTENTOS_TAREA,
+)
+
+
+# Las pruebas corren contra el MongoDB de settings.DATABASES (base de datos
+# test_<nombre>). Las que usan transacciones se omiten si no es replica set.
+
+def crear_producto(nombre, stock, precio='1000.00'):
+    marca, _ = Marca.objects.get_or_create(nombre='Rolex')
+    categoria, _ = Categoria.objects.get_or_create(genero='Hombre', material='Acero', tipo='Clasico')
+    return Producto.objects.create(
+        nombre=nombre, precio=Decimal(precio), stock=stock, marca=marca, categoria=categoria,
+    )
+
+
+def linea(producto, cantidad):
+    # Formato de carrito.lineas_carrito.
+    return {
+        'producto_id': producto.pk, 'nombre': producto.nombre, 'marca': producto.marca.nombre,
+        'imagen': '', 'cantidad': cantidad, 'precio_unitario': producto.precio,
+        'subtotal': producto.precio * cantidad,
+    }
+
+
+def stock(producto):
+    return Producto.objects.get(pk=producto.pk).stock, ProductoListado.objects.get(pk=producto.pk).stock
+
+
+class ConClienteMixin:
+
+    def setUp(self):
+        self.usuario = get_user_model().objects.create_user(
+            username='cliente', email='cliente@chronoslux.test', password='secreta123',
+        )
+        self.domicilio = Domicilio.objects.create(
+            usuario=self.usuario, calle='Reforma', num_ext='1', colonia='Centro',
+            estado='CDMX', cp='06000', pais='México',
+        )
+
+
+# --- INICIO: PRUEBAS DE LA PAGINACIÓN POR CURSOR ---
+
+class CursorTests(SimpleTestCase):
+
+    def test_ida_y_vuelta(self):
+        oid = ObjectId()
+        token = codificar_cursor(ADELANTE, ['1500.00', oid])
+        self.assertEqual(decodificar_cursor(token), (ADELANTE, ['1500.00', str(oid)]))
+
+    def test_cursor_invalido(self):
+        for token in ('', 'no-es-base64!', codificar_cursor('x', [1])):
+            with self.subTest(token=token):
+                self.assertIsNone(decodificar_cursor(token))
+
+    def test_paginar_lista(self):
+        ids = list(range(5))
+        pagina, siguiente, anterior = paginar_lista(ids, tamano=2)
+        self.assertEqual((pagina, anterior), ([0, 1], None))
+        pagina, siguiente, anterior = paginar_lista(ids, siguiente, tamano=2)
+        self.assertEqual(pagina, [2, 3])
+        self.assertEqual(paginar_lista(ids, anterior, tamano=2)[0], [0, 1])
+
+
+class PaginarTests(TestCase):
+
+    def setUp(self):
+        # Dos pares con el mismo precio: el _id desempata.
+        for nombre, precio in (('A', '300.00'), ('B', '100.00'), ('C', '200.00'), ('D', '100.00'), ('E', '300.00')):
+            crear_producto(nombre, stock=1, precio=precio)
+        self.orden = ('precio', 'id')
+        self.esperado = list(ProductoListado.objects.order_by(*self.orden).values_list('nombre', flat=True))
+
+    def nombres(self, pagina):
+        return [p.nombre for p in pagina]
+
+    def test_recorre_todas_las_paginas_sin_repetir(self):
+        vistos, cursor = [], None
+        while True:
+            pagina = paginar(ProductoListado.objects.all(), self.orden, cursor, tamano=2)
+            vistos += self.nombres(pagina)
+            if not pagina.has_next:
+                break
+            cursor = pagina.next_cursor
+
+        self.assertEqual(vistos, self.esperado)
+
+    def test_regresar_a_la_pagina_anterior(self):
+        primera = paginar(ProductoListado.objects.all(), self.orden, tamano=2)
+        segunda = paginar(ProductoListado.objects.all(), self.orden, primera.next_cursor, tamano=2)
+        de_vuelta = paginar(ProductoListado.objects.all(), self.orden, segunda.previous_cursor, tamano=2)
+
+        self.assertFalse(primera.has_previous)
+        self.assertEqual(self.nombres(segunda), self.esperado[2:4])
+        self.assertEqual(self.nombres(de_vuelta), self.esperado[:2])
+        self.assertTrue(de_vuelta.has_next)
+
+    def test_orden_descendente(self):
+        orden = ('-precio', '-id')
+        primera = paginar(ProductoListado.objects.all(), orden, tamano=3)
+        segunda = paginar(ProductoListado.objects.all(), orden, primera.next_cursor, tamano=3)
+
+        esperado = list(ProductoListado.objects.order_by(*orden).values_list('nombre', flat=True))
+        self.assertEqual(self.nombres(primera) + self.nombres(segunda), esperado)
+
+    def test_cursor_de_otro_orden_regresa_la_primera_pagina(self):
+        cursor = codificar_cursor(ADELANTE, ['solo-un-valor'])
+        pagina = paginar(ProductoListado.objects.all(), self.orden, cursor, tamano=2)
+        self.assertEqual(self.nombres(pagina), self.esperado[:2])
+
+
+# --- FIN: PRUEBAS DE LA PAGINACIÓN POR CURSOR ---
+
+# --- INICIO: PRUEBAS DEL HISTORIAL DE COMPRAS ---
+
+class FiltrosComprasTests(SimpleTestCase):
+
+    def test_ignora_lo_que_no_entiende(self):
+        filtros = filtros_compras({'desde': '2026-13-01', 'hasta': '2026-10-18', 'metodo': 'efectivo'})
+
+        self.assertEqual(filtros, {'desde': None, 'hasta': date(2026, 10, 18), 'metodo': None})
+
+
+class PaginaComprasTests(ConClienteMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Cinco pedidos, un día más viejo cada uno; el segundo y el tercero
+        # comparten fecha: el _id desempata.
+        ahora = timezone.now().replace(microsecond=0)
+        fechas = [ahora, ahora - timedelta(days=1), ahora - timedelta(days=1),
+                  ahora - timedelta(days=3), ahora - timedelta(days=4)]
+        metodos = ['paypal', 'tarjeta_credito', 'paypal', 'tarjeta_debito', 'paypal']
+        for fecha, metodo in zip(fechas, metodos):
+            pedido = Pedido.objects.create(
+                usuario=self.usuario, fecha=fecha, subtotal=Decimal('100.00'), total_pagar=Decimal('100.00'),
+                metodo_pago=metodo,
+            )
+            Pago.objects.create(pedido=pedido, metodo_pago=metodo, monto_pagar=pedido.total_pagar)
+        self.esperado = list(Pedido.objects.order_by('-fecha', '-id').values_list('pk', flat=True))
+        self.sin_filtros = filtros_compras({})
+
+    def ids(self, compras):
+        return [compra['id'] for compra in compras]
+
+    def test_recorre_adelante_y_regresa(self):
+        primera, pagina1 = pagina_compras(self.sin_filtros, tamano=2)
+        segunda, pagina2 = pagina_compras(self.sin_filtros, pagina1.next_cursor, tamano=2)
+        tercera, pagina3 = pagina_compras(self.sin_filtros, pagina2.next_cursor, tamano=2)
+
+        self.assertEqual(self.ids(primera) + self.ids(segunda) + self.ids(tercera), self.esperado)
+        self.assertFalse(pagina1.has_previous)
+        self.assertTrue(pagina2.has_previous and pagina2.has_next)
+        self.assertFalse(pagina3.has_next)
+        self.assertTrue(pagina3.has_previous)
+
+        de_vuelta, pagina = pagina_compras(self.sin_filtros, pagina3.previous_cursor, tamano=2)
+        self.assertEqual(self.ids(de_vuelta), self.esperado[2:4])
+        self.assertTrue(pagina.has_next and pagina.has_previous)
+
+        inicio, pagina = pagina_compras(self.sin_filtros, pagina.previous_cursor, tamano=2)
+        self.assertEqual(self.ids(inicio), self.esperado[:2])
+        self.assertFalse(pagina.has_previous)
+        self.assertTrue(pagina.has_next)
+
+    def test_pagina_exacta_no_ofrece_siguiente(self):
+        # Con tamano + 1 documentos de sobra se sabe si hay más: una última
+        # página llena no debe dejar un "siguiente" vacío.
+        primera, pagina1 = pagina_compras(self.sin_filtros, tamano=5)
+
+        self.assertEqual(self.ids(primera), self.esperado)
+        self.assertFalse(pagina1.has_next)
+
+        _, pagina1 = pagina_compras(self.sin_filtros, tamano=4)
+        ultima, pagina2 = pagina_compras(self.sin_filtros, pagina1.next_cursor, tamano=4)
+        self.assertEqual(self.ids(ultima), self.esperado[4:])
+        self.assertFalse(pagina2.has_next)
+
+    def test_filtro_de_metodo_de_pago(self):
+        filtros = filtros_compras({'metodo': 'paypal'})
+        primera, pagina1 = pagina_compras(filtros, tamano=2)
+        segunda, pagina2 = pagina_compras(filtros, pagina1.next_cursor, tamano=2)
+
+        paypal = list(Pedido.objects.filter(metodo_pago='paypal').order_by('-fecha', '-id').values_list('pk', flat=True))
+        self.assertEqual(self.ids(primera) + self.ids(segunda), paypal)
+        self.assertEqual({compra['metodo_pago'] for compra in primera + segunda}, {'PayPal'})
+        self.assertFalse(pagina2.has_next)
+
+    def test_filtro_de_fechas(self):
+        hoy = timezone.localdate(Pedido.objects.get(pk=self.esperado[0]).fecha)
+        filtros = filtros_compras({
+            'desde': (hoy - timedelta(days=3)).isoformat(), 'hasta': (hoy - timedelta(days=1)).isoformat(),
+        })
+
+        compras, pagina = pagina_compras(filtros, tamano=10)
+
+        self.assertEqual(self.ids(compras), self.esperado[1:4])
+        self.assertFalse(pagina.has_other_pages)
+
+    def test_vista_del_administrador(self):
+        self.usuario.is_staff = True
+        self.usuario.save()
+        self.client.force_login(self.usuario)
+
+        respuesta = self.client.get(reverse('gestionar_compras'), {'metodo': 'tarjeta_debito'})
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(self.ids(respuesta.context['compras']), self.esperado[3:4])
+        self.assertContains(respuesta, 'Tarjeta de Débito')
+
+# --- FIN: PRUEBAS DEL HISTORIAL DE COMPRAS ---
+
+# --- INICIO: PRUEBAS DEL SERVICIO DEL CARRITO ---
+
+@override_settings(CARRITO_ALMACENAMIENTO='colecciones')
+class CarritoColeccionesTests(ConClienteMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.reloj = ProductoListado.objects.get(pk=crear_producto('Submariner', stock=5).pk)
+        self.otro = ProductoListado.objects.get(pk=crear_producto('Datejust', stock=5, precio='250.50').pk)
+
+    def assertTotalesGuardados(self, respuesta):
+        # Los totales de la respuesta salen del documento del carrito
+        # (Carrito.total_items/total_price); deben coincidir con los renglones.
+        contenido = contenido_carrito(self.usuario.pk)
+        self.assertEqual(respuesta['total_items'], contenido['total_items'])
+        self.assertAlmostEqual(respuesta['total_price'], contenido['total_price'])
+
+    def test_agregar_suma_al_renglon_existente(self):
+        agregar_al_carrito(self.usuario.pk, self.reloj, 1)
+        respuesta = agregar_al_carrito(self.usuario.pk, self.reloj, 2)
+
+        self.assertEqual(respuesta['total_items'], 3)
+        self.assertEqual(respuesta['total_price'], 3000.0)
+        self.assertEqual(respuesta['line']['quantity'], 3)
+        self.assertTotalesGuardados(respuesta)
+
+    def test_cambiar_cantidad(self):
+        agregar_al_carrito(self.usuario.pk, self.reloj, 2)
+        agregar_al_carrito(self.usuario.pk, self.otro, 1)
+
+        respuesta = cambiar_cantidad(self.usuario.pk, self.reloj.pk, 'increase')
+        self.assertEqual(respuesta['total_items'], 4)
+        respuesta = cambiar_cantidad(self.usuario.pk, self.reloj.pk, 'manual', 5)
+        self.assertEqual(respuesta['total_items'], 6)
+        self.assertEqual(respuesta['total_price'], 5250.5)
+        self.assertTotalesGuardados(respuesta)
+
+    def test_bajar_a_cero_quita_el_renglon(self):
+        agregar_al_carrito(self.usuario.pk, self.reloj, 1)
+        agregar_al_carrito(self.usuario.pk, self.otro, 1)
+
+        respuesta = cambiar_cantidad(self.usuario.pk, self.reloj.pk, 'decrease')
+
+        self.assertIsNone(respuesta['line'])
+        self.assertEqual(respuesta['total_items'], 1)
+        self.assertFalse(DetalleCarrito.objects.filter(producto_id=self.reloj.pk).exists())
+        self.assertTotalesGuardados(respuesta)
+
+    def test_quitar(self):
+        agregar_al_carrito(self.usuario.pk, self.reloj, 2)
+
+        respuesta = quitar_del_carrito(self.usuario.pk, self.reloj.pk)
+
+        self.assertEqual((respuesta['total_items'], respuesta['total_price']), (0, 0.0))
+        self.assertEqual(lineas_carrito(self.usuario.pk)[1], [])
+
+    def test_cambiar_renglon_inexistente(self):
+        agregar_al_carrito(self.usuario.pk, self.otro, 1)
+        with self.assertRaises(DetalleCarrito.DoesNotExist):
+            cambiar_cantidad(self.usuario.pk, self.reloj.pk, 'increase')
+        with self.assertRaises(DetalleCarrito.DoesNotExist):
+            cambiar_cantidad(self.usuario.pk, self.reloj.pk, 'manual', 0)
+
+    def test_cada_mutacion_cambia_la_version(self):
+        self.assertEqual(version_carrito(self.usuario.pk), 'vacio')
+        agregar_al_carrito(self.usuario.pk, self.reloj, 1)
+        primera = version_carrito(self.usuario.pk)
+        cambiar_cantidad(self.usuario.pk, self.reloj.pk, 'increase')
+        self.assertNotEqual(version_carrito(self.usuario.pk), primera)
+
+    def test_lote(self):
+        agregar_al_carrito(self.usuario.pk, self.reloj, 1)
+        antes = version_carrito(self.usuario.pk)
+
+        respuesta = aplicar_lote(self.usuario.pk, normalizar_lote([
+            {'op': 'inc', 'id': str(self.reloj.pk), 'quantity': 2},
+            {'op': 'add', 'id': str(self.otro.pk), 'quantity': 2},
+            {'op': 'dec', 'id': str(self.otro.pk)},
+        ]))
+
+        self.assertEqual(respuesta['total_items'], 4)
+        self.assertEqual(respuesta['total_price'], 3250.5)
+        self.assertNotEqual(respuesta['version'], antes)
+        self.assertTotalesGuardados(respuesta)
+
+    def test_lote_invalido(self):
+        for operaciones in ([], [{'op': 'vaciar', 'id': str(self.reloj.pk)}], [{'op': 'add', 'id': 'x'}],
+                            [{'op': 'set', 'id': str(self.reloj.pk), 'quantity': -1}]):
+            with self.subTest(operaciones=operaciones), self.assertRaises(ValueError):
+                normalizar_lote(operaciones)
+
+
+@override_settings(CARRITO_ALMACENAMIENTO='embebido')
+class CarritoEmbebidoTests(CarritoColeccionesTests):
+    # Las mismas pruebas contra el CarritoDocumento.
+
+    def test_bajar_a_cero_quita_el_renglon(self):
+        agregar_al_carrito(self.usuario.pk, self.reloj, 1)
+        agregar_al_carrito(self.usuario.pk, self.otro, 1)
+
+        respuesta = cambiar_cantidad(self.usuario.pk, self.reloj.pk, 'decrease')
+
+        self.assertIsNone(respuesta['line'])
+        self.assertEqual([l['producto_id'] for l in lineas_carrito(self.usuario.pk)[1]], [self.otro.pk])
+
+
+@override_settings(CARRITO_ALMACENAMIENTO='colecciones')
+class ApiCarritoTests(ConClienteMixin, TestCase):
+    # /api/carrito/: ETag con la versión del carrito, 304 y el modo ?since.
+
+    def setUp(self):
+        super().setUp()
+        self.reloj = ProductoListado.objects.get(pk=crear_producto('Submariner', stock=5).pk)
+        self.url = reverse('get_cart_data')
+
+    def test_etag_y_304_con_la_version_vigente(self):
+        agregar_al_carrito(self.usuario.pk, self.reloj, 1)
+        self.client.force_login(self.usuario)
+
+        respuesta = self.client.get(self.url)
+        etag = respuesta['ETag']
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(etag, f'"{version_carrito(self.usuario.pk)}"')
+        self.assertEqual(respuesta.json()['total_items'], 1)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_cambio_del_carrito_invalida_el_etag(self):
+        agregar_al_carrito(self.usuario.pk, self.reloj, 1)
+        self.client.force_login(self.usuario)
+        etag = self.client.get(self.url)['ETag']
+
+        agregar_al_carrito(self.usuario.pk, self.reloj, 1)
+        respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+        self.assertEqual(respuesta.json()['total_items'], 2)
+        self.assertTrue(respuesta.json()['changed'])
+
+    def test_since_con_la_version_vigente(self):
+        agregar_al_carrito(self.usuario.pk, self.reloj, 1)
+        self.client.force_login(self.usuario)
+        version = self.client.get(self.url).json()['version']
+
+        sin_cambios = self.client.get(self.url, {'since': version}).json()
+        agregar_al_carrito(self.usuario.pk, self.reloj, 1)
+        con_cambios = self.client.get(self.url, {'since': version}).json()
+
+        self.assertEqual(sin_cambios, {'version': version, 'changed': False})
+        self.assertTrue(con_cambios['changed'])
+        self.assertNotEqual(con_cambios['version'], version)
+        self.assertEqual(con_cambios['total_items'], 2)
+
+    def test_since_del_visitante(self):
+        self.client.post(
+            reverse('cart_batch'),
+            json.dumps({'operations': [{'op': 'add', 'id': str(self.reloj.pk), 'quantity': 1}]}),
+            content_type='application/json',
+        )
+        version = self.client.get(self.url).json()['version']
+
+        self.assertEqual(self.client.get(self.url, {'since': version}).json(), {'version': version, 'changed': False})
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=f'"{version}"').status_code, 304)
+
+
+# --- FIN: PRUEBAS DEL SERVICIO DEL CARRITO ---
+
+# --- INICIO: PRUEBAS DEL CARRITO DE VISITANTES AL INICIAR SESIÓN ---
+
+@override_settings(CARRITO_ALMACENAMIENTO='colecciones', CARRITO_INVITADO='sesion')
+class FusionCarritoInvitadoTests(ConClienteMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.reloj = ProductoListado.objects.get(pk=crear_producto('Submariner', stock=5).pk)
+        self.otro = ProductoListado.objects.get(pk=crear_producto('Datejust', stock=5, precio='250.50').pk)
+
+    def cantidades(self):
+        return {l['producto_id']: l['cantidad'] for l in lineas_carrito(self.usuario.pk)[1]}
+
+    def agregar_como_visitante(self, producto, cantidad):
+        respuesta = self.client.post(
+            reverse('cart_batch'),
+            json.dumps({'operations': [{'op': 'add', 'id': str(producto.pk), 'quantity': cantidad}]}),
+            content_type='application/json',
+        )
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_suma_cantidades_y_descarta_lo_invalido(self):
+        agregar_al_carrito(self.usuario.pk, self.reloj, 1)
+
+        fusionados = fusionar_carrito_invitado(self.usuario.pk, {
+            str(self.reloj.pk): 2, str(self.otro.pk): '1',
+            str(ObjectId()): 1, 'no-es-id': 1, str(ObjectId()): 'x',
+        })
+
+        self.assertEqual(fusionados, 2)
+        self.assertEqual(self.cantidades(), {self.reloj.pk: 3, self.otro.pk: 1})
+
+    def test_producto_borrado_no_se_fusiona(self):
+        ProductoListado.objects.filter(pk=self.otro.pk).update(fecha_borrado=timezone.now())
+
+        self.assertEqual(fusionar_carrito_invitado(self.usuario.pk, {str(self.otro.pk): 1}), 0)
+        self.assertEqual(self.cantidades(), {})
+
+    def test_iniciar_sesion_vuelca_el_carrito_del_visitante(self):
+        self.agregar_como_visitante(self.reloj, 2)
+        agregar_al_carrito(self.usuario.pk, self.reloj, 1)
+
+        self.client.post(reverse('login'), {'username': 'cliente@chronoslux.test', 'password': 'secreta123'})
+
+        self.assertEqual(self.cantidades(), {self.reloj.pk: 3})
+        self.assertNotIn('cart', self.client.session)
+        # El total del navbar sale ya del carrito del usuario.
+        self.assertEqual(self.client.get(reverse('get_cart_data')).json()['total_items'], 3)
+
+
+@override_settings(CARRITO_ALMACENAMIENTO='colecciones', CARRITO_INVITADO='cookie')
+class FusionCarritoCookieTests(FusionCarritoInvitadoTests):
+    # Las mismas pruebas con el carrito de visitantes en la cookie firmada.
+
+    def test_iniciar_sesion_vuelca_el_carrito_del_visitante(self):
+        self.agregar_como_visitante(self.reloj, 2)
+
+        self.client.post(reverse('login'), {'username': 'cliente@chronoslux.test', 'password': 'secreta123'})
+
+        self.assertEqual(self.cantidades(), {self.reloj.pk: 2})
+        # La respuesta del login borra la cookie.
+        self.assertEqual(self.client.cookies[COOKIE_CARRITO].value, '')
+
+
+# --- FIN: PRUEBAS DEL CARRITO DE VISITANTES AL INICIAR SESIÓN ---
+
+# --- INICIO: PRUEBAS DEL CARRITO EN COOKIE FIRMADA ---
+
+class CodificacionCookieTests(SimpleTestCase):
+
+    def test_ida_y_vuelta(self):
+        cantidades = {str(ObjectId()): 1, str(ObjectId()): 0xFFFF}
+        self.assertEqual(InvitadoCookie.decodificar(InvitadoCookie.codificar(cantidades)), cantidades)
+
+    def test_cantidad_se_topa_a_dos_bytes(self):
+        pid = str(ObjectId())
+        self.assertEqual(InvitadoCookie.decodificar(InvitadoCookie.codificar({pid: 70000})), {pid: 0xFFFF})
+
+    def test_basura_es_carrito_vacio(self):
+        for texto in ('@@@', 'AAAA', InvitadoCookie.codificar({str(ObjectId()): 1})[:-3]):
+            with self.subTest(texto=texto):
+                self.assertEqual(InvitadoCookie.decodificar(texto), {})
+
+
+@override_settings(CARRITO_INVITADO='cookie')
+class CarritoCookieTests(TestCase):
+
+    def setUp(self):
+        self.reloj = crear_producto('Submariner', stock=5)
+
+    def lote(self, *operaciones):
+        return self.client.post(
+            reverse('cart_batch'), json.dumps({'operations': list(operaciones)}), content_type='application/json',
+        )
+
+    def test_la_cookie_firmada_conserva_el_carrito(self):
+        respuesta = self.lote({'op': 'add', 'id': str(self.reloj.pk), 'quantity': 2})
+
+        self.assertIn(COOKIE_CARRITO, respuesta.cookies)
+        self.assertTrue(respuesta.cookies[COOKIE_CARRITO]['httponly'])
+        carrito = self.client.get(reverse('get_cart_data')).json()
+        self.assertEqual([(i['id'], i['quantity']) for i in carrito['cart_items']], [(str(self.reloj.pk), 2)])
+        self.assertEqual(carrito['total_price'], 2000.0)
+
+    def test_cookie_alterada_se_ignora(self):
+        self.lote({'op': 'add', 'id': str(self.reloj.pk), 'quantity': 2})
+        firmada = self.client.cookies[COOKIE_CARRITO].value
+        _, firma = firmada.split(':', 1)
+        alterado = InvitadoCookie.codificar({str(self.reloj.pk): 50})
+        self.client.cookies[COOKIE_CARRITO] = f'{alterado}:{firma}'
+
+        self.assertEqual(self.client.get(reverse('get_cart_data')).json()['total_items'], 0)
+
+    def test_vaciar_borra_la_cookie(self):
+        self.lote({'op': 'add', 'id': str(self.reloj.pk), 'quantity': 1})
+        respuesta = self.lote({'op': 'remove', 'id': str(self.reloj.pk)})
+
+        self.assertEqual(respuesta.cookies[COOKIE_CARRITO].value, '')
+        self.assertEqual(respuesta.json()['total_items'], 0)
+
+    def test_tope_de_renglones(self):
+        productos = [crear_producto(f'Reloj {n}', stock=1) for n in range(MAX_RENGLONES_COOKIE)]
+        for inicio in range(0, len(productos), MAX_OPERACIONES_LOTE):
+            tanda = productos[inicio:inicio + MAX_OPERACIONES_LOTE]
+            self.lote(*[{'op': 'add', 'id': str(p.pk), 'quantity': 1} for p in tanda])
+
+        respuesta = self.lote({'op': 'add', 'id': str(self.reloj.pk), 'quantity': 1})
+
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(self.client.get(reverse('get_cart_data')).json()['total_items'], MAX_RENGLONES_COOKIE)
+
+
+# --- FIN: PRUEBAS DEL CARRITO EN COOKIE FIRMADA ---
+
+# --- INICIO: PRUEBAS DEL CONSTRUCTOR DE CONSULTAS DEL CATÁLOGO ---
+
+class CondicionesCatalogoTests(SimpleTestCase):
+
+    def test_ignora_all_y_rangos_desconocidos(self):
+        filtros = leer_filtros({'type': 'all', 'price': 'gratis', 'gender': '', 'brand': 'All'})
+
+        self.assertEqual(condiciones_filtros(filtros, RANGOS_PRECIO_CATALOGO), Q())
+
+    def test_orden_desconocido_usa_el_destacado(self):
+        self.assertEqual(ordenamiento(leer_filtros({'sort': 'random'})), ('id',))
+        self.assertEqual(ordenamiento(leer_filtros({'sort': 'PRICE_DESC'})), ('-precio', '-id'))
+
+
+class FiltrosCatalogoTests(TestCase):
+    # Filtros y orden se resuelven en el pipeline de MongoDB: una consulta.
+
+    def setUp(self):
+        rolex = Marca.objects.create(nombre='Rolex')
+        omega = Marca.objects.create(nombre='Omega')
+        deportivo = Categoria.objects.create(genero='Hombre', material='Acero', tipo='Deportivo')
+        clasico = Categoria.objects.create(genero='Mujer', material='Oro', tipo='Clasico')
+        for nombre, precio, marca, categoria in (
+            ('Submariner', '9000.00', rolex, deportivo),
+            ('Daytona', '15000.00', rolex, deportivo),
+            ('Seamaster', '6000.00', omega, deportivo),
+            ('Constellation', '7000.00', omega, clasico),
+            ('Datejust', '4000.00', rolex, clasico),
+        ):
+            Producto.objects.create(nombre=nombre, precio=Decimal(precio), stock=1, marca=marca, categoria=categoria)
+
+    def nombres(self, params):
+        with self.assertNumQueries(1):
+            return [p.nombre for p in aplicar_filtros(
+                Producto.objects.select_related('marca', 'categoria'), leer_filtros(params), RANGOS_PRECIO_CATALOGO,
+            )]
+
+    def test_filtros_combinados_y_orden(self):
+        self.assertEqual(
+            self.nombres({'type': 'deportivo', 'gender': 'HOMBRE', 'price': '5000_10000', 'sort': 'price_asc'}),
+            ['Seamaster', 'Submariner'],
+        )
+
+    def test_marca_y_orden_descendente(self):
+        self.assertEqual(self.nombres({'brand': 'rolex', 'sort': 'price_desc'}), ['Daytona', 'Submariner', 'Datejust'])
+
+    def test_rangos_de_precio_en_los_bordes(self):
+        self.assertEqual(self.nombres({'price': 'up_to_5000', 'sort': 'name_asc'}), ['Datejust'])
+        self.assertEqual(self.nombres({'price': 'over_10000'}), ['Daytona'])
+
+
+class LimpiarCatalogoTests(TestCase):
+
+    def test_borra_en_lote_e_invalida_una_vez(self):
+        sembrar_catalogo(5)
+        busqueda_antes = leer_contador(busqueda.CONTADOR_BUSQUEDA)
+        catalogo_antes = version_catalogo()
+
+        limpiar_catalogo()
+
+        self.assertFalse(Producto.objects.exists())
+        self.assertFalse(ProductoListado.objects.exists())
+        self.assertEqual(leer_contador(busqueda.CONTADOR_BUSQUEDA), busqueda_antes + 1)
+        self.assertNotEqual(version_catalogo(), catalogo_antes)
+
+# --- FIN: PRUEBAS DEL CONSTRUCTOR DE CONSULTAS DEL CATÁLOGO ---
+
+# --- INICIO: PRUEBAS DE LA CACHÉ DEL CATÁLOGO ---
+
+@override_settings(CACHE_COMPARTIDA=False)
+class CacheCatalogoTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_incremento_de_version(self):
+        # Con caché local la versión vive en MongoDB: otro worker ve el
+        # incremento aunque no comparta la caché.
+        antes = version_catalogo()
+        incrementar_version_catalogo()
+        self.assertEqual(version_catalogo(), antes + 1)
+        self.assertEqual(cache.get('catalogo:version') is not None, settings.CACHE_COMPARTIDA)
+
+    def test_fragmento_se_recalcula_al_cambiar_un_producto(self):
+        calculos = []
+
+        def calcular():
+            calculos.append(1)
+            return len(calculos)
+
+        self.assertEqual(obtener_fragmento('prueba', calcular), 1)
+        self.assertEqual(obtener_fragmento('prueba', calcular), 1)
+        crear_producto('Nautilus', stock=1)
+        self.assertEqual(obtener_fragmento('prueba', calcular), 2)
+
+
+@override_settings(CACHE_COMPARTIDA=True)
+class CacheCatalogoCompartidaTests(CacheCatalogoTests):
+    # Las mismas pruebas con la versión en la caché.
+    pass
+
+
+# --- FIN: PRUEBAS DE LA CACHÉ DEL CATÁLOGO ---
+
+# --- INICIO: PRUEBAS DE LA BÚSQUEDA ---
+
+@override_settings(BUSQUEDA_MOTOR='local', BUSQUEDA_MAX_RESULTADOS=2)
+class BusquedaLocalTests(TestCase):
+
+    def setUp(self):
+        self.productos = [crear_producto(nombre, stock=1) for nombre in ('Oyster Azul', 'Oyster Negro', 'Oyster Verde')]
+        busqueda._indice_local = None
+
+    def tearDown(self):
+        busqueda._indice_local = None
+
+    def test_el_tope_solo_aplica_al_orden_por_relevancia(self):
+        self.assertEqual(len(busqueda.buscar('oyster')), 2)
+        self.assertEqual(set(busqueda.buscar('oyster', relevancia=False)), {p.pk for p in self.productos})
+
+    def test_catalogo_ordenado_por_precio_no_pierde_coincidencias(self):
+        respuesta = self.client.get(reverse('catalog_api'), {'q': 'oyster', 'sort': 'price_asc'})
+        self.assertEqual(len(respuesta.json()['items']), 3)
+
+    def test_reconstruye_si_otro_proceso_cambio_terminos(self):
+        self.assertEqual(busqueda.buscar('nautilus'), [])
+        # Otro worker guarda un producto: este proceso no recibe la señal.
+        marca, categoria = self.productos[0].marca, self.productos[0].categoria
+        nuevo, = Producto.objects.bulk_create([Producto(
+            nombre='Nautilus', precio=Decimal('1000.00'), stock=1, marca=marca, categoria=categoria,
+        )])
+        incrementar_contador(busqueda.CONTADOR_BUSQUEDA)
+
+        self.assertEqual(busqueda.buscar('nautilus'), [nuevo.pk])
+
+    def test_cambio_local_no_reconstruye(self):
+        busqueda.buscar('oyster')
+        indice = busqueda._indice_local
+        crear_producto('Oyster Rojo', stock=1)
+
+        self.assertEqual(len(busqueda.buscar('oyster', relevancia=False)), 4)
+        self.assertIs(busqueda._indice_local, indice)
+
+
+# --- FIN: PRUEBAS DE LA BÚSQUEDA ---
+
+# --- INICIO: PRUEBAS DE LAS FACETAS ---
+
+class FacetasTests(TestCase):
+
+    def test_solo_cuentan_piezas_con_stock(self):
+        crear_producto('Explorer', stock=2, precio='4000.00')
+        crear_producto('Milgauss', stock=0, precio='4000.00')
+
+        facetas = contar_facetas({'es_exclusivo': False}, leer_filtros({}), RANGOS_PRECIO_CATALOGO)
+
+        self.assertEqual(facetas['marcas'], [{'nombre': 'Rolex', 'total': 1}])
+        self.assertEqual(facetas['precios']['up_to_5000'], 1)
+
+
+# --- FIN: PRUEBAS DE LAS FACETAS ---
+
+# --- INICIO: PRUEBAS DEL AUTOCOMPLETADO ---
+
+class IndicePrefijosTests(SimpleTestCase):
+
+    REGISTROS = [
+        ('producto', '1', 'Royal Oak', 'Audemars Piguet'),
+        ('marca', '2', 'Rolex', ''),
+        ('producto', '3', 'Submariner', 'Rolex'),
+        ('material', 'oro rosa', 'Oro Rosa', ''),
+    ]
+
+    def test_carga_en_bloque_igual_a_incremental(self):
+        en_bloque = IndicePrefijos()
+        en_bloque.cargar(self.REGISTROS)
+        incremental = IndicePrefijos()
+        for tipo, ref, texto, detalle in self.REGISTROS:
+            incremental.poner(tipo, ref, texto, detalle)
+
+        self.assertEqual(en_bloque._entradas, incremental._entradas)
+        self.assertEqual(len(en_bloque), 6)
+
+    def test_busca_por_prefijo_de_cualquier_palabra(self):
+        indice = IndicePrefijos()
+        indice.cargar(self.REGISTROS)
+
+        self.assertEqual([s['texto'] for s in indice.buscar('ro')], ['Rolex', 'Royal Oak', 'Oro Rosa'])
+        self.assertEqual([s['texto'] for s in indice.buscar('oak')], ['Royal Oak'])
+
+    def test_quitar(self):
+        indice = IndicePrefijos()
+        indice.cargar(self.REGISTROS)
+        indice.quitar('producto', '1')
+
+        self.assertEqual(indice.buscar('oak'), [])
+        self.assertEqual(indice.refs('producto'), {'3'})
+
+
+class MaterialesSugerenciasTests(TestCase):
+
+    def setUp(self):
+        self.categoria = Categoria.objects.create(genero='Mujer', material='Titanio', tipo='Deportivo')
+        sugerencias.invalidar_indice()
+        sugerencias.indice()
+
+    def tearDown(self):
+        sugerencias.invalidar_indice()
+
+    def materiales(self, prefijo):
+        return [s['texto'] for s in sugerencias.indice().buscar(prefijo) if s['tipo'] == 'material']
+
+    def test_renombrar_material(self):
+        self.categoria.material = 'Cerámica'
+        self.categoria.save()
+
+        self.assertEqual(self.materiales('tit'), [])
+        self.assertEqual(self.materiales('ceram'), ['Cerámica'])
+
+    def test_borrar_la_ultima_categoria_del_material(self):
+        self.categoria.delete()
+        self.assertEqual(self.materiales('tit'), [])
+
+    def test_reconstruye_si_otro_proceso_cambio_sugerencias(self):
+        # Otro worker crea una categoría: este proceso no recibe la señal.
+        Categoria.objects.bulk_create([Categoria(genero='Hombre', material='Carbono', tipo='Deportivo')])
+        self.assertEqual(self.materiales('carb'), [])
+
+        incrementar_contador(sugerencias.CONTADOR_SUGERENCIAS)
+
+        self.assertEqual(self.materiales('carb'), ['Carbono'])
+
+    def test_cambio_local_no_reconstruye(self):
+        indice = sugerencias.indice()
+        Categoria.objects.create(genero='Hombre', material='Carbono', tipo='Deportivo')
+
+        self.assertEqual(self.materiales('carb'), ['Carbono'])
+        self.assertIs(sugerencias.indice(), indice)
+
+
+# --- FIN: PRUEBAS DEL AUTOCOMPLETADO ---
+
+# --- INICIO: PRUEBAS DEL ESTADO DEL USUARIO ---
+
+@override_settings(CARRITO_ALMACENAMIENTO='colecciones')
+class EstadoUsuarioTests(ConClienteMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.reloj = ProductoListado.objects.get(pk=crear_producto('Submariner', stock=5).pk)
+
+    @override_settings(CACHE_COMPARTIDA=True)
+    def test_cache_compartida_se_invalida_con_el_carrito(self):
+        self.assertEqual(cargar_estado(self.usuario.pk)['cart_total_items'], 0)
+        self.assertIsNotNone(cache.get(clave_estado(self.usuario.pk)))
+
+        agregar_al_carrito(self.usuario.pk, self.reloj, 2)
+
+        self.assertIsNone(cache.get(clave_estado(self.usuario.pk)))
+        self.assertEqual(cargar_estado(self.usuario.pk)['cart_total_items'], 2)
+
+    @override_settings(CACHE_COMPARTIDA=False)
+    def test_cache_local_no_guarda_entre_peticiones(self):
+        cargar_estado(self.usuario.pk)
+        self.assertIsNone(cache.get(clave_estado(self.usuario.pk)))
+
+        agregar_al_carrito(self.usuario.pk, self.reloj, 1)
+        self.assertEqual(cargar_estado(self.usuario.pk)['cart_total_items'], 1)
+
+
+# --- FIN: PRUEBAS DEL ESTADO DEL USUARIO ---
+
+# --- INICIO: PRUEBAS DE COLOCACIÓN DE PEDIDOS ---
+
+@skipUnlessDBFeature('_supports_transactions')
+@override_settings(TAREAS_HILOS=0)
+class ColocarPedidoTests(ConClienteMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.abundante = crear_producto('Submariner', stock=5)
+        self.escaso = crear_producto('Daytona', stock=1)
+
+    def test_coloca_pedido_y_descuenta_stock(self):
+        pedido = colocar_pedido(
+            self.usuario, self.domicilio, 'paypal', None, [linea(self.abundante, 2), linea(self.escaso, 1)],
+        )
+
+        self.assertEqual(stock(self.abundante), (3, 3))
+        self.assertEqual(stock(self.escaso), (0, 0))
+        self.assertEqual(DetallesPedido.objects.filter(pedido=pedido).count(), 2)
+        self.assertEqual(pedido.total_items, 3)
+        # Envío y pago nacen con el pedido; solo el correo queda en la cola.
+        self.assertIsNotNone(Pedido.objects.get(pk=pedido.pk).envio_id)
+        self.assertEqual(Pago.objects.get(pedido=pedido).metodo_pago, 'paypal')
+        self.assertEqual(list(Tarea.objects.values_list('tipo', flat=True)), ['pedido.correo'])
+
+    def test_renglon_posterior_sin_stock_no_escribe_nada(self):
+        # El $inc del primer renglón ya se aplicó cuando falla el segundo: solo
+        # el abort de la transacción lo revierte.
+        with self.assertRaises(StockInsuficiente) as error:
+            colocar_pedido(
+                self.usuario, self.domicilio, 'paypal', None,
+                [linea(self.abundante, 2), linea(self.escaso, 3)], nueva_clave_pedido(),
+            )
+
+        self.assertEqual(error.exception.linea['producto_id'], self.escaso.pk)
+        self.assertEqual(error.exception.disponible, 1)
+        self.assertEqual(stock(self.abundante), (5, 5))
+        self.assertEqual(stock(self.escaso), (1, 1))
+        self.assertEqual(Pedido.objects.count(), 0)
+        self.assertEqual(DetallesPedido.objects.count(), 0)
+        self.assertEqual(ClavePedido.objects.count(), 0)
+        self.assertEqual(Envio.objects.count(), 0)
+        self.assertEqual(Pago.objects.count(), 0)
+        self.assertEqual(Tarea.objects.count(), 0)
+
+    @override_settings(CARRITO_ALMACENAMIENTO='colecciones')
+    def test_carrito_sigue_activo_si_el_pedido_falla(self):
+        agregar_al_carrito(self.usuario.pk, ProductoListado.objects.get(pk=self.abundante.pk), 1)
+        agregar_al_carrito(self.usuario.pk, ProductoListado.objects.get(pk=self.escaso.pk), 2)
+        carrito_id, lineas = lineas_carrito(self.usuario.pk)
+
+        with self.assertRaises(StockInsuficiente):
+            colocar_pedido(self.usuario, self.domicilio, 'paypal', carrito_id, lineas)
+
+        self.assertEqual(Carrito.objects.get(pk=carrito_id).estado, 'activo')
+        self.assertEqual(stock(self.abundante), (5, 5))
+
+
+@skipUnlessDBFeature('_supports_transactions')
+@override_settings(TAREAS_HILOS=0)
+class IdempotenciaPedidoTests(ConClienteMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.producto = crear_producto('Speedmaster', stock=3)
+
+    def test_misma_llave_no_duplica_el_pedido(self):
+        clave = nueva_clave_pedido()
+        pedido = colocar_pedido(self.usuario, self.domicilio, 'paypal', None, [linea(self.producto, 1)], clave)
+
+        with self.assertRaises(PedidoRepetido) as error:
+            colocar_pedido(self.usuario, self.domicilio, 'paypal', None, [linea(self.producto, 1)], clave)
+
+        self.assertEqual(error.exception.pedido_id, pedido.pk)
+        self.assertEqual(pedido_por_clave(self.usuario.pk, clave), pedido.pk)
+        self.assertEqual(Pedido.objects.count(), 1)
+        self.assertEqual(stock(self.producto), (2, 2))
+
+    def test_pedido_fallido_no_gasta_la_llave(self):
+        clave = nueva_clave_pedido()
+        with self.assertRaises(StockInsuficiente):
+            colocar_pedido(self.usuario, self.domicilio, 'paypal', None, [linea(self.producto, 4)], clave)
+
+        self.assertIsNone(pedido_por_clave(self.usuario.pk, clave))
+        pedido = colocar_pedido(self.usuario, self.domicilio, 'paypal', None, [linea(self.producto, 3)], clave)
+        self.assertEqual(pedido_por_clave(self.usuario.pk, clave), pedido.pk)
+
+    def test_llave_huerfana_se_libera(self):
+        clave = nueva_clave_pedido()
+        ClavePedido.objects.create(usuario=self.usuario, clave=clave, pedido_id=ObjectId(), fecha=timezone.now())
+
+        pedido = colocar_pedido(self.usuario, self.domicilio, 'paypal', None, [linea(self.producto, 1)], clave)
+
+        self.assertEqual(pedido_por_clave(self.usuario.pk, clave), pedido.pk)
+        self.assertEqual(ClavePedido.objects.count(), 1)
+
+# --- FIN: PRUEBAS DE COLOCACIÓN DE PEDIDOS ---
+
+# --- INICIO: PRUEBAS DE RESERVAS ---
+
+@skipUnlessDBFeature('_supports_transactions')
+@override_settings(TAREAS_HILOS=0, CARRITO_ALMACENAMIENTO='colecciones')
+class ReservasTests(ConClienteMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.producto = crear_producto('Nautilus', stock=2)
+
+    def test_reservar_aparta_hasta_el_stock(self):
+        reservadas, expira = reservar_lineas(self.usuario.pk, [linea(self.producto, 5)])
+
+        self.assertEqual(reservadas, {self.producto.pk: 2})
+        self.assertGreater(expira, timezone.now())
+        self.assertEqual(stock(self.producto), (0, 0))
+        self.assertEqual(Reserva.objects.get(usuario=self.usuario).cantidad, 2)
+
+    def test_reservas_vencidas_vuelven_al_stock(self):
+        reservar_lineas(self.usuario.pk, [linea(self.producto, 2)])
+
+        self.assertEqual(liberar_reservas(), 0)
+        self.assertEqual(liberar_reservas(timezone.now() + VIGENCIA_RESERVA + timedelta(seconds=1)), 1)
+        self.assertEqual(stock(self.producto), (2, 2))
+        self.assertFalse(Reserva.objects.exists())
+
+    def test_pedido_consume_la_reserva(self):
+        reservar_lineas(self.usuario.pk, [linea(self.producto, 2)])
+
+        colocar_pedido(self.usuario, self.domicilio, 'paypal', None, [linea(self.producto, 2)])
+
+        self.assertEqual(stock(self.producto), (0, 0))
+        self.assertFalse(Reserva.objects.exists())
+
+    def test_cerrar_sesion_libera_las_reservas(self):
+        self.client.force_login(self.usuario)
+        reservar_lineas(self.usuario.pk, [linea(self.producto, 1)])
+
+        self.client.logout()
+
+        self.assertEqual(stock(self.producto), (2, 2))
+        self.assertFalse(Reserva.objects.exists())
+
+    def test_precarga_del_checkout_no_aparta(self):
+        agregar_al_carrito(self.usuario.pk, ProductoListado.objects.get(pk=self.producto.pk), 1)
+        self.client.force_login(self.usuario)
+
+        respuesta = self.client.get(reverse('checkout_page'), HTTP_SEC_PURPOSE='prefetch;prerender')
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertFalse(Reserva.objects.exists())
+        self.client.get(reverse('checkout_page'))
+        self.assertEqual(Reserva.objects.get(usuario=self.usuario).cantidad, 1)
+
+    def test_checkout_avisa_si_no_se_pudo_apartar(self):
+        agregar_al_carrito(self.usuario.pk, ProductoListado.objects.get(pk=self.producto.pk), 1)
+        self.client.force_login(self.usuario)
+
+        with mock.patch('watches.views.reservar_lineas', side_effect=ReservaFallida('El stock cambió')):
+            respuesta = self.client.get(reverse('checkout_page'))
+
+        self.assertEqual(respuesta.status_code, 200)
+        avisos = [str(aviso) for aviso in get_messages(respuesta.wsgi_request)]
+        self.assertIn("No pudimos apartar tus piezas en este momento; se confirmarán al pagar.", avisos)
+
+    def test_guardar_sin_stock_no_pisa_lo_apartado(self):
+        viejo = Producto.objects.get(pk=self.producto.pk)
+        reservar_lineas(self.usuario.pk, [linea(self.producto, 1)])
+
+        viejo.nombre = 'Nautilus 5711'
+        viejo.save(update_fields=['nombre'])
+
+        self.assertEqual(stock(self.producto), (1, 1))
+        self.assertEqual(ProductoListado.objects.get(pk=self.producto.pk).nombre, 'Nautilus 5711')
+
+    def test_reponer_suma_sobre_lo_apartado(self):
+        reservar_lineas(self.usuario.pk, [linea(self.producto, 2)])
+
+        reponer_stock({self.producto.pk: 3})
+
+        self.assertEqual(stock(self.producto), (3, 3))
+
+    def test_liberar_reserva_de_producto_borrado(self):
+        reservar_lineas(self.usuario.pk, [linea(self.producto, 1)])
+        # Borrado por fuera del ORM: el CASCADE de Reserva no corre.
+        coleccion(Producto).delete_one({'_id': self.producto.pk})
+
+        self.assertEqual(liberar_reservas(timezone.now() + VIGENCIA_RESERVA + timedelta(seconds=1)), 1)
+        self.assertFalse(Reserva.objects.exists())
+
+# --- FIN: PRUEBAS DE RESERVAS ---
+
+# --- INICIO: PRUEBAS DE LA COLA DE TAREAS ---
+
+@manejador('prueba.ok')
+def _tarea_ok(**datos):
+    pass
+
+
+@manejador('prueba.falla')
+def _tarea_falla(**datos):
+    raise ValueError('falla de prueba')
+
+
+@manejador('prueba.espera')
+def _tarea_espera(**datos):
+    raise Reintentar('falta un paso previo')
+
+
+class ColaTareasTests(TestCase):
+
+    def tomar(self, tipo):
+        encolar([(tipo, {})])
+        return tomar_tarea()
+
+    def test_tarea_exitosa_queda_hecha(self):
+        tarea = self.tomar('prueba.ok')
+
+        self.assertEqual((tarea['estado'], tarea['intentos']), ('en_proceso', 1))
+        self.assertTrue(ejecutar_tarea(tarea))
+        guardada = Tarea.objects.get()
+        self.assertEqual(guardada.estado, 'hecha')
+        self.assertIsNotNone(guardada.fecha_fin)
+        self.assertIsNone(tomar_tarea())
+
+    def test_tarea_tomada_no_se_entrega_dos_veces(self):
+        self.assertIsNotNone(self.tomar('prueba.ok'))
+        self.assertIsNone(tomar_tarea())
+
+    def test_fallo_reprograma_con_espera_exponencial(self):
+        encolar([('prueba.falla', {})])
+        for intento in (1, 2, 3):
+            # Como si ya hubiera pasado la espera anterior.
+            Tarea.objects.update(disponible_en=timezone.now())
+            tarea = tomar_tarea()
+            antes = timezone.now()
+
+            self.assertFalse(ejecutar_tarea(tarea))
+
+            guardada = Tarea.objects.get()
+            self.assertEqual((guardada.estado, guardada.intentos), ('pendiente', intento))
+            self.assertAlmostEqual(
+                (guardada.disponible_en - antes).total_seconds(),
+                ESPERA_BASE_TAREA * 2 ** (intento - 1),
+                delta=1,
+            )
+            self.assertIn('ValueError: falla de prueba', guardada.error)
+            self.assertIsNone(tomar_tarea())
+
+    def test_sin_intentos_restantes_queda_fallida(self):
+        encolar([('prueba.falla', {})])
+        Tarea.objects.update(intentos=MAX_INTENTOS_TAREA - 1)
+
+        self.assertFalse(ejecutar_tarea(tomar_tarea()))
+
+        self.assertEqual(Tarea.objects.get().estado, 'fallida')
+
+    def test_reintentar_guarda_solo_el_motivo(self):
+        self.assertFalse(ejecutar_tarea(self.tomar('prueba.espera')))
+
+        guardada = Tarea.objects.get()
+        self.assertEqual((guardada.estado, guardada.error), ('pendiente', 'falta un paso previo'))
+
+
+@skipUnlessDBFeature('_supports_transactions')
+@override_settings(TAREAS_HILOS=0)
+class TareasPedidoTests(ConClienteMixin, TestCase):
+
+    def test_correo_de_confirmacion_desde_el_resumen(self):
+        producto = crear_producto('Aquanaut', stock=1)
+        colocar_pedido(self.usuario, self.domicilio, 'paypal', None, [linea(producto, 1)])
+
+        # El envío ya existe: el correo sale al primer intento.
+        while (tarea := tomar_tarea()) is not None:
+            ejecutar_tarea(tarea)
+
+        self.assertEqual(Tarea.objects.exclude(estado='hecha').count(), 0)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('1 x Aquanaut', mail.outbox[0].body)
+
+# --- FIN: PRUEBAS DE LA COLA DE TAREAS ---
+
+# --- INICIO: PRUEBAS DE LAS SESIONES EN LRU ---
+
+@override_settings(SESIONES_LRU_MAX=2, SESIONES_LRU_INTERVALO=3600)
+class SesionesLruTests(TestCase):
+    # Un CacheSesiones propio por prueba; el intervalo largo deja los volcados
+    # en manos de la prueba.
+
+    def setUp(self):
+        self.cache_sesiones = CacheSesiones()
+        parche = mock.patch('watches.sesiones_lru.cache_sesiones', self.cache_sesiones)
+        parche.start()
+        self.addCleanup(parche.stop)
+        self.expira = timezone.now() + timedelta(hours=1)
+
+    def en_bd(self, llave):
+        documento = coleccion(Session).find_one({'_id': llave})
+        return documento['session_data'] if documento else None
+
+    def test_escrituras_repetidas_se_juntan(self):
+        for datos in ('uno', 'dos', 'tres'):
+            self.cache_sesiones.guardar('a', datos, self.expira)
+
+        self.assertIsNone(self.en_bd('a'))
+        self.assertEqual(self.cache_sesiones.volcar(), 1)
+        self.assertEqual(self.cache_sesiones.escrituras_bd, 1)
+        self.assertEqual(self.en_bd('a'), 'tres')
+        self.assertEqual(self.cache_sesiones.volcar(), 0)
+
+    def test_sesion_desalojada_se_escribe_en_el_volcado(self):
+        for llave in ('a', 'b', 'c'):
+            self.cache_sesiones.guardar(llave, f'datos {llave}', self.expira)
+
+        self.assertEqual(list(self.cache_sesiones._entradas), ['b', 'c'])
+        self.assertEqual(self.cache_sesiones.volcar(), 3)
+        self.assertEqual(self.en_bd('a'), 'datos a')
+
+    def test_cargar_despues_de_desalojar(self):
+        sesion = SesionLru()
+        sesion['paso'] = 1
+        sesion.save()
+        sesion['paso'] = 2
+        sesion.save()
+        # Dos sesiones nuevas sacan a la primera del LRU antes del volcado.
+        for _ in range(2):
+            otra = SesionLru()
+            otra['paso'] = 0
+            otra.save()
+
+        self.assertNotIn(sesion.session_key, self.cache_sesiones._entradas)
+        self.assertEqual(SesionLru(sesion.session_key)['paso'], 2)
+
+        self.cache_sesiones.volcar()
+        self.cache_sesiones._entradas.clear()
+        self.assertEqual(SesionLru(sesion.session_key)['paso'], 2)
+
+# --- FIN: PRUEBAS DE LAS SESIONES EN LRU ---
+
+# --- INICIO: PRUEBAS DEL BROKER DE EVENTOS ---
+
+class BrokerEventosTests(SimpleTestCase):
+    # Broker propio por prueba; los publicadores reales son código síncrono
+    # que corre en otro hilo que el event loop del flujo SSE.
+
+    def setUp(self):
+        self.broker = Broker()
+
+    def publicar_desde_hilo(self, canal, evento, datos):
+        hilo = threading.Thread(target=self.broker.publicar, args=(canal, evento, datos))
+        hilo.start()
+        hilo.join()
+
+    async def test_publicar_desde_un_hilo_sincrono(self):
+        with self.broker.suscribir([canal_usuario(1)]) as suscripcion:
+            self.publicar_desde_hilo(canal_producto(9), 'stock', {'stock': 0})
+            self.publicar_desde_hilo(canal_usuario(1), 'carrito', {'total_items': 2})
+
+            self.assertEqual(await suscripcion.siguiente(1), ('carrito', {'total_items': 2}))
+            with self.assertRaises(asyncio.TimeoutError):
+                await suscripcion.siguiente(0.05)
+
+    async def test_cambiar_canales(self):
+        with self.broker.suscribir([canal_usuario(1)]) as suscripcion:
+            suscripcion.cambiar_canales([canal_usuario(1), canal_producto(9)])
+            self.publicar_desde_hilo(canal_producto(9), 'stock', {'stock': 1})
+            self.assertEqual(await suscripcion.siguiente(1), ('stock', {'stock': 1}))
+
+            suscripcion.cambiar_canales([canal_usuario(1)])
+            self.assertEqual(set(self.broker._suscripciones), {canal_usuario(1)})
+
+    async def test_cliente_lento_pierde_los_mas_viejos(self):
+        with self.broker.suscribir([canal_usuario(1)]) as suscripcion:
+            for i in range(MAX_EVENTOS_EN_COLA + 5):
+                self.broker.publicar(canal_usuario(1), 'carrito', {'total_items': i})
+            await asyncio.sleep(0)
+
+            self.assertEqual(await suscripcion.siguiente(1), ('carrito', {'total_items': 5}))
+
+    async def test_desconexion_cancela_la_suscripcion(self):
+        # Como cart_events: al desconectarse el cliente, Django cierra el
+        # generador y el `with` suelta los canales.
+        async def flujo():
+            with self.broker.suscribir([canal_usuario(1), canal_producto(9)]) as suscripcion:
+                while True:
+                    yield await suscripcion.siguiente(1)
+
+        eventos = flujo()
+        siguiente = asyncio.ensure_future(eventos.__anext__())
+        await asyncio.sleep(0)
+        self.publicar_desde_hilo(canal_producto(9), 'stock', {'stock': 0})
+        self.assertEqual(await siguiente, ('stock', {'stock': 0}))
+
+        await eventos.aclose()
+
+        self.assertEqual(self.broker._suscripciones, {})
+        self.publicar_desde_hilo(canal_usuario(1), 'carrito', {'total_items': 0})
+
+# --- FIN: PRUEBAS DEL BROKER DE EVENTOS ---
+
+# --- INICIO: PRUEBAS DEL MODELO DE LECTURA DE LOS LISTADOS ---
+
+class ListadoSincronizadoTests(TestCase):
+    # ProductoListado sigue a Producto, Marca, Categoria e ImgProducto por señales.
+
+    def setUp(self):
+        self.producto = crear_producto('Submariner', stock=3)
+
+    def listado(self):
+        return ProductoListado.objects.get(pk=self.producto.pk)
+
+    def test_crear_y_editar_producto(self):
+        self.assertEqual(self.listado().nombre, 'Submariner')
+        self.assertEqual(self.listado().marca.nombre, 'Rolex')
+
+        self.producto.precio = Decimal('12500.00')
+        self.producto.stock = 7
+        self.producto.save()
+
+        self.assertEqual(self.listado().precio, Decimal('12500.00'))
+        self.assertEqual(self.listado().stock, 7)
+
+    def test_renombrar_marca(self):
+        marca = self.producto.marca
+        marca.nombre = 'Rolex SA'
+        marca.save()
+
+        self.assertEqual(self.listado().marca.nombre, 'Rolex SA')
+
+    def test_cambiar_categoria(self):
+        categoria = self.producto.categoria
+        categoria.material = 'Oro'
+        categoria.save()
+
+        self.assertEqual(self.listado().categoria.material, 'Oro')
+
+    def test_imagen(self):
+        imagen = ImgProducto.objects.create(producto=self.producto, url='watches/submariner.jpg')
+        self.assertEqual(self.listado().imgproducto.url, 'watches/submariner.jpg')
+
+        imagen.delete()
+        self.assertIsNone(self.listado().imgproducto)
+
+    def test_borrar_producto(self):
+        self.producto.delete()
+        self.assertFalse(ProductoListado.objects.filter(pk=self.producto.pk).exists())
+
+    def test_borrar_marca_borra_sus_productos(self):
+        self.producto.marca.delete()
+        self.assertFalse(ProductoListado.objects.filter(pk=self.producto.pk).exists())
+
+# --- FIN: PRUEBAS DEL MODELO DE LECTURA DE LOS LISTADOS ---
+
+# --- INICIO: PRUEBAS DEL BARRIDO DE CARRITOS VENCIDOS ---
+
+@override_settings(CARRITO_ALMACENAMIENTO='colecciones', CACHE_COMPARTIDA=True)
+class ExpirarCarritosTests(ConClienteMixin, TestCase):
+    modelo = Carrito
+    campo_expirados = 'expirados_colecciones'
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.reloj = ProductoListado.objects.get(pk=crear_producto('Submariner', stock=5).pk)
+        agregar_al_carrito(self.usuario.pk, self.reloj, 2)
+        # Vencimiento fijo en milisegundos enteros, como lo guarda MongoDB.
+        self.vence = timezone.now().replace(microsecond=0) + VIGENCIA_CARRITO
+        self.modelo.objects.filter(usuario=self.usuario).update(fecha_expiracion=self.vence)
+
+    def estado(self):
+        return self.modelo.objects.get(usuario=self.usuario).estado
+
+    def test_el_corte_es_estricto(self):
+        barrido = expirar_carritos(self.vence)
+
+        self.assertEqual(getattr(barrido, self.campo_expirados), 0)
+        self.assertEqual(self.estado(), 'activo')
+
+        barrido = expirar_carritos(self.vence + timedelta(milliseconds=1))
+
+        self.assertEqual(getattr(barrido, self.campo_expirados), 1)
+        self.assertEqual(self.estado(), 'expirado')
+
+    def test_registra_el_barrido(self):
+        expirar_carritos(self.vence + timedelta(seconds=1))
+        expirar_carritos(self.vence + timedelta(seconds=2))
+
+        ultimo, primero = BarridoCarritos.objects.all()
+        self.assertEqual(getattr(primero, self.campo_expirados), 1)
+        self.assertEqual(getattr(ultimo, self.campo_expirados), 0)
+
+    def test_carrito_expirado_deja_de_contar(self):
+        self.assertEqual(cargar_estado(self.usuario.pk)['cart_total_items'], 2)
+
+        expirar_carritos(self.vence + timedelta(seconds=1))
+
+        self.assertEqual(cargar_estado(self.usuario.pk)['cart_total_items'], 0)
+        self.assertEqual(lineas_carrito(self.usuario.pk)[1], [])
+        agregar_al_carrito(self.usuario.pk, self.reloj, 1)
+        self.assertEqual(self.modelo.objects.filter(usuario=self.usuario, estado='activo').count(), 1)
+        self.assertEqual(contenido_carrito(self.usuario.pk)['total_items'], 1)
+
+
+@override_settings(CARRITO_ALMACENAMIENTO='embebido', CACHE_COMPARTIDA=True)
+class ExpirarCarritosEmbebidosTests(ExpirarCarritosTests):
+    modelo = CarritoDocumento
+    campo_expirados = 'expirados_embebidos'
+
+# --- FIN: PRUEBAS DEL BARRIDO DE CARRITOS VENCIDOS ---
@@ -5,10 +5,15 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('catalogo/', views.catalog, name='catalog'),
     path('exclusivos/', views.exclusivos_catalog, name='exclusivos_catalog'),
+    path('api/catalogo/', views.catalog_api, name='catalog_api'),
+    path('api/exclusivos/', views.exclusivos_api, name='exclusivos_api'),
+    path('api/buscar/sugerencias/', views.sugerencias_api, name='sugerencias_api'),
 
     path('producto/<str:producto_id>/', views.product_detail, name='product_detail'),
 
     path('api/carrito/', views.get_cart_data, name='get_cart_data'),
+    path('api/carrito/batch/', views.cart_batch, name='cart_batch'),
+    path('api/carrito/eventos/', views.cart_events, name='cart_events'),
     path('carrito/agregar/<str:producto_id>/', views.add_to_cart, name='add_to_cart'),
     path('carrito/eliminar/<str:producto_id>/', views.remove_from_cart, name='remove_from_cart'),
     path('carrito/actualizar/<str:producto_id>/', views.update_cart_quantity, name='update_cart_quantity'),
@@ -32,6 +37,7 @@ urlpatterns = [
 
     path('favoritos/', views.favoritos_list, name='favoritos_list'),
     path('favoritos/toggle/<str:producto_id>/', views.toggle_favorite, name='toggle_favorite'),
+    path('api/favoritos/', views.favoritos_api, name='favoritos_api'),
 
     path('administracion/devoluciones/', views.gestionar_devoluciones, name='gestionar_devoluciones'),
     path('api/chatbot/', views.chatbot_api, name='chatbot_api'),
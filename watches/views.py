@@ -2,17 +2,44 @@ import os
 import uuid, re
 from django.contrib import messages
 from django.shortcuts import render, get_object_or_404, redirect
-from .models import Producto, Categoria, Resena, ImgProducto, Marca, Domicilio, DetallesPedido, Pedido, Envio, Pago, Favorito, Carrito, DetalleCarrito, Devolucion
-from django.http import JsonResponse, StreamingHttpResponse, Http404
+from django.urls import reverse
+from .models import Producto, Categoria, Resena, ImgProducto, Domicilio, Pedido, Pago, Favorito, DetalleCarrito, Devolucion, ProductoListado
+from django.http import JsonResponse, StreamingHttpResponse, Http404, HttpResponse
 from django.core.exceptions import ValidationError
 import json
+import asyncio
+from asgiref.sync import sync_to_async
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET, require_POST
+from django.views.decorators.vary import vary_on_cookie
 from .forms import ProductoForm, ResenaForm
-from django.db.models import Q, Sum
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
-from datetime import timedelta
 from django.contrib.admin.views.decorators import staff_member_required
 from .context_processors import home_page_context
+from .catalogo import (
+    leer_filtros, filtros_actuales, aplicar_filtros, ordenamiento,
+    RANGOS_PRECIO_CATALOGO, RANGOS_PRECIO_EXCLUSIVOS, ORDENAMIENTOS,
+)
+from .paginacion import paginar, paginar_lista, querystring_sin_cursor, PaginaCursor
+from .busqueda import buscar
+from .sugerencias import sugerir
+from .facetas import contar_facetas
+from .estado_usuario import estado_usuario
+from .carrito_invitado import aplicar_invitado, contenido_invitado, version_invitado
+from .eventos import broker, canal_usuario, canal_producto, formato_sse, STOCK_BAJO
+from .carrito import (
+    agregar_al_carrito, cambiar_cantidad, quitar_del_carrito, contenido_carrito, lineas_carrito,
+    version_carrito, normalizar_lote, aplicar_lote,
+)
+from .pedidos import (
+    colocar_pedido, nueva_clave_pedido, clave_valida, pedido_por_clave,
+    StockInsuficiente, CarritoNoDisponible, PedidoRepetido,
+)
+from .reservas import reservar_lineas, ReservaFallida
+from .compras import filtros_compras, pagina_compras
 from django.db.models import Case, When, Value, IntegerField
 from django.conf import settings
 from django.http import JsonResponse, StreamingHttpResponse
@@ -27,6 +54,29 @@ def get_object_or_404_mongo(model_or_queryset, **kwargs):
     except ValidationError:
         raise Http404("ID no válido")
 
+
+def _serializar_producto(watch):
+    imagen = getattr(watch, 'imgproducto', None)
+    return {
+        'id': str(watch.id),
+        'name': watch.nombre,
+        'brand': watch.marca.nombre,
+        'price': float(watch.precio),
+        'type': watch.categoria.tipo,
+        'gender': watch.categoria.genero,
+        'is_exclusive': watch.es_exclusivo,
+        'image_url': imagen.url.name if imagen else '',
+        'url': reverse('product_detail', kwargs={'producto_id': str(watch.id)}),
+    }
+
+
+def _pagina_json(page_obj):
+    return {
+        'items': [_serializar_producto(watch) for watch in page_obj],
+        'next_cursor': page_obj.next_cursor,
+        'previous_cursor': page_obj.previous_cursor,
+    }
+
 # --- INICIO: LÓGICA COMPLETA DE LA VISTA DE HOME ---
 
 def home(request):
@@ -37,96 +87,82 @@ def home(request):
 
 # --- INICIO: LÓGICA COMPLETA DE VISTA Y FILTROS NORMALES ---
 
-def catalog(request):
-    items = Producto.objects.select_related('categoria', 'marca', 'imgproducto')
+def _productos_catalogo(request):
+    # Modelo de lectura: marca, categoría e imagen ya vienen embebidas.
+    items = ProductoListado.objects.all()
+
+    filtros = leer_filtros(request.GET)
 
-    # Barra de busqueda
+    # Barra de busqueda (ranking por relevancia, ver watches/busqueda.py). El
+    # tope de resultados solo aplica a "Destacados"; con otro orden entran
+    # todas las coincidencias y MongoDB las ordena.
     query = request.GET.get('q')
+    ranking = None
     if query:
-        items = items.filter(
-            Q(nombre__icontains=query) |
-            Q(marca__nombre__icontains=query) |
-            Q(descripcion1__icontains=query) |
-            Q(descripcion2__icontains=query) |
-            Q(descripcion3__icontains=query) |
-            Q(categoria__material__icontains=query) |
-            Q(categoria__genero__icontains=query) |
-            Q(categoria__tipo__icontains=query)
-        )
+        ranking = buscar(query, relevancia=filtros['sort'] == 'featured')
+        items = items.filter(pk__in=ranking)
     else:
         items = items.filter(es_exclusivo=False)
 
-    # Filtros
-    t = (request.GET.get('type') or '').lower()
-    price = (request.GET.get('price') or '').lower()
-    gender = (request.GET.get('gender') or '').lower()
-    marca_filtro = (request.GET.get('brand') or '').lower()
-
-    # Funciones de filtro
-    def match_type(x):
-        if not t or t == 'all': return True
-        value = (x.categoria.tipo or '').lower()
-        return value == t
-
-    def match_price(x):
-        if not price or price == 'all': return True
-        p = float(x.precio)
-        if price == 'up_to_5000': return p <= 5000
-        if price == '5000_10000': return 5000 <= p <= 10000
-        if price == 'over_10000': return p > 10000
-        return True
-
-    def match_gender(x):
-        if not gender or gender == 'all': return True
-        return (x.categoria.genero or '').lower() == gender
-
-    def match_brand(x):
-        if not marca_filtro or marca_filtro == 'all': return True
-        return (x.marca.nombre or '').lower() == marca_filtro
-
-    # Aplicar filtros
-    items = [x for x in items if match_type(x) and match_price(x) and match_gender(x) and match_brand(x)]
-
-    # Ordenamiento
-    sort = (request.GET.get('sort') or 'featured').lower()
-    if sort == 'price_asc':
-        items = sorted(items, key=lambda x: x.precio)
-    elif sort == 'price_desc':
-        items = sorted(items, key=lambda x: x.precio, reverse=True)
-    elif sort == 'name_asc':
-        items = sorted(items, key=lambda x: x.nombre)
-
-    favoritos_ids = []
+    # Filtros y ordenamiento (se resuelven en MongoDB)
+    items = aplicar_filtros(items, filtros, RANGOS_PRECIO_CATALOGO)
 
-    if request.user.is_authenticated:
-        favoritos_ids = list(
-            Favorito.objects.filter(
-                usuario=request.user
-            ).values_list('producto_id', flat=True)
+    return items, filtros, query, ranking
+
+
+def _paginar_catalogo(request, items, filtros, ranking):
+    cursor = request.GET.get('cursor')
+
+    # Con búsqueda, "Destacados" respeta el orden de relevancia.
+    if ranking is not None and filtros['sort'] == 'featured':
+        ids_filtrados = set(items.values_list('id', flat=True))
+        ids = [producto_id for producto_id in ranking if producto_id in ids_filtrados]
+        pagina_ids, cursor_siguiente, cursor_anterior = paginar_lista(ids, cursor)
+        productos = {p.id: p for p in items.filter(pk__in=pagina_ids)}
+        return PaginaCursor(
+            [productos[pid] for pid in pagina_ids if pid in productos],
+            cursor_siguiente,
+            cursor_anterior,
         )
 
-    tipos_disponibles = Categoria.objects.values_list('tipo', flat=True).distinct().order_by('tipo')
-    generos_disponibles = Categoria.objects.values_list('genero', flat=True).distinct().order_by('genero')
-    marcas_disponibles = Marca.objects.all().order_by('nombre')
+    return paginar(items, ordenamiento(filtros), cursor)
+
+
+def catalog(request):
+    items, filtros, query, ranking = _productos_catalogo(request)
+    page_obj = _paginar_catalogo(request, items, filtros, ranking)
+
+    favoritos_ids = estado_usuario(request).favoritos_ids
+
+    base = {'_id': {'$in': ranking}} if ranking is not None else {'es_exclusivo': False}
+    facetas = contar_facetas(base, filtros, RANGOS_PRECIO_CATALOGO)
 
     return render(request, 'catalog.html', {
-        'catalog_watches': items,
-        'querystring': request.GET.urlencode(),
+        'catalog_watches': page_obj.object_list,
+        'page_obj': page_obj,
+        'querystring': querystring_sin_cursor(request.GET),
         'search_query': query,
-        'current': {
-            'type': t or 'all',
-            'price': price or 'all',
-            'gender': gender or 'all',
-            'sort': sort or 'featured',
-            'brand': marca_filtro or 'all',
-        },
-        'tipos': tipos_disponibles,
-        'generos': generos_disponibles,
-        'marcas': marcas_disponibles,
+        'current': filtros_actuales(filtros),
+        'tipos': facetas['tipos'],
+        'generos': facetas['generos'],
+        'marcas': facetas['marcas'],
+        'precios': facetas['precios'],
         'favoritos_ids': favoritos_ids,
     })
 
 
+def catalog_api(request):
+    items, filtros, query, ranking = _productos_catalogo(request)
+    page_obj = _paginar_catalogo(request, items, filtros, ranking)
+    return JsonResponse(_pagina_json(page_obj))
+
+
+def sugerencias_api(request):
+    # Se llama en cada tecla: responde desde el índice en memoria, sin tocar MongoDB.
+    prefijo = request.GET.get('q', '').strip()
+    return JsonResponse({'sugerencias': sugerir(prefijo) if prefijo else []})
+
+
 def product_detail(request, producto_id):
     producto = get_object_or_404_mongo(
         Producto.objects.select_related('categoria', 'marca', 'imgproducto'),
@@ -180,110 +216,76 @@ def product_detail(request, producto_id):
 
 # --- INICIO: LÓGICA COMPLETA DEL CARRITO ---
 
-def _get_user_cart(request):
-    if not request.user.is_authenticated:
-        return None
+def add_to_cart(request, producto_id):
+    # El modelo de lectura trae marca e imagen sin joins.
+    producto = get_object_or_404_mongo(ProductoListado, pk=producto_id)
 
-    # Busca un carrito activo que no haya expirado.
-    cart, created = Carrito.objects.get_or_create(
-        usuario=request.user,
-        estado='activo',
-        defaults={
-            'fecha_creacion': timezone.now(),
-            'fecha_expiracion': timezone.now() + timedelta(minutes=60)
-        }
-    )
+    if request.user.is_authenticated:
+        resultado = agregar_al_carrito(request.user.pk, producto)
+        return JsonResponse({'status': 'ok', **resultado})
 
-    # Si el carrito ya existía, comprueba si ha expirado.
-    if not created and cart.fecha_expiracion and cart.fecha_expiracion < timezone.now():
-        cart.estado = 'expirado'
-        cart.save()
-        cart = Carrito.objects.create(
-            usuario=request.user,
-            fecha_creacion=timezone.now(),
-            fecha_expiracion=timezone.now() + timedelta(minutes=60)
-        )
-    return cart
+    try:
+        resultado = aplicar_invitado(request, [('add', producto.id, 1)], {producto.id: producto})
+    except ValueError:
+        return JsonResponse({'status': 'error'}, status=400)
+    return JsonResponse({'status': 'ok', **resultado})
 
 
-def add_to_cart(request, producto_id):
-    producto = get_object_or_404_mongo(Producto, pk=producto_id)
-    total_items = 0
-
-    if request.user.is_authenticated:
-        cart = _get_user_cart(request)
-        if cart:
-            detalle, created = DetalleCarrito.objects.get_or_create(
-                carrito=cart,
-                producto=producto,
-                defaults={
-                    'cantidad': 1,
-                    'precio_unitario': producto.precio,
-                    'subtotal': producto.precio
-                }
-            )
+def _operacion_invitado(request, tipo, producto_id, cantidad=1):
+    # Un id inválido no está en el carrito del visitante: no hay nada que hacer.
+    try:
+        producto_id = ObjectId(str(producto_id))
+    except InvalidId:
+        return JsonResponse({'status': 'ok'})
+    return JsonResponse({'status': 'ok', **aplicar_invitado(request, [(tipo, producto_id, cantidad)])})
 
-            if not created:
-                detalle.cantidad += 1
-                detalle.subtotal = detalle.cantidad * detalle.precio_unitario
-                detalle.save()
 
-            total_items_query = DetalleCarrito.objects.filter(carrito=cart).aggregate(total=Sum('cantidad'))
-            total_items = total_items_query['total'] or 0
-    else:
-        cart_session = request.session.get('cart', {})
-        pid_str = str(producto_id)
-        if pid_str in cart_session:
-            cart_session[pid_str]['quantity'] += 1
+def _version_carrito(request):
+    # Se calcula una vez por petición: la usan el ETag y el modo ?since.
+    if not hasattr(request, '_version_carrito'):
+        if request.user.is_authenticated:
+            request._version_carrito = version_carrito(request.user.pk)
         else:
-            cart_session[pid_str] = {
-                'quantity': 1, 'price': str(producto.precio), 'name': producto.nombre,
-                'image_url': producto.imgproducto.url.name, 'brand': producto.marca.nombre
-            }
-        request.session['cart'] = cart_session
-        total_items = sum(item['quantity'] for item in cart_session.values())
+            request._version_carrito = version_invitado(request)
+    return request._version_carrito
 
-    return JsonResponse({'status': 'ok', 'total_items': total_items})
 
+@require_GET
+@vary_on_cookie
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_version_carrito)
 def get_cart_data(request):
-    cart_items = []
-    total_price = 0
-    total_items = 0
+    # If-None-Match con la versión vigente responde 304 desde `condition`;
+    # ?since=<versión> responde {'changed': false} sin serializar renglones.
+    version = _version_carrito(request)
+    if request.GET.get('since') == version:
+        return JsonResponse({'version': version, 'changed': False})
 
     if request.user.is_authenticated:
-        cart = _get_user_cart(request)
-        if cart:
-            detalles = DetalleCarrito.objects.filter(carrito=cart).select_related('producto__marca',
-                                                                                  'producto__imgproducto')
-            for item in detalles:
-                cart_items.append({
-                    'id': str(item.producto.id),
-                    'name': item.producto.nombre,
-                    'brand': item.producto.marca.nombre,
-                    'quantity': item.cantidad,
-                    'price': float(item.precio_unitario),
-                    'image_url': item.producto.imgproducto.url.name,
-                    'subtotal': float(item.subtotal)
-                })
-                total_price += item.subtotal
-                total_items += item.cantidad
-    else:
-        cart_session = request.session.get('cart', {})
-        for pid, item_data in cart_session.items():
-            subtotal = item_data['quantity'] * float(item_data['price'])
-            cart_items.append({
-                'id': pid, 'name': item_data['name'], 'brand': item_data.get('brand', ''),
-                'quantity': item_data['quantity'], 'price': float(item_data['price']),
-                'image_url': item_data['image_url'], 'subtotal': subtotal
-            })
-            total_price += subtotal
-            total_items += item_data['quantity']
-
-    return JsonResponse({
-        'cart_items': cart_items,
-        'total_price': total_price,
-        'total_items': total_items,
-    })
+        return JsonResponse({**contenido_carrito(request.user.pk), 'version': version, 'changed': True})
+
+    return JsonResponse({**contenido_invitado(request), 'changed': True})
+
+
+@require_POST
+def cart_batch(request):
+    # Aplica varias operaciones de carrito en una sola escritura y regresa el
+    # carrito final; cart.js junta los clics rápidos en una de estas llamadas.
+    try:
+        operaciones = normalizar_lote(json.loads(request.body).get('operations'))
+    except (ValueError, AttributeError):
+        return JsonResponse({'status': 'error'}, status=400)
+
+    try:
+        if request.user.is_authenticated:
+            resultado = aplicar_lote(request.user.pk, operaciones)
+        else:
+            resultado = aplicar_invitado(request, operaciones)
+    except ProductoListado.DoesNotExist:
+        raise Http404("Producto no encontrado")
+    except ValueError:
+        return JsonResponse({'status': 'error'}, status=400)
+    return JsonResponse({'status': 'ok', **resultado})
 
 
 def update_cart_quantity(request, producto_id):
@@ -293,57 +295,90 @@ def update_cart_quantity(request, producto_id):
         new_quantity = int(body_data.get('quantity', 1))
 
         if request.user.is_authenticated:
-            cart = _get_user_cart(request)
-            detalle = get_object_or_404_mongo(DetalleCarrito, carrito=cart, producto_id=producto_id)
-
-            if action == 'increase':
-                detalle.cantidad += 1
-            elif action == 'decrease':
-                detalle.cantidad -= 1
-            elif action == 'manual':
-                detalle.cantidad = new_quantity
-
-            if detalle.cantidad <= 0:
-                detalle.delete()
-            else:
-                detalle.subtotal = detalle.cantidad * detalle.precio_unitario
-                detalle.save()
-        else:
-            cart_session = request.session.get('cart', {})
-            pid_str = str(producto_id)
-            if pid_str in cart_session:
-                if action == 'increase':
-                    cart_session[pid_str]['quantity'] += 1
-                elif action == 'decrease':
-                    cart_session[pid_str]['quantity'] -= 1
-                    if cart_session[pid_str]['quantity'] <= 0:
-                        del cart_session[pid_str]
-                elif action == 'manual':
-                    if new_quantity <= 0:
-                        del cart_session[pid_str]
-                    else:
-                        cart_session[pid_str]['quantity'] = new_quantity
-
-                request.session['cart'] = cart_session
+            if action not in ('increase', 'decrease', 'manual'):
+                return JsonResponse({'status': 'error'}, status=400)
+            try:
+                resultado = cambiar_cantidad(request.user.pk, producto_id, action, new_quantity)
+            except DetalleCarrito.DoesNotExist:
+                raise Http404("El producto no está en el carrito")
+            return JsonResponse({'status': 'ok', **resultado})
+        elif action in ('increase', 'decrease', 'manual'):
+            tipo = {'increase': 'inc', 'decrease': 'dec', 'manual': 'set'}[action]
+            return _operacion_invitado(request, tipo, producto_id, max(new_quantity, 0))
 
     return JsonResponse({'status': 'ok'})
 
 
 def remove_from_cart(request, producto_id):
     if request.user.is_authenticated:
-        cart = _get_user_cart(request)
-        DetalleCarrito.objects.filter(carrito=cart, producto_id=producto_id).delete()
-    else:
-        cart_session = request.session.get('cart', {})
-        pid_str = str(producto_id)
-        if pid_str in cart_session:
-            del cart_session[pid_str]
-            request.session['cart'] = cart_session
+        try:
+            resultado = quitar_del_carrito(request.user.pk, producto_id)
+        except DetalleCarrito.DoesNotExist:
+            raise Http404("ID no válido")
+        return JsonResponse({'status': 'ok', **resultado})
 
-    return JsonResponse({'status': 'ok'})
+    return _operacion_invitado(request, 'remove', producto_id, 0)
 
 # --- FIN: LÓGICA COMPLETA DEL CARRITO ---
 
+# --- INICIO: EVENTOS EN VIVO DEL CARRITO (SSE) ---
+
+LATIDO_SSE = 25
+REINTENTO_SSE_MS = 5000
+
+
+def _estado_inicial_eventos(usuario_id):
+    _, lineas = lineas_carrito(usuario_id)
+    stock = dict(
+        ProductoListado.objects.filter(pk__in=[l['producto_id'] for l in lineas]).values_list('pk', 'stock')
+    )
+    return sum(l['cantidad'] for l in lineas), stock
+
+
+def _productos_en_carrito(usuario_id):
+    _, lineas = lineas_carrito(usuario_id)
+    return [l['producto_id'] for l in lineas]
+
+
+async def cart_events(request):
+    # Flujo SSE (requiere servir con ChronosLux.asgi): total del carrito y
+    # stock de los productos que contiene. Lo alimentan el servicio del
+    # carrito y las escrituras de Producto a través de watches/eventos.py.
+    user = await request.auser()
+    if not user.is_authenticated:
+        # 204 le indica a EventSource que no reintente.
+        return HttpResponse(status=204)
+
+    async def flujo():
+        with broker.suscribir([canal_usuario(user.pk)]) as suscripcion:
+            total_items, stock = await sync_to_async(_estado_inicial_eventos)(user.pk)
+            suscripcion.cambiar_canales([canal_usuario(user.pk), *map(canal_producto, stock)])
+
+            yield f"retry: {REINTENTO_SSE_MS}\n\n"
+            yield formato_sse('carrito', {'total_items': total_items})
+            for producto_id, existencias in stock.items():
+                if existencias <= STOCK_BAJO:
+                    yield formato_sse('stock', {'id': str(producto_id), 'stock': existencias, 'low': True})
+
+            while True:
+                try:
+                    evento, datos = await suscripcion.siguiente(LATIDO_SSE)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if evento == 'carrito':
+                    # Cambió el carrito: se ajustan los productos vigilados.
+                    productos = await sync_to_async(_productos_en_carrito)(user.pk)
+                    suscripcion.cambiar_canales([canal_usuario(user.pk), *map(canal_producto, productos)])
+                yield formato_sse(evento, datos)
+
+    response = StreamingHttpResponse(flujo(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+# --- FIN: EVENTOS EN VIVO DEL CARRITO (SSE) ---
+
 # --- INICIO: LÓGICA COMPLETA DE ADMIN ---
 
 def admin_dashboard(request):
@@ -403,7 +438,9 @@ def editar_producto(request, producto_id):
 
             edited_producto = form.save(commit=False)
             edited_producto.categoria = categoria_obj
-            edited_producto.save()
+            # Sin 'stock': el de esta instancia puede ser viejo y pisaría lo
+            # que las reservas y los pedidos descontaron con $inc.
+            edited_producto.save(update_fields=[*ProductoForm.Meta.fields, 'categoria', 'busqueda'])
 
             uploaded_image = form.cleaned_data.get('imagen')
             if uploaded_image:
@@ -455,92 +492,70 @@ def eliminar_producto(request, producto_id):
 
 # --- INICIO: LÓGICA COMPLETA DE VISTA Y FILTROS EXCLUSIVE ---
 
+def _productos_exclusivos(request):
+    items = ProductoListado.objects.filter(es_exclusivo=True)
+
+    filtros = leer_filtros(request.GET)
+    items = aplicar_filtros(items, filtros, RANGOS_PRECIO_EXCLUSIVOS)
+
+    return items, filtros
+
+
 def exclusivos_catalog(request):
-    items = Producto.objects.select_related('marca', 'imgproducto', 'categoria').filter(es_exclusivo=True)
-
-    tipo_filtro = request.GET.get('type', '').lower()
-    precio_filtro = request.GET.get('price', '').lower()
-    genero_filtro = request.GET.get('gender', '').lower()
-    sort_order = request.GET.get('sort', 'featured').lower()
-    marca_filtro = request.GET.get('brand', '').lower()
-
-    if tipo_filtro and tipo_filtro != 'all':
-        items = items.filter(categoria__tipo__iexact=tipo_filtro)
-    if genero_filtro and genero_filtro != 'all':
-        items = items.filter(categoria__genero__iexact=genero_filtro)
-    if marca_filtro and marca_filtro != 'all':
-        items = items.filter(marca__nombre__iexact=marca_filtro)
-    if precio_filtro and precio_filtro != 'all':
-        if precio_filtro == 'up_to_60000':
-            items = items.filter(precio__lte=60000)
-        elif precio_filtro == '60000_100000':
-            items = items.filter(precio__gte=60000, precio__lte=100000)
-        elif precio_filtro == 'over_100000':
-            items = items.filter(precio__gt=100000)
-
-    if sort_order == 'price_asc':
-        items = items.order_by('precio')
-    elif sort_order == 'price_desc':
-        items = items.order_by('-precio')
-    elif sort_order == 'name_asc':
-        items = items.order_by('nombre')
-
-    favoritos_ids = []
+    items, filtros = _productos_exclusivos(request)
+    page_obj = paginar(items, ordenamiento(filtros), request.GET.get('cursor'))
 
-    if request.user.is_authenticated:
-        favoritos_ids = list(
-            Favorito.objects.filter(
-                usuario=request.user
-            ).values_list('producto_id', flat=True)
-        )
+    favoritos_ids = estado_usuario(request).favoritos_ids
 
-    tipos_disponibles = Categoria.objects.values_list('tipo', flat=True).distinct().order_by('tipo')
-    generos_disponibles = Categoria.objects.values_list('genero', flat=True).distinct().order_by('genero')
-    marcas_disponibles = Marca.objects.all().order_by('nombre')
+    facetas = contar_facetas({'es_exclusivo': True}, filtros, RANGOS_PRECIO_EXCLUSIVOS)
 
     context = {
-        'productos_exclusivos': items,
-        'querystring': request.GET.urlencode(),
-        'current': {
-            'type': tipo_filtro or 'all',
-            'price': precio_filtro or 'all',
-            'gender': genero_filtro or 'all',
-            'sort': sort_order or 'featured',
-            'brand': marca_filtro or 'all',
-        },
-        'tipos': tipos_disponibles,
-        'generos': generos_disponibles,
-        'marcas': marcas_disponibles,
+        'productos_exclusivos': page_obj.object_list,
+        'page_obj': page_obj,
+        'querystring': querystring_sin_cursor(request.GET),
+        'current': filtros_actuales(filtros),
+        'tipos': facetas['tipos'],
+        'generos': facetas['generos'],
+        'marcas': facetas['marcas'],
+        'precios': facetas['precios'],
         'favoritos_ids': favoritos_ids,
     }
 
     return render(request, 'exclusivos_catalog.html', context)
 
+
+def exclusivos_api(request):
+    items, filtros = _productos_exclusivos(request)
+    page_obj = paginar(items, ordenamiento(filtros), request.GET.get('cursor'))
+    return JsonResponse(_pagina_json(page_obj))
+
 # --- FIN: LÓGICA COMPLETA DE FILTROS EXCLUSIVE ---
 
 # --- INICIO: LÓGICA COMPLETA DE CHECKOUT CARRITO ---
 
+def _peticion_interactiva(request):
+    # Los HEAD y las precargas del navegador (prefetch / prerender) no son un
+    # usuario abriendo el checkout: no deben apartar stock.
+    if request.method != 'GET':
+        return False
+    proposito = ' '.join(
+        request.headers.get(cabecera, '') for cabecera in ('Sec-Purpose', 'Purpose', 'X-Moz')
+    ).lower()
+    return 'prefetch' not in proposito and 'prerender' not in proposito
+
+
 @login_required
 def checkout_page(request):
-    cart_items = []
-    total_price = 0
-
-    cart = _get_user_cart(request)
-    if cart:
-        # Obtiene todos los detalles de ese carrito
-        detalles = DetalleCarrito.objects.filter(carrito=cart).select_related('producto__marca',
-                                                                              'producto__imgproducto')
-        for item in detalles:
-            cart_items.append({
-                'id': str(item.producto.id),
-                'name': item.producto.nombre,
-                'brand': item.producto.marca.nombre,
-                'quantity': item.cantidad,
-                'price': float(item.precio_unitario),
-                'image_url': item.producto.imgproducto.url.name,
-                'subtotal': float(item.subtotal)
-            })
-            total_price += item.subtotal
+    _, lineas = lineas_carrito(request.user.pk)
+    contenido = contenido_carrito(request.user.pk, lineas)
+    cart_items = contenido['cart_items']
+    total_price = contenido['total_price']
+
+    reserva_expira = None
+    if _peticion_interactiva(request):
+        # Aparta las piezas mientras el usuario captura el pago (con el carrito
+        # vacío devuelve lo que hubiera quedado apartado)
+        reserva_expira = _apartar_carrito(request, lineas)
 
     # Obtiene los domicilios del usuario
     domicilios = Domicilio.objects.filter(usuario=request.user)
@@ -548,22 +563,63 @@ def checkout_page(request):
     context = {
         'cart_items': cart_items,
         'total_price': total_price,
-        'domicilios': domicilios
+        'domicilios': domicilios,
+        'reserva_expira': reserva_expira,
+        # Llave de idempotencia: un doble envío del formulario no duplica el pedido
+        'clave_pedido': nueva_clave_pedido()
     }
 
     return render(request, 'checkout.html', context)
 
 
+def _apartar_carrito(request, lineas):
+    # Las reservas vencidas las barre run_workers (o el comando
+    # liberar_reservas), no la petición.
+    try:
+        reservadas, reserva_expira = reservar_lineas(request.user.pk, lineas)
+    except ReservaFallida:
+        messages.warning(
+            request,
+            "No pudimos apartar tus piezas en este momento; se confirmarán al pagar."
+        )
+        return None
+    for linea in lineas:
+        if reservadas[linea['producto_id']] < linea['cantidad']:
+            messages.warning(
+                request,
+                f"Solo pudimos apartar {reservadas[linea['producto_id']]} de "
+                f"{linea['cantidad']} pieza(s) de '{linea['nombre']}'."
+            )
+    return reserva_expira if lineas else None
+
+
 @login_required
 def place_order(request):
     if request.method != 'POST':
         return redirect('home')
 
-    cart = _get_user_cart(request)
+    clave_pedido = request.POST.get('clave_pedido', '')
+
+    if not clave_valida(clave_pedido):
+        messages.error(
+            request,
+            'Tu sesión de pago expiró. Revisa tu pedido e intenta de nuevo.'
+        )
+        return redirect('checkout_page')
+
+    # Reintento o doble clic: se regresa al pedido ya colocado sin tocar nada
+    pedido_id = pedido_por_clave(request.user.pk, clave_pedido)
+    if pedido_id is not None:
+        return redirect(
+            'order_confirmation',
+            order_id=str(pedido_id)
+        )
+
+    carrito_id, lineas = lineas_carrito(request.user.pk)
     domicilio_id = request.POST.get('domicilio_seleccionado')
     metodo_pago = request.POST.get('metodo_pago')
 
-    if not cart or not cart.detallecarrito_set.exists():
+    if not lineas:
         messages.error(
             request,
             'Tu carrito está vacío o ya no se encuentra disponible.'
@@ -719,72 +775,33 @@ def place_order(request):
             )
             return redirect('checkout_page')
 
-    detalles_del_carrito = cart.detallecarrito_set.select_related(
-        'producto'
-    ).all()
-
-    # Verificar el stock antes de crear el pedido
-    for item in detalles_del_carrito:
-        producto = item.producto
-        cantidad_pedida = item.cantidad
-
-        if producto.stock < cantidad_pedida:
-            messages.error(
-                request,
-                f"No hay suficiente stock para '{producto.nombre}'. "
-                f"Cantidad disponible: {producto.stock}."
-            )
-            return redirect('checkout_page')
-
     domicilio = get_object_or_404_mongo(
         Domicilio,
         pk=domicilio_id,
         usuario=request.user
     )
 
-    total_price = detalles_del_carrito.aggregate(
-        total=Sum('subtotal')
-    )['total'] or 0
-
-    fecha_envio = timezone.now()
-    fecha_llegada = fecha_envio + timedelta(days=7)
-
-    envio = Envio.objects.create(
-        domicilio=domicilio,
-        fecha_envio=fecha_envio,
-        fecha_llegada=fecha_llegada
-    )
-
-    pedido = Pedido.objects.create(
-        usuario=request.user,
-        envio=envio,
-        carrito=cart,
-        fecha=timezone.now(),
-        subtotal=total_price,
-        total_pagar=total_price
-    )
-
-    for item in detalles_del_carrito:
-        DetallesPedido.objects.create(
-            pedido=pedido,
-            producto=item.producto,
-            cantidad=item.cantidad,
-            precio_unitario=item.precio_unitario
+    # Stock, pedido, detalles, pago y carrito en una sola transacción.
+    try:
+        pedido = colocar_pedido(request.user, domicilio, metodo_pago, carrito_id, lineas, clave_pedido)
+    except PedidoRepetido as error:
+        return redirect(
+            'order_confirmation',
+            order_id=str(error.pedido_id)
         )
-
-        item.producto.stock -= item.cantidad
-        item.producto.save()
-
-    Pago.objects.create(
-        pedido=pedido,
-        metodo_pago=metodo_pago,
-        monto_pagar=total_price,
-        estado='aprobado',
-        fecha_pago=timezone.now()
-    )
-
-    cart.estado = 'convertido'
-    cart.save()
+    except StockInsuficiente as error:
+        messages.error(
+            request,
+            f"No hay suficiente stock para '{error.linea['nombre']}'. "
+            f"Cantidad disponible: {error.disponible}."
+        )
+        return redirect('checkout_page')
+    except CarritoNoDisponible:
+        messages.error(
+            request,
+            'Tu carrito está vacío o ya no se encuentra disponible.'
+        )
+        return redirect('checkout_page')
 
     return redirect(
         'order_confirmation',
@@ -822,22 +839,34 @@ def toggle_favorite(request, producto_id):
     return JsonResponse({'status': 'error'}, status=400)
 
 
-@login_required
-def favoritos_list(request):
-    favoritos_qs = Favorito.objects.filter(usuario=request.user).values_list('producto_id', flat=True)
+def _productos_favoritos(request):
+    favoritos_ids = estado_usuario(request).favoritos_ids
+
+    productos_favoritos = ProductoListado.objects.filter(pk__in=favoritos_ids)
 
-    productos_favoritos = Producto.objects.select_related(
-        'marca', 'imgproducto', 'categoria'
-    ).filter(pk__in=favoritos_qs)
+    return productos_favoritos, favoritos_ids
 
-    favoritos_ids = list(favoritos_qs)
+
+@login_required
+def favoritos_list(request):
+    productos_favoritos, favoritos_ids = _productos_favoritos(request)
+    page_obj = paginar(productos_favoritos, ORDENAMIENTOS['featured'], request.GET.get('cursor'))
 
     context = {
-        'productos_favoritos': productos_favoritos,
+        'productos_favoritos': page_obj.object_list,
+        'page_obj': page_obj,
+        'querystring': querystring_sin_cursor(request.GET),
         'favoritos_ids': favoritos_ids
     }
     return render(request, 'favoritos.html', context)
 
+
+@login_required
+def favoritos_api(request):
+    productos_favoritos, _ = _productos_favoritos(request)
+    page_obj = paginar(productos_favoritos, ORDENAMIENTOS['featured'], request.GET.get('cursor'))
+    return JsonResponse(_pagina_json(page_obj))
+
 # --- FIN: VISTAS PARA FAVORITOS ---
 
 # --- INICIO: LÓGICA COMPLETA DE MIS DEVOLUCIONES ADMIN ---
@@ -867,37 +896,18 @@ def gestionar_devoluciones(request):
 
 @staff_member_required
 def gestionar_compras(request):
-    pedidos = Pedido.objects.select_related(
-        'usuario',
-        'envio__domicilio'
-    ).all().order_by('-fecha')
-
-    compras = []
-
-    for pedido in pedidos:
-        detalles = DetallesPedido.objects.filter(
-            pedido=pedido
-        ).select_related('producto')
-
-        pago = Pago.objects.filter(
-            pedido=pedido
-        ).first()
-
-        compras.append({
-            'id': pedido.id,
-            'usuario': pedido.usuario,
-            'detalles': detalles,
-            'total': pedido.total_pagar,
-            'domicilio': pedido.envio.domicilio if pedido.envio else None,
-            'metodo_pago': pago.get_metodo_pago_display() if pago else 'No registrado',
-            'fecha': pedido.fecha,
-        })
-
-    context = {
-        'compras': compras
-    }
-
-    return render(request, 'admin/compras.html', context)
+    # Una página del historial: un solo aggregate por página (watches/compras.py).
+    filtros = filtros_compras(request.GET)
+    compras, page_obj = pagina_compras(filtros, request.GET.get('cursor'))
+
+    return render(request, 'admin/compras.html', {
+        'compras': compras,
+        'page_obj': page_obj,
+        'querystring': querystring_sin_cursor(request.GET),
+        'filtros': filtros,
+        'filtrando': any(filtros.values()),
+        'metodos': Pago.METODOS,
+    })
 
 # --- FIN: LÓGICA COMPLETA DE MIS COMPRAS ADMIN ---
 